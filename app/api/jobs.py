@@ -0,0 +1,25 @@
+import os
+
+from fastapi import APIRouter, Request, status
+
+from app.utils.hmac_verification import verify_cron_secret
+from app.services.job_worker import create_worker
+
+
+router = APIRouter()
+
+
+@router.get("/jobs/drain", status_code=status.HTTP_200_OK)
+async def drain_jobs(request: Request):
+    """
+    Run due jobs until the queue is empty or the time budget is spent
+
+    On serverless deployments (Vercel) nothing runs once a response has been
+    returned, so a cron job calls this endpoint to drain the queue instead of
+    an in-process or standalone worker. JOB_DRAIN_MAX_SECONDS should stay
+    below the function's maximum duration.
+    """
+    await verify_cron_secret(request)
+
+    processed = await create_worker().drain(float(os.environ.get("JOB_DRAIN_MAX_SECONDS", "8")))
+    return {"processed": processed}
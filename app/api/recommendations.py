@@ -0,0 +1,37 @@
+from fastapi import APIRouter, Request, HTTPException, status
+from pydantic import BaseModel, Field
+
+from app.utils.hmac_verification import verify_admin_token
+from app.services.job_queue import get_job_queue, QueueFullError
+from app.services.job_worker import RECOMMENDATION_BACKFILL
+
+
+router = APIRouter()
+job_queue = get_job_queue()
+
+
+class BackfillRequest(BaseModel):
+    page_size: int = Field(1000, ge=1, le=10000)
+
+
+@router.post("/recommendations/backfill", status_code=status.HTTP_202_ACCEPTED)
+async def backfill_recommendations(request: Request, backfill: BackfillRequest = BackfillRequest()):
+    """
+    Re-score every stored order against the current size charts
+
+    The back-fill runs on the job worker one page per job, each job queueing
+    the next page; for very large stores run it from the command line instead:
+    python -m app.services.recommendation_batch
+    """
+    await verify_admin_token(request)
+
+    try:
+        job_id = await job_queue.enqueue(RECOMMENDATION_BACKFILL, backfill.dict())
+    except QueueFullError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": "30"}
+        )
+
+    return {"job_id": job_id}
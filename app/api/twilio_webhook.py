@@ -5,11 +5,27 @@ from typing import Optional
 
 from app.services.twilio_service import TwilioService
 from app.services.conversation_service import ConversationService
+from app.services.idempotency_service import get_idempotency_service
+from app.services.conversation_actors import get_conversation_actors
 
 
 router = APIRouter()
 twilio_service = TwilioService()
 conversation_service = ConversationService()
+idempotency_service = get_idempotency_service()
+
+
+async def process_reply(from_phone: str, message_content: str) -> None:
+    await conversation_service.process_customer_reply(
+        from_phone=from_phone,
+        message_content=message_content
+    )
+
+
+# Replies from one customer are processed one turn at a time, and a burst of them as one turn
+conversation_actors = get_conversation_actors(process_reply)
+
+EMPTY_TWIML = "<?xml version=\"1.0\" encoding=\"UTF-8\"?><Response></Response>"
 
 
 async def validate_twilio_request(request: Request) -> bool:
@@ -52,9 +68,10 @@ async def reply_webhook(
 
     This endpoint:
     1. Validates the request came from Twilio
-    2. Parses the message data
-    3. Processes the customer reply
-    4. Returns a TwiML response
+    2. Skips retried deliveries of an already processed MessageSid
+    3. Parses the message data
+    4. Processes the customer reply, in turn with the customer's other replies
+    5. Returns a TwiML response
     """
     # Validate the request in production (commented out for development)
     # if not await validate_twilio_request(request):
@@ -63,22 +80,30 @@ async def reply_webhook(
     #         detail="Invalid Twilio signature"
     #     )
 
+    # Twilio retries slow webhooks with the same MessageSid
+    delivery_key = f"twilio:{MessageSid}" if MessageSid else None
+    if delivery_key and not await idempotency_service.claim(delivery_key):
+        return Response(content=EMPTY_TWIML, media_type="application/xml")
+
     # Parse the webhook data
-    form_data = await request.form()
-    data = twilio_service.parse_webhook_request(dict(form_data))
+    try:
+        form_data = await request.form()
+        data = twilio_service.parse_webhook_request(dict(form_data))
+    except Exception:
+        # Let Twilio's retry be processed
+        if delivery_key:
+            await idempotency_service.release(delivery_key)
+        raise
 
     # Process the message
     try:
-        await conversation_service.process_customer_reply(
-            from_phone=data["from_phone"],
-            message_content=data["body"]
-        )
+        await conversation_actors.submit(data["from_phone"], data["body"])
     except Exception as e:
         # Log the error but don't fail the webhook
         print(f"Error processing reply: {str(e)}")
 
     # Return empty TwiML response
     return Response(
-        content="<?xml version=\"1.0\" encoding=\"UTF-8\"?><Response></Response>",
+        content=EMPTY_TWIML,
         media_type="application/xml"
     )
@@ -5,7 +5,18 @@ from fastapi.responses import JSONResponse
 import uvicorn
 from dotenv import load_dotenv
 
-from app.api import shopify_webhook, twilio_webhook
+from app.api import shopify_webhook, twilio_webhook, recommendations, jobs
+from app.utils.http_pool import close_http_clients
+from app.utils.executor import executor_metrics, shutdown_executors
+from app.services.job_queue import get_job_queue
+from app.services.job_worker import create_worker
+from app.utils.intent_classifier import get_intent_classifier
+from app.services.response_cache import get_response_cache
+from app.services.whatsapp_dispatcher import outbound_metrics, stop_outbound_dispatcher
+from app.services.shopify_scheduler import get_shopify_scheduler
+from app.services.customer_cache import customer_cache_metrics
+from app.services.message_log import get_message_log, message_log_metrics, stop_message_log
+from app.services.conversation_actors import conversation_actors_metrics
 
 # Load environment variables from .env file (in development)
 load_dotenv()
@@ -29,6 +40,8 @@ app.add_middleware(
 # Include routers
 app.include_router(shopify_webhook.router, tags=["shopify"])
 app.include_router(twilio_webhook.router, tags=["twilio"])
+app.include_router(recommendations.router, tags=["recommendations"])
+app.include_router(jobs.router, tags=["jobs"])
 
 
 @app.get("/")
@@ -47,6 +60,63 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/metrics")
+async def metrics():
+    """
+    Runtime metrics endpoint
+    """
+    response_cache = get_response_cache()
+    return {
+        "executors": executor_metrics(),
+        "job_queue": {"pending": await get_job_queue().pending_count()},
+        "intent_fast_path": get_intent_classifier().metrics(),
+        "response_cache": response_cache.metrics() if response_cache else None,
+        "outbound_messages": outbound_metrics(),
+        "message_log": message_log_metrics(),
+        "customer_cache": customer_cache_metrics(),
+        "conversation_actors": conversation_actors_metrics(),
+        "shopify": get_shopify_scheduler().metrics()
+    }
+
+
+# In-process job worker; set JOB_WORKER_IN_PROCESS=false when running
+# workers separately with `python -m app.services.job_worker`. Off by default
+# on Vercel, where nothing runs between requests and a cron job calls
+# /jobs/drain instead
+job_worker = None
+
+
+@app.on_event("startup")
+async def startup():
+    """
+    Start the in-process job worker and the message log, which writes any
+    messages spooled before a restart
+    """
+    global job_worker
+    in_process_default = "false" if os.environ.get("VERCEL") else "true"
+    if os.environ.get("JOB_WORKER_IN_PROCESS", in_process_default).lower() == "true":
+        job_worker = create_worker()
+        job_worker.start()
+
+    message_log = get_message_log()
+    if message_log is not None:
+        message_log.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """
+    Stop the job worker, send queued messages, write buffered messages and
+    release pooled HTTP connections and executor threads
+    """
+    if job_worker:
+        await job_worker.stop()
+    await stop_outbound_dispatcher()
+    await stop_message_log()
+    await close_http_clients()
+    shutdown_executors()
+
+
 # Error handling
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
@@ -1,9 +1,20 @@
 from enum import Enum
-from typing import Optional
+from typing import Any, Dict, Optional, List
 from datetime import datetime
 from uuid import UUID
 from pydantic import BaseModel
 
+from app.models.customer import Customer
+from app.models.order import Order, OrderLineItem
+from app.models.message import Message
+
+
+class ConversationPhase(str, Enum):
+    CONFIRMATION = "CONFIRMATION"  # Initial phase asking if size is correct
+    SIZING_QUESTIONS = "SIZING_QUESTIONS"  # Asking about usual size, height, weight
+    RECOMMENDATION = "RECOMMENDATION"  # Recommending a size
+    COMPLETE = "COMPLETE"  # Conversation is complete
+
 
 class ConversationStatus(str, Enum):
     """
@@ -15,6 +26,15 @@ class ConversationStatus(str, Enum):
     COMPLETED = "completed"
 
 
+# The status shown for each phase
+PHASE_STATUS = {
+    ConversationPhase.CONFIRMATION: ConversationStatus.AWAITING_SIZE_CONFIRMATION,
+    ConversationPhase.SIZING_QUESTIONS: ConversationStatus.AWAITING_SIZING_INFO,
+    ConversationPhase.RECOMMENDATION: ConversationStatus.AWAITING_RECOMMENDATION_CONFIRMATION,
+    ConversationPhase.COMPLETE: ConversationStatus.COMPLETED,
+}
+
+
 class Conversation(BaseModel):
     """
     Model for conversation data
@@ -23,6 +43,10 @@ class Conversation(BaseModel):
     order_id: UUID
     phone_number: str
     status: ConversationStatus = ConversationStatus.AWAITING_SIZE_CONFIRMATION
+    phase: ConversationPhase = ConversationPhase.CONFIRMATION
+    entities: Dict[str, Any] = {}  # Sizing facts collected so far
+    recommendation: Optional[Dict[str, Any]] = None  # The recommendation awaiting confirmation
+    version: int = 0  # Incremented by every state change, for optimistic locking
     created_at: datetime
     updated_at: datetime
 
@@ -34,6 +58,7 @@ class ConversationCreate(BaseModel):
     order_id: UUID
     phone_number: str
     status: ConversationStatus = ConversationStatus.AWAITING_SIZE_CONFIRMATION
+    phase: ConversationPhase = ConversationPhase.CONFIRMATION
 
 
 class ConversationUpdate(BaseModel):
@@ -41,3 +66,17 @@ class ConversationUpdate(BaseModel):
     Model for updating a conversation
     """
     status: Optional[ConversationStatus] = None
+    phase: Optional[ConversationPhase] = None
+    entities: Optional[Dict[str, Any]] = None
+    recommendation: Optional[Dict[str, Any]] = None
+
+
+class ReplyContext(BaseModel):
+    """
+    Model for everything needed to process an inbound reply, loaded in one query
+    """
+    customer: Optional[Customer] = None
+    conversation: Optional[Conversation] = None
+    order: Optional[Order] = None
+    line_items: List[OrderLineItem] = []
+    messages: List[Message] = []
@@ -0,0 +1,13 @@
+from pydantic import BaseModel
+from typing import Dict, Any, Optional
+
+
+class Job(BaseModel):
+    """
+    Model for a claimed background job
+    """
+    id: int
+    job_type: str
+    payload: Dict[str, Any]
+    attempts: int = 0
+    last_error: Optional[str] = None
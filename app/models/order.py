@@ -18,9 +18,12 @@ class Order(BaseModel):
     variant_id: str  # Changed from int to str
     line_item_id: str  # Changed from int to str
     product_title: str
+    shop_domain: Optional[str] = None
     status: str = "pending"
     fulfilled: bool = False
     size_confirmed: bool = False
+    recommended_size: Optional[str] = None
+    recommendation_confidence: Optional[float] = None
     created_at: Optional[str] = None
     updated_at: Optional[str] = None
 
@@ -40,6 +43,7 @@ class OrderCreate(BaseModel):
     variant_id: str  # Changed from int to str
     line_item_id: str  # Changed from int to str
     product_title: str
+    shop_domain: Optional[str] = None
 
 
 class OrderUpdate(BaseModel):
@@ -50,3 +54,33 @@ class OrderUpdate(BaseModel):
     status: Optional[str] = None
     fulfilled: Optional[bool] = None
     size_confirmed: Optional[bool] = None
+
+
+class OrderLineItem(BaseModel):
+    """
+    Model for one sized line item of an order
+    """
+    id: UUID
+    order_id: UUID
+    line_item_id: str
+    product_id: str
+    variant_id: str
+    product_title: str
+    original_size: str
+    confirmed_size: Optional[str] = None
+    created_at: Optional[str] = None
+
+    class Config:
+        orm_mode = True
+
+
+class OrderLineItemCreate(BaseModel):
+    """
+    Model for creating an order line item
+    """
+    order_id: UUID
+    line_item_id: str
+    product_id: str
+    variant_id: str
+    product_title: str
+    original_size: str
@@ -0,0 +1,154 @@
+import os
+import asyncio
+import weakref
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+ReplyHandler = Callable[[str, str], Awaitable[None]]
+
+
+class ConversationActor:
+    """
+    One conversation's mailbox, processed one turn at a time
+
+    Messages that arrive within the coalescing window of each other, or while
+    a turn is being processed, are joined into the next turn, so a burst like
+    "yes" then "180cm" is answered once.
+    """
+
+    def __init__(self, key: str, handler: ReplyHandler, coalesce_window: float, registry: "ConversationActors"):
+        self.key = key
+        self.handler = handler
+        self.coalesce_window = coalesce_window
+        self.registry = registry
+        self._mailbox: List[str] = []
+        self._waiters: List[asyncio.Future] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def submit(self, message: str) -> None:
+        """
+        Add a message to the mailbox and wait until the turn that includes it is processed
+
+        Raises:
+            Exception: Whatever the handler raised for that turn
+        """
+        waiter = asyncio.get_running_loop().create_future()
+        self._mailbox.append(message)
+        self._waiters.append(waiter)
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+        await waiter
+
+    async def _run(self) -> None:
+        waiters: List[asyncio.Future] = []
+        try:
+            while self._mailbox:
+                # Let the rest of the burst arrive before taking the turn
+                await asyncio.sleep(self.coalesce_window)
+                messages, waiters = self._mailbox, self._waiters
+                self._mailbox, self._waiters = [], []
+
+                self.registry.turns += 1
+                self.registry.coalesced += len(messages) - 1
+                try:
+                    await self.handler(self.key, "\n".join(messages))
+                except Exception as e:
+                    _resolve(waiters, e)
+                else:
+                    _resolve(waiters)
+                waiters = []
+        except BaseException as e:
+            # Cancelled (e.g. on shutdown): fail the turn in progress and everything
+            # still in the mailbox, so no caller waits forever
+            _resolve(waiters + self._waiters, e)
+            self._mailbox, self._waiters = [], []
+            raise
+        finally:
+            self._task = None
+
+
+def _resolve(waiters: List[asyncio.Future], error: Optional[BaseException] = None) -> None:
+    for waiter in waiters:
+        if not waiter.done():
+            if error is None:
+                waiter.set_result(None)
+            else:
+                waiter.set_exception(error)
+
+
+class ConversationActors:
+    """
+    Serializes reply processing per conversation, with no limit across conversations
+
+    Each key (the customer's phone number) gets an actor whose mailbox is
+    processed by a single task, so two replies from one customer never run
+    concurrently while replies from different customers do. Actors are held
+    weakly: one exists only while a caller is waiting on it, and is dropped
+    as soon as its conversation goes idle.
+    """
+
+    def __init__(self, handler: ReplyHandler, coalesce_window: float = 0.5):
+        self.handler = handler
+        self.coalesce_window = coalesce_window
+        self._actors: "weakref.WeakValueDictionary[str, ConversationActor]" = weakref.WeakValueDictionary()
+        self.turns = 0
+        self.coalesced = 0
+
+    async def submit(self, key: str, message: str) -> None:
+        """
+        Process a message as part of its conversation's next turn
+
+        Args:
+            key: The conversation's key, e.g. the customer's phone number
+            message: The message content
+
+        Raises:
+            Exception: Whatever the handler raised for the turn
+        """
+        actor = self._actors.get(key)
+        if actor is None:
+            actor = self._actors[key] = ConversationActor(key, self.handler, self.coalesce_window, self)
+        await actor.submit(message)
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Get actor and turn counters
+
+        Returns:
+            A dictionary with live actors, turns taken and messages coalesced into another's turn
+        """
+        return {
+            "actors": len(self._actors),
+            "turns": self.turns,
+            "coalesced": self.coalesced,
+        }
+
+
+_conversation_actors: Optional[ConversationActors] = None
+
+
+def get_conversation_actors(handler: Optional[ReplyHandler] = None) -> ConversationActors:
+    """
+    Get the process-wide actor registry, so every reply from a customer goes through one actor
+
+    REPLY_COALESCE_WINDOW sets how long, in seconds, a turn waits for more of a burst.
+
+    Args:
+        handler: Processes a turn as (key, message); used when the registry is first created
+
+    Returns:
+        The registry
+    """
+    global _conversation_actors
+    if _conversation_actors is None:
+        _conversation_actors = ConversationActors(
+            handler,
+            coalesce_window=float(os.environ.get("REPLY_COALESCE_WINDOW", "0.5"))
+        )
+    return _conversation_actors
+
+
+def conversation_actors_metrics() -> Optional[Dict[str, Any]]:
+    """
+    Get the registry's metrics, if it has been created
+    """
+    return _conversation_actors.metrics() if _conversation_actors is not None else None
@@ -1,21 +1,44 @@
-from enum import Enum
+import os
+import asyncio
+from dataclasses import dataclass, field
 from typing import List, Dict, Any, Optional, Tuple
 from uuid import UUID
 
+from pydantic import ValidationError
+
 from app.services.supabase_service import SupabaseService
 from app.services.twilio_service import TwilioService
 from app.services.vertex_ai_service import VertexAIService
 from app.services.shopify_service import ShopifyService
-from app.models.message import MessageCreate
+from app.services.message_log import get_message_log, merge_pending
+from app.models.message import Message, MessageCreate
 from app.models.order import OrderUpdate
-from app.models.conversation import ConversationStatus, ConversationUpdate
+from app.models.customer import CustomerUpdate
+from app.models.conversation import ConversationCreate, ConversationPhase, ConversationUpdate, PHASE_STATUS
+from app.utils.size_recommender import SizeRecommendation, get_size_recommender
+from app.utils.state_machine import Effect, Transition, conversation_machine, map_intent_to_event
+
+# Sizing facts collected on the conversation as the customer mentions them
+SIZING_ENTITIES = ("usual_size", "usual_brand", "height", "weight", "preferred_size")
+
+# The facts a size recommendation depends on
+RECOMMENDATION_FACTS = ("usual_size", "usual_brand", "height", "weight")
 
+# Times a reply re-reads the conversation after losing a race to change its state
+STATE_UPDATE_ATTEMPTS = 3
 
-class ConversationPhase(str, Enum):
-    CONFIRMATION = "CONFIRMATION"  # Initial phase asking if size is correct
-    SIZING_QUESTIONS = "SIZING_QUESTIONS"  # Asking about usual size, height, weight
-    RECOMMENDATION = "RECOMMENDATION"  # Recommending a size
-    COMPLETE = "COMPLETE"  # Conversation is complete
+
+@dataclass
+class Turn:
+    """
+    What the effects of a reply's transition act on
+    """
+    order: Any
+    line_items: List[Any]
+    entities: Dict[str, Any]
+    recommendation: Optional[Dict[str, Any]] = None
+    confirmed_sizes: List[Tuple[Any, str]] = field(default_factory=list)
+    new_size: Optional[str] = None
 
 
 class ConversationService:
@@ -26,8 +49,31 @@ class ConversationService:
         self.shopify_service = ShopifyService()
         # For backward compatibility - messenger_service is an alias for twilio_service
         self.messenger_service = self.twilio_service
-
-    async def start_conversation(self, order_id: UUID, customer_id: UUID, phone: str, product_title: str, original_size: str) -> None:
+        # Only the last N messages go into the prompt, alongside a summary of the
+        # customer's sizing facts; set HISTORY_WINDOW_TURNS=0 to send the full history
+        self.history_window = int(os.environ.get("HISTORY_WINDOW_TURNS", "10")) or None
+        # Sizes are picked from the product's size chart; the model only phrases the recommendation
+        self.size_recommender = get_size_recommender()
+        # Messages are written before the reply continues; with MESSAGE_WRITE_BEHIND=true
+        # and a spool path they are written in batches behind the reply instead
+        self.message_log = get_message_log()
+        # What each transition effect does once the transition is claimed; RECOMMEND
+        # is applied while deciding the transition, as its result is stored with it
+        self.effect_handlers = {
+            Effect.CONFIRM_ORDERED_SIZES: self._confirm_ordered_sizes,
+            Effect.CONFIRM_RECOMMENDED_SIZES: self._confirm_recommended_sizes,
+            Effect.FULFIL: self._fulfil,
+        }
+
+    async def start_conversation(
+        self,
+        order_id: UUID,
+        customer_id: UUID,
+        phone: str,
+        product_title: str,
+        original_size: str,
+        line_items: Optional[List[Any]] = None
+    ) -> None:
         """
         Start a new conversation with a customer
 
@@ -37,13 +83,24 @@ class ConversationService:
             phone: The customer's phone number
             product_title: The title of the product
             original_size: The original size ordered
+            line_items: Every sized line item of the order, all confirmed in this conversation
         """
-        # Get AI to generate the initial message
+        # Store the conversation, which holds its state, before the customer can reply.
+        # It already exists when the order's job is retried, and the customer was
+        # already messaged, so only the attempt that creates it sends the opener
+        conversation = await self.supabase_service.create_conversation(
+            ConversationCreate(order_id=order_id, phone_number=phone)
+        )
+        if conversation is None:
+            print(f"Conversation for order {order_id} already started")
+            return
+
         initial_message = await self.vertex_ai_service.generate_response(
             product_title=product_title,
             original_size=original_size,
             conversation_history=[],
-            phase=ConversationPhase.CONFIRMATION
+            phase=ConversationPhase.CONFIRMATION,
+            line_items=self._prompt_items(line_items)
         )
 
         # Send the message via Twilio
@@ -57,7 +114,7 @@ class ConversationService:
             content=initial_message,
             conversation_phase=ConversationPhase.CONFIRMATION
         )
-        await self.supabase_service.create_message(message_create)
+        await self.save_message(message_create)
 
     async def process_customer_reply(self, from_phone: str, message_content: str) -> None:
         """
@@ -67,139 +124,148 @@ class ConversationService:
             from_phone: The customer's phone number
             message_content: The content of the message
         """
-        # Get the customer by phone number
-        customer = await self.supabase_service.get_customer_by_phone(from_phone)
-        if not customer:
-            # No customer found, can't process
-            print(f"Customer not found for phone {from_phone}")
-            return
-
-        # Get the conversation by phone number
-        conversation = await self.get_conversation_by_phone(from_phone)
-        if not conversation:
-            # No conversation found, can't process
-            print(f"No conversation found for phone {from_phone}")
-            return
-
-        # Get the most recent order with pending size confirmation
-        order = await self.supabase_service.get_order_with_pending_size_confirmation(customer.id)
-        if not order:
-            # No pending order found
-            print(f"No pending order found for customer {customer.id}")
-            return
-
-        # Get conversation history
-        conversation_history = await self.supabase_service.get_messages_by_order(order.id)
-        messages_dict = [msg.dict() for msg in conversation_history]
-
-        # Determine current phase based on last message
-        current_phase = ConversationPhase.CONFIRMATION
-        if conversation_history:
-            last_message = conversation_history[-1]
-            current_phase = last_message.conversation_phase or ConversationPhase.CONFIRMATION
-
-        # Detect intent from customer message
-        intent, entities = await self.vertex_ai_service.detect_intent(message_content)
-
-        # Save customer message to database
+        # Load the reply context while intent detection (which only needs the text) runs
+        context_task = asyncio.ensure_future(self._load_reply_context(from_phone))
+        intent_task = asyncio.ensure_future(self.vertex_ai_service.detect_intent(message_content))
+
+        try:
+            customer, conversation, order, line_items, conversation_history = await context_task
+            if not customer:
+                # No customer found, can't process
+                print(f"Customer not found for phone {from_phone}")
+                return
+
+            if not order:
+                # No pending order found
+                print(f"No pending order found for customer {customer.id}")
+                return
+
+            if not conversation:
+                # No conversation about the pending order, can't process
+                print(f"No conversation found for order {order.id}")
+                return
+
+            # Detect intent from customer message
+            intent, entities = await intent_task
+        finally:
+            # Drop lookups whose result is no longer needed
+            for task in (context_task, intent_task):
+                if not task.done():
+                    task.cancel()
+
+        # Record the reply and what it told us about the customer first, so they are
+        # kept whatever happens to the transition
         customer_message = MessageCreate(
             order_id=order.id,
             customer_id=customer.id,
             direction="inbound",
             content=message_content,
-            conversation_phase=current_phase,
+            conversation_phase=conversation.phase,
             intent=intent,
             entities=entities
         )
-        await self.supabase_service.create_message(customer_message)
+        await self.save_message(customer_message)
+        await self._update_customer_facts(customer, entities)
+
+        # Claim the transition before acting on it: the phase, collected sizing facts and
+        # pending recommendation live on the conversation row, which only changes if nobody
+        # else has changed it since it was read, so concurrent replies cannot both act on one phase
+        for _ in range(STATE_UPDATE_ATTEMPTS):
+            current_phase, transition, collected, recommendation = self._next_state(
+                conversation, customer, order, line_items, intent, entities
+            )
+            next_phase = transition.target
+            claimed = await self.supabase_service.update_conversation_state(
+                conversation.id,
+                conversation.version,
+                ConversationUpdate(
+                    phase=next_phase,
+                    status=PHASE_STATUS[next_phase],
+                    entities=collected,
+                    recommendation=recommendation
+                )
+            )
+            if claimed is not None:
+                break
+
+            # Another reply changed the conversation first, so decide again from its new state
+            customer, conversation, order, line_items, conversation_history = await self._load_reply_context(from_phone)
+            if not (customer and conversation and order):
+                print(f"Conversation for phone {from_phone} ended while processing a reply")
+                return
+        else:
+            print(f"Conversation {conversation.id} kept changing, reply not processed")
+            return
+
+        try:
+            await self._act_on_transition(
+                from_phone, customer, order, line_items, conversation_history, message_content,
+                entities, transition, collected, recommendation
+            )
+        except Exception:
+            # Nothing was answered, so the next message is handled from the phase this one was
+            await self._release_claim(conversation, claimed)
+            raise
+
+    async def _update_customer_facts(self, customer: Any, entities: Dict[str, Any]) -> None:
+        """
+        Store the sizing facts a reply gave on the customer
+        """
+        customer_update_data = {key: entities[key] for key in ("usual_size", "height", "weight") if entities.get(key)}
+        if not customer_update_data:
+            return
+        try:
+            customer_update = CustomerUpdate(**customer_update_data)
+        except ValidationError as e:
+            # Facts the model extracted in an unexpected form stay on the conversation only
+            print(f"Not updating customer {customer.id}: {e}")
+            return
+        await self.supabase_service.update_customer(customer.id, customer_update)
+
+    async def _act_on_transition(
+        self,
+        from_phone: str,
+        customer: Any,
+        order: Any,
+        line_items: List[Any],
+        conversation_history: List[Any],
+        message_content: str,
+        entities: Dict[str, Any],
+        transition: Transition,
+        collected: Dict[str, Any],
+        recommendation: Optional[Dict[str, Any]]
+    ) -> None:
+        """
+        Run a claimed transition's effects, then answer the customer from its target phase
+        """
+        next_phase = transition.target
 
         # Add customer message to conversation history for AI context
-        messages_dict.append(customer_message.dict())
-
-        # Update customer info if entities were detected
-        customer_update_data = {}
-        if entities.get("usual_size"):
-            customer_update_data["usual_size"] = entities["usual_size"]
-        if entities.get("height"):
-            customer_update_data["height"] = entities["height"]
-        if entities.get("weight"):
-            customer_update_data["weight"] = entities["weight"]
-
-        if customer_update_data:
-            await self.supabase_service.update_customer(customer.id, customer_update_data)
-
-        # Determine next phase based on intent
-        next_phase = current_phase
-
-        if current_phase == ConversationPhase.CONFIRMATION:
-            if intent == "CONFIRM":
-                # Customer confirmed size is correct
-                next_phase = ConversationPhase.COMPLETE
-
-                # Update the conversation status
-                await self.update_conversation_status(conversation.id, ConversationStatus.COMPLETED)
-
-                # Get the recommended size from entities or use original
-                new_size = entities.get("preferred_size") or order.original_size
-
-                # Update order in our database
-                order_update = OrderUpdate(
-                    confirmed_size=new_size,
-                    status="confirmed",
-                    size_confirmed=True
-                )
-                await self.supabase_service.update_order(order.id, order_update)
-
-            elif intent in ["UNSURE", "CHANGE_SIZE"]:
-                # Customer is unsure or wants to change size
-                next_phase = ConversationPhase.SIZING_QUESTIONS
-            # Leave as CONFIRMATION for OTHER intent
-
-        elif current_phase == ConversationPhase.SIZING_QUESTIONS:
-            # If we have enough information to make a recommendation
-            if (entities.get("usual_size") or (entities.get("height") and entities.get("weight"))):
-                next_phase = ConversationPhase.RECOMMENDATION
-
-        elif current_phase == ConversationPhase.RECOMMENDATION:
-            if intent == "CONFIRM":
-                # Customer confirmed the recommendation
-                next_phase = ConversationPhase.COMPLETE
-
-                # Update the conversation status
-                await self.update_conversation_status(conversation.id, ConversationStatus.COMPLETED)
-
-                # Get the recommended size from entities or use original
-                new_size = entities.get("preferred_size") or order.original_size
-
-                # Update order in our database
-                order_update = OrderUpdate(
-                    confirmed_size=new_size,
-                    status="confirmed",
-                    size_confirmed=True
-                )
-                await self.supabase_service.update_order(order.id, order_update)
+        messages = [{"direction": msg.direction, "content": msg.content} for msg in conversation_history]
+        messages.append({"direction": "inbound", "content": message_content})
+        if self.history_window:
+            messages = messages[-self.history_window:]
 
-                # Update order in Shopify
-                await self.shopify_service.update_order_size(
-                    order_id=order.shopify_order_id,
-                    line_item_id=order.line_item_id,
-                    new_size=new_size
-                )
+        sizing_facts = self._sizing_facts(customer, collected)
 
-                # Trigger fulfillment if size is confirmed
-                if intent == "CONFIRM":
-                    await self.shopify_service.trigger_fulfillment(order.shopify_order_id)
+        # Run the transition's effects, in the order the state machine lists them
+        turn = Turn(order=order, line_items=line_items, entities=entities, recommendation=recommendation)
+        for effect in transition.effects:
+            handler = self.effect_handlers.get(effect)
+            if handler is not None:
+                await handler(turn)
 
-                    # Update order as fulfilled
-                    fulfilled_update = OrderUpdate(fulfilled=True)
-                    await self.supabase_service.update_order(order.id, fulfilled_update)
+        if next_phase == ConversationPhase.RECOMMENDATION and recommendation:
+            sizing_facts.update({key: value for key, value in recommendation.items() if key != "sizes"})
 
         # Generate AI response based on the new phase
         ai_response = await self.vertex_ai_service.generate_response(
             product_title=order.product_title,
             original_size=order.original_size,
-            conversation_history=messages_dict,
-            phase=next_phase
+            conversation_history=messages,
+            phase=next_phase,
+            sizing_facts=sizing_facts,
+            line_items=self._prompt_items(line_items)
         )
 
         # Send the response to the customer
@@ -213,28 +279,339 @@ class ConversationService:
             content=ai_response,
             conversation_phase=next_phase
         )
-        await self.supabase_service.create_message(ai_message)
+        await self.save_message(ai_message)
 
-    async def get_conversation_by_phone(self, phone_number: str):
+    async def _release_claim(self, conversation: Any, claimed: Any) -> None:
         """
-        Get a conversation by phone number
+        Put a conversation back in the state it was read in, unless it has changed since it was claimed
+        """
+        phase = ConversationPhase(conversation.phase)
+        try:
+            released = await self.supabase_service.update_conversation_state(
+                conversation.id,
+                claimed.version,
+                ConversationUpdate(
+                    phase=phase,
+                    status=PHASE_STATUS[phase],
+                    entities=conversation.entities,
+                    recommendation=conversation.recommendation
+                )
+            )
+        except Exception as e:
+            print(f"Error releasing conversation {conversation.id}: {e}")
+            return
+        if released is None:
+            print(f"Conversation {conversation.id} changed before its failed reply could be released")
+
+    def _next_state(
+        self,
+        conversation: Any,
+        customer: Any,
+        order: Any,
+        line_items: List[Any],
+        intent: str,
+        entities: Dict[str, Any]
+    ) -> Tuple[ConversationPhase, Transition, Dict[str, Any], Optional[Dict[str, Any]]]:
+        """
+        Decide the conversation's transition from its stored state and the detected intent
 
         Args:
-            phone_number: The phone number to look up
+            conversation: The conversation, as read
+            customer: The customer
+            order: The pending order
+            line_items: The order's line items
+            intent: The intent detected in the reply
+            entities: The entities detected in the reply
 
         Returns:
-            The conversation if found, None otherwise
+            Tuple of (current_phase, transition, collected sizing facts, pending recommendation)
         """
-        # Query the database for the conversation with the given phone number
-        return await self.supabase_service.get_conversation_by_phone(phone_number)
+        current_phase = ConversationPhase(conversation.phase)
+        collected = {**(conversation.entities or {}), **{key: entities[key] for key in SIZING_ENTITIES if entities.get(key)}}
+        transition = conversation_machine.transition(current_phase, map_intent_to_event(intent, collected))
+
+        # Recommend once, and again only when the customer tells us something new,
+        # so what they confirm is what they were shown
+        recommendation = conversation.recommendation
+        if Effect.RECOMMEND in transition.effects:
+            if recommendation is None or any(entities.get(key) for key in RECOMMENDATION_FACTS):
+                recommendation = self._recommend(order, line_items, self._sizing_facts(customer, collected))
+
+        return current_phase, transition, collected, recommendation
+
+    async def _confirm_ordered_sizes(self, turn: Turn) -> None:
+        """
+        Confirm the sizes as ordered, or the size the customer named
+        """
+        turn.confirmed_sizes = self._confirmed_sizes(turn.order, turn.line_items, turn.entities)
+        turn.new_size = await self._store_confirmed_sizes(turn.order, turn.line_items, turn.confirmed_sizes)
+
+    async def _confirm_recommended_sizes(self, turn: Turn) -> None:
+        """
+        Confirm the recommended sizes, or the size the customer named
+        """
+        recommended_sizes = (turn.recommendation or {}).get("sizes")
+        turn.confirmed_sizes = self._confirmed_sizes(turn.order, turn.line_items, turn.entities, recommended_sizes)
+        turn.new_size = await self._store_confirmed_sizes(turn.order, turn.line_items, turn.confirmed_sizes)
+
+    async def _fulfil(self, turn: Turn) -> None:
+        """
+        Record the confirmed sizes in Shopify and fulfil the order in one round of calls
+        """
+        line_item_sizes = None
+        if len(turn.confirmed_sizes) > 1:
+            line_item_sizes = [
+                {"line_item_id": item.line_item_id, "product_title": item.product_title, "size": size}
+                for item, size in turn.confirmed_sizes
+            ]
+        _, fulfilled = await self.shopify_service.confirm_and_fulfil(
+            order_id=turn.order.shopify_order_id,
+            new_size=turn.new_size,
+            shop=turn.order.shop_domain,
+            line_item_sizes=line_item_sizes
+        )
+
+        if fulfilled:
+            # Update order as fulfilled
+            fulfilled_update = OrderUpdate(fulfilled=True)
+            await self.supabase_service.update_order(turn.order.id, fulfilled_update)
 
-    async def update_conversation_status(self, conversation_id: UUID, status: ConversationStatus) -> None:
+    def _recommend(self, order: Any, line_items: List[Any], sizing_facts: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """
-        Update the status of a conversation
+        Recommend a size for every item of the order
 
         Args:
-            conversation_id: The UUID of the conversation to update
-            status: The new status to set
+            order: The order
+            line_items: The order's line items; orders stored without them are a single item
+            sizing_facts: The customer's sizing facts
+
+        Returns:
+            The sizes by line item ID, with the facts that phrase them (recommended_size and
+            recommendation_confidence, or recommended_sizes for several items); None if
+            nothing is known about the customer or no item's size is in a chart, in which
+            case items keep the sizes ordered
+        """
+        items = line_items or [order]
+        recommendations = [(item, self._recommend_size(item, sizing_facts)) for item in items]
+        recommendations = [(item, recommendation) for item, recommendation in recommendations if recommendation]
+        if not recommendations:
+            return None
+
+        result: Dict[str, Any] = {
+            "sizes": {str(item.line_item_id): recommendation.size for item, recommendation in recommendations}
+        }
+        if len(items) > 1:
+            result["recommended_sizes"] = ", ".join(
+                f"{item.product_title} in {recommendation.size}" for item, recommendation in recommendations
+            )
+        else:
+            result["recommended_size"] = recommendations[0][1].size
+            result["recommendation_confidence"] = recommendations[0][1].confidence
+        return result
+
+    async def _load_reply_context(self, from_phone: str) -> Tuple[Optional[Any], Optional[Any], Optional[Any], List[Any], List[Any]]:
         """
-        update_data = ConversationUpdate(status=status)
-        await self.supabase_service.update_conversation(conversation_id, update_data)
+        Load the customer, conversation, pending order, its line items and message history for a reply
+
+        Uses the single-query reply context when available, otherwise runs the
+        customer -> order -> conversation and history chain. The conversation is
+        the pending order's, not the latest for the phone number, which may be
+        about an order already confirmed. Messages still buffered in the message
+        log are added to the history.
+
+        Args:
+            from_phone: The customer's phone number
+
+        Returns:
+            Tuple of (customer, conversation, order, line_items, conversation_history); missing values are None or empty
+        """
+        # Taken before the history is read, so a message written in between is not missed
+        pending = self.message_log.pending() if self.message_log is not None else []
+
+        context = await self.supabase_service.get_reply_context(from_phone, message_limit=self.history_window)
+        if context is not None:
+            customer, conversation, order = context.customer, context.conversation, context.order
+            line_items, conversation_history = context.line_items, context.messages
+        else:
+            customer, conversation, order, line_items, conversation_history = await self._load_order_chain(from_phone)
+
+        if order and pending:
+            conversation_history = merge_pending(conversation_history, pending, order.id, self.history_window)
+        return customer, conversation, order, line_items, conversation_history
+
+    async def _load_order_chain(self, from_phone: str) -> Tuple[Optional[Any], Optional[Any], Optional[Any], List[Any], List[Any]]:
+        """
+        Load the customer, their pending order with its conversation, line items and message history
+
+        Each lookup depends on the previous one, so they run in sequence; the
+        conversation, line items and history all only need the order, so they run together.
+
+        Args:
+            from_phone: The customer's phone number
+
+        Returns:
+            Tuple of (customer, conversation, order, line_items, conversation_history); missing values are None or empty
+        """
+        customer = await self.supabase_service.get_customer_by_phone(from_phone)
+        if not customer:
+            return None, None, None, [], []
+
+        order = await self.supabase_service.get_order_with_pending_size_confirmation(customer.id)
+        if not order:
+            return customer, None, None, [], []
+
+        conversation, line_items, conversation_history = await asyncio.gather(
+            self.get_conversation_by_phone(from_phone, order.id),
+            self.supabase_service.get_order_line_items(order.id),
+            self.supabase_service.get_messages_by_order(order.id, limit=self.history_window)
+        )
+        return customer, conversation, order, line_items, conversation_history
+
+    @staticmethod
+    def _prompt_items(line_items: Optional[List[Any]]) -> Optional[List[Dict[str, str]]]:
+        """
+        Get the products and sizes the model should confirm, for orders with several sized items
+
+        Args:
+            line_items: The order's line items
+
+        Returns:
+            Each item's product_title and original_size, or None for single-item orders
+        """
+        if not line_items or len(line_items) < 2:
+            return None
+        return [{"product_title": item.product_title, "original_size": item.original_size} for item in line_items]
+
+    def _confirmed_sizes(
+        self,
+        order: Any,
+        line_items: List[Any],
+        entities: Dict[str, Any],
+        recommended_sizes: Optional[Dict[str, str]] = None
+    ) -> List[Tuple[Any, str]]:
+        """
+        Decide the confirmed size of every item in the order
+
+        Args:
+            order: The order
+            line_items: The order's line items; orders stored without them are a single item
+            entities: The entities detected in the confirming message
+            recommended_sizes: The recommended sizes by line item ID, to confirm
+                them; None to confirm the sizes as ordered
+
+        Returns:
+            List of (item, size)
+        """
+        items = line_items or [order]
+        confirmed = []
+        for item in items:
+            size = None
+            # A preferred size can only be matched to an item when there is one
+            if len(items) == 1:
+                size = entities.get("preferred_size")
+            if not size and recommended_sizes is not None:
+                size = recommended_sizes.get(str(item.line_item_id))
+            confirmed.append((item, size or item.original_size))
+        return confirmed
+
+    async def _store_confirmed_sizes(self, order: Any, line_items: List[Any], confirmed_sizes: List[Tuple[Any, str]]) -> str:
+        """
+        Mark the order as confirmed and store each line item's size
+
+        Args:
+            order: The order
+            line_items: The order's line items
+            confirmed_sizes: List of (item, size) from _confirmed_sizes
+
+        Returns:
+            The confirmed size of the order's own line item
+        """
+        new_size = next(
+            (size for item, size in confirmed_sizes if item.line_item_id == order.line_item_id),
+            confirmed_sizes[0][1]
+        )
+        order_update = OrderUpdate(
+            confirmed_size=new_size,
+            status="confirmed",
+            size_confirmed=True
+        )
+        await self.supabase_service.update_order(order.id, order_update)
+
+        if line_items:
+            await self.supabase_service.set_line_item_sizes([
+                {"id": str(item.id), "confirmed_size": size} for item, size in confirmed_sizes
+            ])
+        return new_size
+
+    @staticmethod
+    def _sizing_facts(customer: Any, entities: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Collect what is known about the customer's size, so facts that fall
+        outside the history window still reach the model
+
+        Args:
+            customer: The customer
+            entities: The sizing facts collected in this conversation
+
+        Returns:
+            Dictionary of known usual_size, usual_brand, height, weight and preferred_size values
+        """
+        facts = {
+            "usual_size": customer.usual_size,
+            "height": customer.height,
+            "weight": customer.weight,
+        }
+        for key in SIZING_ENTITIES:
+            if entities.get(key):
+                facts[key] = entities[key]
+        return {key: value for key, value in facts.items() if value}
+
+    def _recommend_size(self, item: Any, sizing_facts: Dict[str, Any]) -> Optional[SizeRecommendation]:
+        """
+        Recommend a size for an order's or line item's product from the customer's sizing facts
+
+        Args:
+            item: The order or line item
+            sizing_facts: The customer's sizing facts
+
+        Returns:
+            The recommendation, or None if nothing is known about the customer or
+            the product has no chart with the ordered size
+        """
+        return self.size_recommender.recommend(
+            item.product_id,
+            height=sizing_facts.get("height"),
+            weight=sizing_facts.get("weight"),
+            usual_size=sizing_facts.get("usual_size"),
+            brand=sizing_facts.get("usual_brand"),
+            ordered_size=item.original_size
+        )
+
+    async def save_message(self, message: MessageCreate) -> Optional[Message]:
+        """
+        Store a conversation message, through the message log when write-behind is enabled
+
+        Args:
+            message: The message to store
+
+        Returns:
+            The stored message
+        """
+        if self.message_log is not None:
+            return await self.message_log.append(message)
+        return await self.supabase_service.create_message(message)
+
+    async def get_conversation_by_phone(self, phone_number: str, order_id: Optional[UUID] = None):
+        """
+        Get a conversation by phone number
+
+        Args:
+            phone_number: The phone number to look up
+            order_id: Only the conversation about this order
+
+        Returns:
+            The conversation if found, None otherwise
+        """
+        # Query the database for the conversation with the given phone number
+        return await self.supabase_service.get_conversation_by_phone(phone_number, order_id)
+
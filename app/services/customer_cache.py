@@ -0,0 +1,134 @@
+import os
+import time
+from typing import Any, Callable, Dict, Optional
+from uuid import UUID
+
+from app.models.customer import Customer
+from app.utils.cache import TTLCache
+
+
+class CustomerCache:
+    """
+    Read-through cache of customers, looked up by phone or Shopify customer ID
+
+    Each customer is cached once, by UUID; the phone and Shopify ID indexes
+    point at that UUID, so storing or invalidating a customer updates both
+    lookups. An index entry whose customer no longer has that phone or Shopify
+    ID (e.g. after a phone change) counts as a miss.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 300.0, clock: Callable[[], float] = time.monotonic):
+        self.customers = TTLCache(max_size=max_size, ttl=ttl, clock=clock)
+        self.by_phone = TTLCache(max_size=max_size, ttl=ttl, clock=clock)
+        self.by_shopify_id = TTLCache(max_size=max_size, ttl=ttl, clock=clock)
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, index: TTLCache, key: str, field: str) -> Optional[Customer]:
+        customer_id = index.get(key)
+        customer = self.customers.get(customer_id) if customer_id is not None else None
+        if customer is None or str(getattr(customer, field)) != key:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return customer
+
+    def get_by_phone(self, phone: str) -> Optional[Customer]:
+        """
+        Get a cached customer by phone number
+
+        Args:
+            phone: The phone number
+
+        Returns:
+            The customer, or None on a miss
+        """
+        return self._lookup(self.by_phone, phone, "phone")
+
+    def get_by_shopify_id(self, shopify_customer_id: Any) -> Optional[Customer]:
+        """
+        Get a cached customer by Shopify customer ID
+
+        Args:
+            shopify_customer_id: The Shopify customer ID
+
+        Returns:
+            The customer, or None on a miss
+        """
+        return self._lookup(self.by_shopify_id, str(shopify_customer_id), "shopify_customer_id")
+
+    def put(self, customer: Customer) -> None:
+        """
+        Cache a customer under both of its keys
+
+        Args:
+            customer: The customer as stored
+        """
+        self.customers.set(customer.id, customer)
+        if customer.phone:
+            self.by_phone.set(customer.phone, customer.id)
+        if customer.shopify_customer_id:
+            self.by_shopify_id.set(str(customer.shopify_customer_id), customer.id)
+
+    def invalidate(self, customer_id: UUID) -> None:
+        """
+        Drop a customer, e.g. before updating it
+
+        Args:
+            customer_id: The UUID of the customer
+        """
+        self.customers.delete(customer_id)
+
+    def clear(self) -> None:
+        """
+        Remove every customer
+        """
+        self.customers.clear()
+        self.by_phone.clear()
+        self.by_shopify_id.clear()
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Get hit/miss counters
+
+        Returns:
+            A dictionary with size, hits, misses and hit_rate
+        """
+        total = self.hits + self.misses
+        return {
+            "size": len(self.customers),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+_customer_cache: Optional[CustomerCache] = None
+
+
+def get_customer_cache() -> Optional[CustomerCache]:
+    """
+    Get the process-wide customer cache
+
+    Returns:
+        A cache of CUSTOMER_CACHE_SIZE customers kept for CUSTOMER_CACHE_TTL
+        seconds, or None when caching is disabled with CUSTOMER_CACHE_TTL=0
+    """
+    global _customer_cache
+    ttl = float(os.environ.get("CUSTOMER_CACHE_TTL", "300"))
+    if ttl <= 0:
+        return None
+
+    if _customer_cache is None:
+        _customer_cache = CustomerCache(
+            max_size=int(os.environ.get("CUSTOMER_CACHE_SIZE", "10000")),
+            ttl=ttl
+        )
+    return _customer_cache
+
+
+def customer_cache_metrics() -> Optional[Dict[str, Any]]:
+    """
+    Get the customer cache's metrics, if it has been created
+    """
+    return _customer_cache.metrics() if _customer_cache is not None else None
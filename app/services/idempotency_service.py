@@ -0,0 +1,86 @@
+import os
+from collections import OrderedDict
+from typing import Optional
+
+from app.services.supabase_service import SupabaseService
+
+
+class IdempotencyService:
+    """
+    Deduplicates webhook deliveries by their provider-assigned ID
+
+    Recently seen keys are answered from an in-memory LRU; everything else is
+    recorded in the webhook_deliveries table, whose primary key makes the
+    first delivery win even across processes.
+    """
+
+    def __init__(self, max_size: int = 10000, supabase_service: Optional[SupabaseService] = None):
+        self.max_size = max_size
+        self.supabase_service = supabase_service or SupabaseService()
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+
+    def _remember(self, key: str) -> None:
+        self._seen[key] = None
+        self._seen.move_to_end(key)
+        if len(self._seen) > self.max_size:
+            self._seen.popitem(last=False)
+
+    async def claim(self, key: str) -> bool:
+        """
+        Claim a delivery key
+
+        Args:
+            key: The delivery key, e.g. "shopify:<webhook id>" or "twilio:<MessageSid>"
+
+        Returns:
+            True if this is the first delivery and should be processed, False for a duplicate
+        """
+        if key in self._seen:
+            self._seen.move_to_end(key)
+            return False
+
+        # Remember before the round trip so concurrent duplicates in this process short-circuit
+        self._remember(key)
+        try:
+            return await self.supabase_service.record_webhook_delivery(key)
+        except Exception as e:
+            # Prefer a possible duplicate over dropping a delivery
+            print(f"Error recording webhook delivery {key}: {e}")
+            return True
+
+    async def release(self, key: str) -> None:
+        """
+        Forget a claimed key so a redelivery is processed, e.g. when the first attempt failed
+
+        Args:
+            key: The delivery key
+        """
+        self._seen.pop(key, None)
+        try:
+            await self.supabase_service.delete_webhook_delivery(key)
+        except Exception as e:
+            print(f"Error deleting webhook delivery {key}: {e}")
+
+    def clear(self) -> None:
+        """
+        Empty the in-memory cache
+        """
+        self._seen.clear()
+
+
+_idempotency_service: Optional[IdempotencyService] = None
+
+
+def get_idempotency_service() -> IdempotencyService:
+    """
+    Get the process-wide idempotency service
+
+    Returns:
+        The idempotency service, with an LRU of IDEMPOTENCY_CACHE_SIZE keys
+    """
+    global _idempotency_service
+    if _idempotency_service is None:
+        _idempotency_service = IdempotencyService(
+            max_size=int(os.environ.get("IDEMPOTENCY_CACHE_SIZE", "10000"))
+        )
+    return _idempotency_service
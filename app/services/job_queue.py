@@ -0,0 +1,287 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List, Optional
+
+from app.models.job import Job
+from app.services.supabase_service import SupabaseService
+
+
+class QueueFullError(Exception):
+    """
+    Raised when the queue already holds max_pending unfinished jobs
+    """
+
+
+class JobQueue(ABC):
+    """
+    A durable queue of background jobs
+
+    Workers claim jobs with a lease; a job whose worker dies before completing
+    it becomes claimable again once the lease expires. Enqueueing fails with
+    QueueFullError once max_pending jobs are waiting, so callers can push back.
+    """
+
+    def __init__(self, max_pending: int = 1000, lease_seconds: int = 300):
+        self.max_pending = max_pending
+        self.lease_seconds = lease_seconds
+
+    async def enqueue(self, job_type: str, payload: Dict[str, Any]) -> int:
+        """
+        Add a job to the queue
+
+        Args:
+            job_type: The job type, used to pick the handler
+            payload: JSON-serializable job arguments
+
+        Returns:
+            The job ID
+
+        Raises:
+            QueueFullError: If the queue is at capacity
+        """
+        if await self.pending_count() >= self.max_pending:
+            raise QueueFullError(f"Job queue is full ({self.max_pending} pending jobs)")
+        return await self._enqueue(job_type, payload)
+
+    @abstractmethod
+    async def _enqueue(self, job_type: str, payload: Dict[str, Any]) -> int:
+        """
+        Add a job to the backend, without the capacity check
+        """
+
+    @abstractmethod
+    async def claim(self, limit: int = 1) -> List[Job]:
+        """
+        Claim up to limit due jobs
+
+        Args:
+            limit: Maximum number of jobs to claim
+
+        Returns:
+            The claimed jobs, with attempts already incremented
+        """
+
+    @abstractmethod
+    async def complete(self, job: Job) -> None:
+        """
+        Mark a job as done
+
+        Args:
+            job: The claimed job
+        """
+
+    @abstractmethod
+    async def fail(self, job: Job, error: str, retry_in: Optional[float] = None) -> None:
+        """
+        Record a failed attempt
+
+        Args:
+            job: The claimed job
+            error: The error message
+            retry_in: Seconds until the job may run again, or None to give up on it
+        """
+
+    @abstractmethod
+    async def pending_count(self) -> int:
+        """
+        Count jobs that are waiting or running
+
+        Returns:
+            The number of unfinished jobs
+        """
+
+
+class SQLiteJobQueue(JobQueue):
+    """
+    Job queue stored in a local SQLite file (or in memory for tests)
+    """
+
+    def __init__(self, path: str = "jobs.db", **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_type TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                available_at REAL NOT NULL,
+                locked_until REAL,
+                last_error TEXT,
+                created_at REAL NOT NULL
+            )
+        """)
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS idx_jobs_status_available ON jobs(status, available_at)"
+        )
+
+    async def _run(self, func, *args):
+        # SQLite calls are short but blocking, so keep them off the event loop
+        return await asyncio.to_thread(self._locked, func, *args)
+
+    def _locked(self, func, *args):
+        with self._lock:
+            return func(*args)
+
+    def _insert(self, job_type: str, payload: Dict[str, Any]) -> int:
+        now = time.time()
+        cursor = self._connection.execute(
+            "INSERT INTO jobs (job_type, payload, available_at, created_at) VALUES (?, ?, ?, ?)",
+            (job_type, json.dumps(payload), now, now)
+        )
+        return cursor.lastrowid
+
+    def _claim(self, limit: int) -> List[Job]:
+        now = time.time()
+        self._connection.execute("BEGIN IMMEDIATE")
+        try:
+            rows = self._connection.execute(
+                """
+                SELECT * FROM jobs
+                WHERE (status = 'pending' AND available_at <= ?)
+                   OR (status = 'running' AND locked_until < ?)
+                ORDER BY id
+                LIMIT ?
+                """,
+                (now, now, limit)
+            ).fetchall()
+            for row in rows:
+                self._connection.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, locked_until = ? WHERE id = ?",
+                    (now + self.lease_seconds, row["id"])
+                )
+            self._connection.execute("COMMIT")
+        except Exception:
+            self._connection.execute("ROLLBACK")
+            raise
+
+        return [
+            Job(
+                id=row["id"],
+                job_type=row["job_type"],
+                payload=json.loads(row["payload"]),
+                attempts=row["attempts"] + 1,
+                last_error=row["last_error"]
+            )
+            for row in rows
+        ]
+
+    def _update(self, job_id: int, status: str, error: Optional[str] = None, available_at: Optional[float] = None) -> None:
+        self._connection.execute(
+            """
+            UPDATE jobs
+            SET status = ?, last_error = COALESCE(?, last_error),
+                available_at = COALESCE(?, available_at), locked_until = NULL
+            WHERE id = ?
+            """,
+            (status, error, available_at, job_id)
+        )
+
+    def _count(self) -> int:
+        row = self._connection.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status IN ('pending', 'running')"
+        ).fetchone()
+        return row[0]
+
+    def get_status(self, job_id: int) -> Optional[str]:
+        """
+        Get the status of a job (pending, running, done or dead)
+
+        Args:
+            job_id: The job ID
+
+        Returns:
+            The job status, or None if the job does not exist
+        """
+        with self._lock:
+            row = self._connection.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row["status"] if row else None
+
+    async def _enqueue(self, job_type: str, payload: Dict[str, Any]) -> int:
+        return await self._run(self._insert, job_type, payload)
+
+    async def claim(self, limit: int = 1) -> List[Job]:
+        return await self._run(self._claim, limit)
+
+    async def complete(self, job: Job) -> None:
+        await self._run(self._update, job.id, "done")
+
+    async def fail(self, job: Job, error: str, retry_in: Optional[float] = None) -> None:
+        if retry_in is None:
+            await self._run(self._update, job.id, "dead", error)
+        else:
+            await self._run(self._update, job.id, "pending", error, time.time() + retry_in)
+
+    async def pending_count(self) -> int:
+        return await self._run(self._count)
+
+
+class SupabaseJobQueue(JobQueue):
+    """
+    Job queue stored in the Supabase jobs table, shared by every worker process
+    """
+
+    def __init__(self, supabase_service: Optional[SupabaseService] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.supabase_service = supabase_service or SupabaseService()
+
+    async def _enqueue(self, job_type: str, payload: Dict[str, Any]) -> int:
+        return await self.supabase_service.enqueue_job(job_type, payload)
+
+    async def claim(self, limit: int = 1) -> List[Job]:
+        return await self.supabase_service.claim_jobs(limit, self.lease_seconds)
+
+    async def complete(self, job: Job) -> None:
+        await self.supabase_service.complete_job(job.id)
+
+    async def fail(self, job: Job, error: str, retry_in: Optional[float] = None) -> None:
+        retry_at = None
+        if retry_in is not None:
+            retry_at = (datetime.now(timezone.utc) + timedelta(seconds=retry_in)).isoformat()
+        await self.supabase_service.fail_job(job.id, error, retry_at)
+
+    async def pending_count(self) -> int:
+        return await self.supabase_service.count_pending_jobs()
+
+
+_job_queue: Optional[JobQueue] = None
+
+
+def get_job_queue() -> JobQueue:
+    """
+    Get the process-wide job queue configured by JOB_QUEUE_BACKEND
+
+    The Supabase jobs table is the default, as it survives the web process and
+    is shared with whichever worker drains it. "sqlite" keeps jobs in a local
+    file, for development and single-server deployments with a writable disk.
+
+    Returns:
+        A SupabaseJobQueue for "supabase", or a SQLiteJobQueue at JOB_QUEUE_PATH
+        for "sqlite" (the default when TESTING is set, in memory)
+    """
+    global _job_queue
+    if _job_queue is None:
+        options = {
+            "max_pending": int(os.environ.get("JOB_QUEUE_MAX_PENDING", "1000")),
+            "lease_seconds": int(os.environ.get("JOB_QUEUE_LEASE_SECONDS", "300")),
+        }
+        testing = os.environ.get("TESTING", "").lower() == "true"
+        backend = os.environ.get("JOB_QUEUE_BACKEND", "sqlite" if testing else "supabase").lower()
+        if backend == "supabase":
+            _job_queue = SupabaseJobQueue(**options)
+        elif backend == "sqlite":
+            path = ":memory:" if testing else os.environ.get("JOB_QUEUE_PATH", "jobs.db")
+            _job_queue = SQLiteJobQueue(path, **options)
+        else:
+            raise ValueError(f"Unknown JOB_QUEUE_BACKEND {backend!r}, expected 'supabase' or 'sqlite'")
+    return _job_queue
@@ -0,0 +1,215 @@
+import os
+import time
+import asyncio
+from typing import Dict, Any, Callable, Awaitable, List, Optional
+
+from app.models.job import Job
+from app.services.job_queue import JobQueue, get_job_queue
+from app.services.order_service import OrderService
+from app.services.recommendation_batch import RecommendationBatch
+from app.services.message_log import stop_message_log
+
+
+ORDER_CREATED = "order_created"
+RECOMMENDATION_BACKFILL = "recommendation_backfill"
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class JobWorker:
+    """
+    Runs queued jobs with a fixed number of concurrent workers
+
+    Failed jobs are retried with exponential backoff until max_attempts is
+    reached, after which they are marked dead.
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        handlers: Dict[str, JobHandler],
+        concurrency: int = 4,
+        poll_interval: float = 1.0,
+        max_attempts: int = 5,
+        backoff_base: float = 2.0
+    ):
+        self.queue = queue
+        self.handlers = handlers
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = asyncio.Event()
+
+    async def process(self, job: Job) -> None:
+        """
+        Run one claimed job and record the outcome
+
+        Args:
+            job: The claimed job
+        """
+        handler = self.handlers.get(job.job_type)
+        if handler is None:
+            await self.queue.fail(job, f"No handler for job type {job.job_type}")
+            return
+
+        try:
+            await handler(job.payload)
+        except Exception as e:
+            if job.attempts >= self.max_attempts:
+                print(f"Job {job.id} ({job.job_type}) failed permanently: {e}")
+                await self.queue.fail(job, str(e))
+            else:
+                retry_in = self.backoff_base ** job.attempts
+                print(f"Job {job.id} ({job.job_type}) failed, retrying in {retry_in}s: {e}")
+                await self.queue.fail(job, str(e), retry_in=retry_in)
+            return
+
+        await self.queue.complete(job)
+
+    async def run_once(self) -> int:
+        """
+        Claim and run one batch of due jobs
+
+        Returns:
+            The number of jobs run
+        """
+        jobs = await self.queue.claim(self.concurrency)
+        await asyncio.gather(*(self.process(job) for job in jobs))
+        return len(jobs)
+
+    async def drain(self, max_seconds: float) -> int:
+        """
+        Run batches of due jobs until none are left or max_seconds have passed
+
+        For deployments without a long-running worker, where a scheduled request
+        drains the queue instead (see /jobs/drain).
+
+        Args:
+            max_seconds: Stop starting batches after this long
+
+        Returns:
+            The number of jobs run
+        """
+        deadline = time.monotonic() + max_seconds
+        processed = 0
+        while time.monotonic() < deadline:
+            count = await self.run_once()
+            if count == 0:
+                break
+            processed += count
+        return processed
+
+    async def _loop(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                jobs = await self.queue.claim(1)
+            except Exception as e:
+                print(f"Error claiming jobs: {e}")
+                jobs = []
+
+            if not jobs:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await self.process(jobs[0])
+            except Exception as e:
+                # The job's lease expires and it is claimed again
+                print(f"Error recording outcome of job {jobs[0].id}: {e}")
+
+    def start(self) -> None:
+        """
+        Start the worker loops on the running event loop
+        """
+        self._stopping.clear()
+        self._tasks = [asyncio.ensure_future(self._loop()) for _ in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        """
+        Stop claiming new jobs and wait for running jobs to finish
+        """
+        self._stopping.set()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+_order_service: Optional[OrderService] = None
+
+
+async def handle_order_created(payload: Dict[str, Any]) -> None:
+    """
+    Store a new order and start its size confirmation conversation
+
+    Args:
+        payload: The customer_data and order_details parsed from the order webhook
+    """
+    global _order_service
+    if _order_service is None:
+        _order_service = OrderService()
+
+    await _order_service.process_order(payload["customer_data"], payload["order_details"])
+
+
+async def handle_recommendation_backfill(payload: Dict[str, Any]) -> None:
+    """
+    Re-score one page of stored orders against the current size charts, then queue the next page
+
+    Each job is a single page, so it finishes well within the job lease and a
+    /jobs/drain run, and a retry repeats only its own page.
+
+    Args:
+        payload: Optional page_size, and after_id (the last order ID of the previous page)
+    """
+    page_size = payload.get("page_size", 1000)
+    result = await RecommendationBatch(page_size=page_size).run_page(payload.get("after_id"))
+    print(f"Recommendation back-fill page scanned {result['scanned']} orders, updated {result['updated']}")
+
+    if result["next_after_id"] is not None:
+        await get_job_queue().enqueue(
+            RECOMMENDATION_BACKFILL, {"page_size": page_size, "after_id": result["next_after_id"]}
+        )
+
+
+def create_worker(queue: Optional[JobQueue] = None) -> JobWorker:
+    """
+    Create a worker for the configured queue with the application's job handlers
+
+    Args:
+        queue: The queue to consume, defaults to the process-wide queue
+
+    Returns:
+        The worker
+    """
+    return JobWorker(
+        queue or get_job_queue(),
+        handlers={
+            ORDER_CREATED: handle_order_created,
+            RECOMMENDATION_BACKFILL: handle_recommendation_backfill,
+        },
+        concurrency=int(os.environ.get("JOB_WORKER_CONCURRENCY", "4")),
+        poll_interval=float(os.environ.get("JOB_WORKER_POLL_INTERVAL", "1.0")),
+        max_attempts=int(os.environ.get("JOB_WORKER_MAX_ATTEMPTS", "5"))
+    )
+
+
+async def main() -> None:
+    worker = create_worker()
+    worker.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await worker.stop()
+        await stop_message_log()
+
+
+# Run a standalone worker process: python -m app.services.job_worker
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    asyncio.run(main())
@@ -0,0 +1,143 @@
+import os
+import json
+import asyncio
+import argparse
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from app.services.supabase_service import SupabaseService
+
+
+class MessageArchive:
+    """
+    Moves the messages of long-completed conversations to Parquet files
+
+    Messages are read from Supabase a page at a time, each page is written to
+    its own zstd-compressed Parquet file and only then deleted, so the
+    messages table (partitioned by month) keeps just the conversations that
+    can still be replied to. Monthly partitions that archiving empties are
+    dropped, and the coming months' partitions are created.
+
+    A page whose delete fails is archived again by the next run, so readers
+    of the archive should de-duplicate on the message ID.
+    """
+
+    def __init__(
+        self,
+        supabase_service: Optional[SupabaseService] = None,
+        archive_path: str = "message_archive",
+        older_than_days: int = 90,
+        page_size: int = 1000,
+        months_ahead: int = 3
+    ):
+        self.supabase_service = supabase_service or SupabaseService()
+        self.archive_path = archive_path
+        self.older_than_days = older_than_days
+        self.page_size = page_size
+        self.months_ahead = months_ahead
+
+    def write_page(self, rows: List[Dict[str, Any]], path: str) -> None:
+        """
+        Write a page of messages to a Parquet file
+
+        Args:
+            rows: Message rows as returned by Supabase
+            path: The file to write; it only appears once complete
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        # entities is free-form JSON, so it is kept as text to give every file one schema
+        schema = pa.schema([
+            ("id", pa.string()),
+            ("order_id", pa.string()),
+            ("customer_id", pa.string()),
+            ("direction", pa.string()),
+            ("content", pa.string()),
+            ("media_url", pa.string()),
+            ("conversation_phase", pa.string()),
+            ("intent", pa.string()),
+            ("entities", pa.string()),
+            ("created_at", pa.timestamp("us", tz="UTC")),
+        ])
+        records = [
+            {
+                **{name: row.get(name) for name in schema.names},
+                "entities": json.dumps(row["entities"]) if row.get("entities") is not None else None,
+                "created_at": datetime.fromisoformat(row["created_at"]),
+            }
+            for row in rows
+        ]
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        temporary_path = f"{path}.tmp"
+        pq.write_table(pa.Table.from_pylist(records, schema=schema), temporary_path, compression="zstd")
+        os.replace(temporary_path, path)
+
+    async def run(self) -> Dict[str, int]:
+        """
+        Archive every message of conversations completed more than older_than_days ago
+
+        Returns:
+            Counts of messages archived, files written and partitions created and dropped
+        """
+        now = datetime.now(timezone.utc)
+        before = now - timedelta(days=self.older_than_days)
+        run_id = now.strftime("%Y%m%dT%H%M%SZ")
+
+        created = await self.supabase_service.create_message_partitions(self.months_ahead)
+        archived = 0
+        files = 0
+
+        while True:
+            rows = await self.supabase_service.get_archivable_messages(before, limit=self.page_size)
+            if not rows:
+                break
+
+            path = os.path.join(self.archive_path, f"messages-{run_id}-{files:05d}.parquet")
+            await asyncio.to_thread(self.write_page, rows, path)
+            files += 1
+
+            deleted = await self.supabase_service.delete_messages([row["id"] for row in rows])
+            archived += deleted
+            if deleted == 0:
+                # Nothing could be deleted, so the same page would be read again
+                print(f"Archived {path} but deleted no messages, stopping")
+                break
+            if len(rows) < self.page_size:
+                break
+
+        dropped = await self.supabase_service.drop_empty_message_partitions(before)
+        return {
+            "archived": archived,
+            "files": files,
+            "partitions_created": created,
+            "partitions_dropped": dropped,
+        }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Archive the messages of completed conversations to Parquet files")
+    parser.add_argument("--path", default=os.environ.get("MESSAGE_ARCHIVE_PATH", "message_archive"))
+    parser.add_argument("--older-than-days", type=int, default=int(os.environ.get("MESSAGE_ARCHIVE_AFTER_DAYS", "90")))
+    parser.add_argument("--page-size", type=int, default=int(os.environ.get("MESSAGE_ARCHIVE_PAGE_SIZE", "1000")))
+    args = parser.parse_args()
+
+    result = await MessageArchive(
+        archive_path=args.path,
+        older_than_days=args.older_than_days,
+        page_size=args.page_size
+    ).run()
+    print(
+        f"Archived {result['archived']} messages to {result['files']} files, "
+        f"created {result['partitions_created']} partitions, dropped {result['partitions_dropped']}"
+    )
+
+
+# Archive from the command line (e.g. a monthly cron job): python -m app.services.message_archive
+# Needs pyarrow, which the web app does not: pip install pyarrow
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    asyncio.run(main())
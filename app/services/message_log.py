@@ -0,0 +1,271 @@
+import os
+import asyncio
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from uuid import UUID, uuid4
+
+from app.models.message import Message, MessageCreate
+from app.services.supabase_service import SupabaseService
+
+
+class SQLiteMessageSpool:
+    """
+    Local SQLite copy of the messages not yet written to Supabase
+
+    Messages are added before they are acknowledged and removed once their
+    batch is stored, so whatever is left after a crash is replayed on the next start.
+    """
+
+    def __init__(self, path: str = "message_spool.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS messages (
+                id TEXT PRIMARY KEY,
+                payload TEXT NOT NULL
+            )
+        """)
+
+    async def _run(self, func, *args):
+        # SQLite calls are short but blocking, so keep them off the event loop
+        return await asyncio.to_thread(self._locked, func, *args)
+
+    def _locked(self, func, *args):
+        with self._lock:
+            return func(*args)
+
+    def _insert(self, message: Message) -> None:
+        self._connection.execute(
+            "INSERT OR REPLACE INTO messages (id, payload) VALUES (?, ?)",
+            (str(message.id), message.json())
+        )
+
+    def _delete(self, message_ids: List[str]) -> None:
+        self._connection.executemany("DELETE FROM messages WHERE id = ?", [(message_id,) for message_id in message_ids])
+
+    def load(self) -> List[Message]:
+        """
+        Get every spooled message, oldest first
+        """
+        with self._lock:
+            rows = self._connection.execute("SELECT payload FROM messages ORDER BY rowid").fetchall()
+        return [Message.parse_raw(row[0]) for row in rows]
+
+    async def add(self, message: Message) -> None:
+        await self._run(self._insert, message)
+
+    async def remove(self, messages: List[Message]) -> None:
+        await self._run(self._delete, [str(message.id) for message in messages])
+
+
+class MessageLog:
+    """
+    Write-behind log of conversation messages
+
+    Messages are appended to an in-process buffer and written to Supabase in
+    multi-row inserts once max_batch messages are waiting or flush_interval
+    seconds have passed, so replies do not wait on the insert. Each message
+    gets its ID and timestamp when appended, so history order is unaffected
+    and replayed batches are not stored twice. Until written, messages are
+    returned by pending() so the next reply's history can include them.
+    """
+
+    def __init__(
+        self,
+        supabase_service: Optional[SupabaseService] = None,
+        spool: Optional[SQLiteMessageSpool] = None,
+        max_batch: int = 50,
+        flush_interval: float = 1.0
+    ):
+        self.supabase_service = supabase_service or SupabaseService()
+        self.spool = spool
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        # Messages spooled before a crash are written with the first batch
+        self._buffer: List[Message] = spool.load() if spool is not None else []
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.appended = 0
+        self.written = 0
+        self.batches = 0
+        self.failed_batches = 0
+
+    def start(self) -> None:
+        """
+        Start the background flusher, if it is not running
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def append(self, message: MessageCreate) -> Message:
+        """
+        Add a message to the log
+
+        Args:
+            message: The message to store
+
+        Returns:
+            The message as it will be stored
+        """
+        self.start()
+        stored = Message(id=uuid4(), created_at=datetime.now(timezone.utc), **message.dict())
+        if self.spool is not None:
+            await self.spool.add(stored)
+        self._buffer.append(stored)
+        self.appended += 1
+        if len(self._buffer) >= self.max_batch:
+            self._wakeup.set()
+        return stored
+
+    def pending(self) -> List[Message]:
+        """
+        Get the messages that are not yet written, oldest first
+
+        Returns:
+            A copy of the buffer
+        """
+        return list(self._buffer)
+
+    async def flush(self) -> int:
+        """
+        Write every buffered message, a batch at a time
+
+        A batch that fails stays buffered (and spooled) for the next flush.
+
+        Returns:
+            The number of messages written
+        """
+        written = 0
+        async with self._flush_lock:
+            while self._buffer:
+                batch = self._buffer[:self.max_batch]
+                try:
+                    await self.supabase_service.create_messages(batch)
+                except Exception as e:
+                    self.failed_batches += 1
+                    print(f"Error writing {len(batch)} messages, retrying later: {e}")
+                    break
+
+                # Appends only add to the end, so the batch is still at the front
+                del self._buffer[:len(batch)]
+                if self.spool is not None:
+                    await self.spool.remove(batch)
+                written += len(batch)
+                self.batches += 1
+
+        self.written += written
+        return written
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._buffer:
+                await self.flush()
+
+    async def stop(self) -> None:
+        """
+        Write everything buffered, then stop the background flusher
+        """
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._buffer:
+            await self.flush()
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Get buffer and write counters
+
+        Returns:
+            A dictionary with buffered, appended, written, batches and failed_batches counts
+        """
+        return {
+            "buffered": len(self._buffer),
+            "appended": self.appended,
+            "written": self.written,
+            "batches": self.batches,
+            "failed_batches": self.failed_batches,
+        }
+
+
+def merge_pending(history: List[Any], pending: List[Message], order_id: UUID, limit: Optional[int] = None) -> List[Any]:
+    """
+    Add an order's buffered messages that are missing from its stored history
+
+    Args:
+        history: The stored messages, oldest first
+        pending: The buffered messages, taken before the history was read so
+            none written in between is missed
+        order_id: The UUID of the order
+        limit: Only keep the most recent messages, or None for all of them
+
+    Returns:
+        The combined history, oldest first
+    """
+    stored_ids = {message.id for message in history}
+    missing = [message for message in pending if message.order_id == order_id and message.id not in stored_ids]
+    if not missing:
+        return history
+
+    # Anything still buffered was appended after everything already stored
+    merged = list(history) + missing
+    return merged[-limit:] if limit else merged
+
+
+_message_log: Optional[MessageLog] = None
+
+
+def get_message_log() -> Optional[MessageLog]:
+    """
+    Get the process-wide message log, if MESSAGE_WRITE_BEHIND=true
+
+    Write-behind is off by default: on serverless platforms the filesystem is
+    read-only and a frozen instance never flushes its buffer, which would lose
+    messages the customer has already seen. Buffered messages are spooled to
+    MESSAGE_LOG_SPOOL_PATH, and without one messages are written as they are
+    created (when TESTING is set, they are buffered without a spool).
+
+    Returns:
+        The message log, or None to write messages as they are created
+    """
+    global _message_log
+    if os.environ.get("MESSAGE_WRITE_BEHIND", "false").lower() != "true":
+        return None
+    if _message_log is None:
+        testing = os.environ.get("TESTING", "").lower() == "true"
+        path = os.environ.get("MESSAGE_LOG_SPOOL_PATH", "")
+        if not path and not testing:
+            print("Warning: MESSAGE_WRITE_BEHIND is set without MESSAGE_LOG_SPOOL_PATH, writing messages as they are created")
+            return None
+        _message_log = MessageLog(
+            spool=SQLiteMessageSpool(path) if path and not testing else None,
+            max_batch=int(os.environ.get("MESSAGE_LOG_BATCH_SIZE", "50")),
+            flush_interval=float(os.environ.get("MESSAGE_LOG_FLUSH_INTERVAL", "1.0"))
+        )
+    return _message_log
+
+
+def message_log_metrics() -> Optional[Dict[str, Any]]:
+    """
+    Get the message log's metrics, if it has been created
+    """
+    return _message_log.metrics() if _message_log is not None else None
+
+
+async def stop_message_log() -> None:
+    """
+    Flush and stop the process-wide message log, if it has been created
+    """
+    if _message_log is not None:
+        await _message_log.stop()
@@ -0,0 +1,57 @@
+from typing import Dict, Any
+
+from app.services.supabase_service import SupabaseService
+from app.services.conversation_service import ConversationService
+from app.models.customer import CustomerCreate
+from app.models.order import OrderCreate, OrderLineItemCreate
+
+
+class OrderService:
+    def __init__(self):
+        self.supabase_service = SupabaseService()
+        self.conversation_service = ConversationService()
+
+    async def process_order(self, customer_data: Dict[str, Any], order_details: Dict[str, Any]) -> None:
+        """
+        Store a new Shopify order and start the size confirmation conversation
+
+        Safe to retry and to run concurrently for the same customer or order:
+        the customer and order are upserted on their Shopify IDs, so each takes
+        one write and a row stored by another attempt is reused.
+
+        Args:
+            customer_data: The customer data parsed from the order webhook
+            order_details: The order details parsed from the order webhook
+        """
+        customer = await self.supabase_service.upsert_customer(CustomerCreate(**customer_data))
+
+        order = await self.supabase_service.upsert_order(OrderCreate(
+            shopify_order_id=order_details["shopify_order_id"],
+            customer_id=customer.id,
+            order_number=order_details["order_number"],
+            original_size=order_details["original_size"],
+            product_id=order_details["product_id"],
+            variant_id=order_details["variant_id"],
+            line_item_id=order_details["line_item_id"],
+            product_title=order_details["product_title"],
+            shop_domain=order_details.get("shop_domain")
+        ))
+
+        # Store every sized line item in one request, so they are all confirmed
+        # in the same conversation; items stored by a previous attempt are skipped
+        line_items = [
+            OrderLineItemCreate(order_id=order.id, **item)
+            for item in order_details.get("line_items") or []
+        ]
+        if line_items:
+            await self.supabase_service.create_order_line_items(line_items)
+
+        # Start conversation with customer
+        await self.conversation_service.start_conversation(
+            order_id=order.id,
+            customer_id=customer.id,
+            phone=customer_data["phone"],
+            product_title=order_details["product_title"],
+            original_size=order_details["original_size"],
+            line_items=line_items
+        )
@@ -0,0 +1,124 @@
+import os
+import asyncio
+import argparse
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+from app.services.supabase_service import SupabaseService
+from app.utils.size_recommender import SizeRecommender, get_size_recommender
+
+
+class RecommendationBatch:
+    """
+    Re-scores stored orders against the current size charts
+
+    Orders are streamed from Supabase a page at a time (keyset pagination on
+    the order ID), each page is scored per product in one vectorized pass, and
+    the page's recommendations are written back in a single statement. The
+    next page is fetched while the current one is written, and at most two
+    pages are held in memory.
+    """
+
+    def __init__(
+        self,
+        supabase_service: Optional[SupabaseService] = None,
+        recommender: Optional[SizeRecommender] = None,
+        page_size: int = 1000
+    ):
+        self.supabase_service = supabase_service or SupabaseService()
+        self.recommender = recommender or get_size_recommender()
+        self.page_size = page_size
+
+    def score_page(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Recommend sizes for a page of orders
+
+        Args:
+            rows: Orders with id, product_id, original_size and a customers object
+
+        Returns:
+            Rows with id, recommended_size and recommendation_confidence, for
+            orders whose customer has any sizing facts and whose size is in the product's chart
+        """
+        by_product_size: Dict[Any, List[Dict[str, Any]]] = defaultdict(list)
+        for row in rows:
+            by_product_size[(row.get("product_id"), row.get("original_size"))].append(row)
+
+        results = []
+        for (product_id, ordered_size), orders in by_product_size.items():
+            customers = [order.get("customers") or {} for order in orders]
+            recommendations = self.recommender.recommend_many(product_id, customers, ordered_size)
+            for order, recommendation in zip(orders, recommendations):
+                if recommendation is not None:
+                    results.append({
+                        "id": order["id"],
+                        "recommended_size": recommendation.size,
+                        "recommendation_confidence": recommendation.confidence,
+                    })
+        return results
+
+    async def run_page(self, after_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Re-score one page of orders, for callers that spread a back-fill over many short runs
+
+        Args:
+            after_id: The last order ID of the previous page; None for the first page
+
+        Returns:
+            Counts of orders scanned and updated, and next_after_id to continue
+            from, or None if this was the last page
+        """
+        page = await self.supabase_service.get_orders_for_recommendation(after_id=after_id, limit=self.page_size)
+        updated = await self.supabase_service.set_order_recommendations(self.score_page(page)) if page else 0
+        return {
+            "scanned": len(page),
+            "updated": updated,
+            "next_after_id": page[-1]["id"] if len(page) == self.page_size else None,
+        }
+
+    async def run(self) -> Dict[str, int]:
+        """
+        Re-score every order
+
+        Returns:
+            Counts of orders scanned and updated
+        """
+        scanned = 0
+        updated = 0
+        page = await self.supabase_service.get_orders_for_recommendation(limit=self.page_size)
+
+        while page:
+            scanned += len(page)
+            next_page = None
+            if len(page) == self.page_size:
+                next_page = asyncio.ensure_future(
+                    self.supabase_service.get_orders_for_recommendation(after_id=page[-1]["id"], limit=self.page_size)
+                )
+
+            try:
+                updated += await self.supabase_service.set_order_recommendations(self.score_page(page))
+            except BaseException:
+                if next_page is not None:
+                    next_page.cancel()
+                raise
+
+            page = await next_page if next_page is not None else []
+
+        return {"scanned": scanned, "updated": updated}
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Re-score stored orders against the current size charts")
+    parser.add_argument("--page-size", type=int, default=int(os.environ.get("RECOMMENDATION_BATCH_PAGE_SIZE", "1000")))
+    args = parser.parse_args()
+
+    result = await RecommendationBatch(page_size=args.page_size).run()
+    print(f"Scanned {result['scanned']} orders, updated {result['updated']}")
+
+
+# Back-fill recommendations from the command line: python -m app.services.recommendation_batch
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    asyncio.run(main())
@@ -0,0 +1,128 @@
+import os
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.utils.cache import TTLCache
+from app.services.supabase_service import SupabaseService
+
+
+class ResponseCache:
+    """
+    Cache of generated AI responses, backed by an in-process TTL/LRU cache
+
+    Concurrent misses for the same key share one generation, so a burst of
+    identical requests costs a single model call.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 3600.0):
+        self.local = TTLCache(max_size=max_size, ttl=ttl)
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    async def get(self, key: str) -> Optional[str]:
+        return self.local.get(key)
+
+    async def set(self, key: str, value: str) -> None:
+        self.local.set(key, value)
+
+    async def get_or_generate(self, key: str, generate: Callable[[], Awaitable[Optional[str]]]) -> Optional[str]:
+        """
+        Return the cached response for key, generating and storing it on a miss
+
+        Args:
+            key: The cache key
+            generate: Coroutine function producing the response; None results are not cached
+
+        Returns:
+            The cached or generated response
+        """
+        cached = await self.get(key)
+        if cached is not None:
+            return cached
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            return await asyncio.shield(in_flight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            value = await generate()
+            if value is not None:
+                await self.set(key, value)
+            future.set_result(value)
+            return value
+        except Exception as e:
+            future.set_exception(e)
+            # Waiters re-raise it; mark it retrieved so it is not reported twice
+            future.exception()
+            raise
+        except BaseException:
+            # The generating call was cancelled; cancel the waiters too rather than leave them hanging
+            future.cancel()
+            raise
+        finally:
+            self._in_flight.pop(key, None)
+
+    def metrics(self) -> Dict[str, Any]:
+        return self.local.metrics()
+
+
+class SupabaseResponseCache(ResponseCache):
+    """
+    Response cache shared across processes through the response_cache table,
+    with the in-process cache in front of it
+    """
+
+    def __init__(self, supabase_service: Optional[SupabaseService] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.supabase_service = supabase_service or SupabaseService()
+
+    async def get(self, key: str) -> Optional[str]:
+        value = self.local.get(key)
+        if value is not None:
+            return value
+
+        try:
+            value = await self.supabase_service.get_cached_response(key)
+        except Exception as e:
+            print(f"Error reading response cache: {e}")
+            return None
+
+        if value is not None:
+            self.local.set(key, value)
+        return value
+
+    async def set(self, key: str, value: str) -> None:
+        self.local.set(key, value)
+        try:
+            await self.supabase_service.set_cached_response(key, value, self.local.ttl)
+        except Exception as e:
+            print(f"Error writing response cache: {e}")
+
+
+_response_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """
+    Get the process-wide response cache configured by RESPONSE_CACHE_BACKEND
+
+    Returns:
+        A ResponseCache for "memory" (the default), a SupabaseResponseCache for
+        "supabase", or None when caching is disabled with "none"
+    """
+    global _response_cache
+    backend = os.environ.get("RESPONSE_CACHE_BACKEND", "memory").lower()
+    if backend == "none":
+        return None
+
+    if _response_cache is None:
+        options = {
+            "max_size": int(os.environ.get("RESPONSE_CACHE_MAX_SIZE", "1024")),
+            "ttl": float(os.environ.get("RESPONSE_CACHE_TTL", "3600")),
+        }
+        if backend == "supabase":
+            _response_cache = SupabaseResponseCache(**options)
+        else:
+            _response_cache = ResponseCache(**options)
+    return _response_cache
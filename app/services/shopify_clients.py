@@ -0,0 +1,232 @@
+import os
+import asyncio
+import sqlite3
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from app.utils.executor import get_executor
+from app.utils.http_pool import close_http_client
+from app.services.shopify_graphql import ShopifyGraphQLClient
+from app.services.shopify_scheduler import ShopifyScheduler
+from app.services.supabase_service import SupabaseService
+
+# The embedded app's Prisma schema, whose relative SQLite paths are resolved from its directory
+PRISMA_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "size-confirmation-agent", "prisma")
+
+
+class UnknownShopError(Exception):
+    """
+    No access token is stored for the shop, e.g. the app is not installed there
+    """
+
+
+class SqliteSessionStore:
+    """
+    Reads offline access tokens from the embedded app's Prisma SQLite session store
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.executor = get_executor("shopify_sessions")
+
+    def _query(self, shop: str) -> Optional[str]:
+        connection = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        try:
+            row = connection.execute(
+                'SELECT accessToken FROM "Session" WHERE shop = ? AND isOnline = 0 ORDER BY id = ? DESC LIMIT 1',
+                (shop, f"offline_{shop}")
+            ).fetchone()
+        finally:
+            connection.close()
+        return row[0] if row else None
+
+    async def get_access_token(self, shop: str) -> Optional[str]:
+        """
+        Get the shop's offline access token
+
+        Args:
+            shop: The shop domain
+
+        Returns:
+            The access token, or None if the app is not installed on the shop
+        """
+        return await self.executor.run(self._query, shop)
+
+
+class SupabaseSessionStore:
+    """
+    Reads offline access tokens from the Prisma session table when the embedded
+    app's datasource is the Supabase Postgres database
+    """
+
+    def __init__(self, supabase_service: Optional[SupabaseService] = None):
+        self.supabase_service = supabase_service or SupabaseService()
+
+    async def get_access_token(self, shop: str) -> Optional[str]:
+        return await self.supabase_service.get_shopify_access_token(shop)
+
+
+class ShopifyClientRegistry:
+    """
+    GraphQL clients for every shop the app is installed on
+
+    Clients are created on first use from the shop's offline access token and
+    kept warm, with their connection pools, for the most recently used
+    max_clients shops. Evicted shops have their pool closed and their token
+    reloaded from the session store on their next call.
+    """
+
+    def __init__(
+        self,
+        session_store: Optional[Any] = None,
+        max_clients: int = 256,
+        api_version: str = "2023-07",
+        scheduler: Optional[ShopifyScheduler] = None
+    ):
+        self.session_store = session_store
+        self.max_clients = max_clients
+        self.api_version = api_version
+        self.scheduler = scheduler
+        self._clients: "OrderedDict[str, ShopifyGraphQLClient]" = OrderedDict()
+        self._static_tokens: Dict[str, str] = {}
+        self._loading: Dict[str, asyncio.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def add_shop(self, shop: str, access_token: str) -> None:
+        """
+        Register a shop whose token does not come from the session store, e.g. a custom app's
+
+        Args:
+            shop: The shop domain
+            access_token: The shop's Admin API access token
+        """
+        self._static_tokens[normalize_shop(shop)] = access_token
+
+    def add_client(self, client: ShopifyGraphQLClient) -> None:
+        """
+        Register a ready-made client for its shop
+        """
+        self._clients[normalize_shop(client.shop)] = client
+        self._clients.move_to_end(normalize_shop(client.shop))
+
+    async def get(self, shop: str) -> ShopifyGraphQLClient:
+        """
+        Get the shop's client, loading its access token on first use
+
+        Args:
+            shop: The shop domain, e.g. from the X-Shopify-Shop-Domain header
+
+        Returns:
+            The shop's client
+
+        Raises:
+            UnknownShopError: If no access token is stored for the shop
+        """
+        shop = normalize_shop(shop)
+        client = self._clients.get(shop)
+        if client is not None:
+            self._clients.move_to_end(shop)
+            self.hits += 1
+            return client
+
+        # Concurrent first calls for a shop share one token lookup
+        lock = self._loading.setdefault(shop, asyncio.Lock())
+        try:
+            async with lock:
+                client = self._clients.get(shop)
+                if client is not None:
+                    self.hits += 1
+                    return client
+
+                self.misses += 1
+                access_token = self._static_tokens.get(shop)
+                if access_token is None and self.session_store is not None:
+                    access_token = await self.session_store.get_access_token(shop)
+                if not access_token:
+                    raise UnknownShopError(f"No access token for shop {shop}")
+
+                client = ShopifyGraphQLClient(shop, access_token, self.api_version, scheduler=self.scheduler)
+                self._clients[shop] = client
+        finally:
+            self._loading.pop(shop, None)
+
+        await self._evict()
+        return client
+
+    async def invalidate(self, shop: str) -> None:
+        """
+        Drop the shop's client, e.g. after its token was rotated or the app uninstalled
+
+        Args:
+            shop: The shop domain
+        """
+        shop = normalize_shop(shop)
+        if self._clients.pop(shop, None) is not None:
+            await close_http_client(f"shopify:{shop}")
+
+    async def _evict(self) -> None:
+        while len(self._clients) > self.max_clients:
+            shop, _ = self._clients.popitem(last=False)
+            self.evictions += 1
+            await close_http_client(f"shopify:{shop}")
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "clients": len(self._clients),
+            "max_clients": self.max_clients,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+def normalize_shop(shop: str) -> str:
+    return shop.strip().lower()
+
+
+def get_session_store() -> Optional[Any]:
+    """
+    Get the store of shops' access tokens configured by SHOPIFY_SESSION_STORE
+
+    "supabase" reads the Prisma session table from Supabase, a "file:" URL
+    reads the embedded app's SQLite database (relative to its prisma directory,
+    like Prisma itself), and unset disables it.
+
+    Returns:
+        The session store, or None
+    """
+    url = os.environ.get("SHOPIFY_SESSION_STORE", "")
+    if url == "supabase":
+        return SupabaseSessionStore()
+    if url.startswith("file:"):
+        return SqliteSessionStore(os.path.join(PRISMA_DIR, url[len("file:"):]))
+    return None
+
+
+_shopify_clients: Optional[ShopifyClientRegistry] = None
+
+
+def get_shopify_clients() -> ShopifyClientRegistry:
+    """
+    Get the process-wide registry of per-shop Shopify clients
+
+    The shop in SHOPIFY_STORE_URL is registered with SHOPIFY_ACCESS_TOKEN, so
+    single-shop deployments keep working without a session store.
+
+    Returns:
+        The registry
+    """
+    global _shopify_clients
+    if _shopify_clients is None:
+        _shopify_clients = ShopifyClientRegistry(
+            session_store=get_session_store(),
+            max_clients=int(os.environ.get("SHOPIFY_CLIENT_CACHE_SIZE", "256")),
+            api_version=os.environ.get("SHOPIFY_API_VERSION", "2023-07")
+        )
+        shop = os.environ.get("SHOPIFY_STORE_URL")
+        access_token = os.environ.get("SHOPIFY_ACCESS_TOKEN") or os.environ.get("SHOPIFY_API_SECRET")
+        if shop and access_token:
+            _shopify_clients.add_shop(shop, access_token)
+    return _shopify_clients
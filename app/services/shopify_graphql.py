@@ -0,0 +1,106 @@
+import os
+from typing import Any, Dict, Optional
+
+import httpx
+
+from app.utils.http_pool import get_http_client
+from app.services.shopify_scheduler import ShopifyScheduler, ShopifyThrottled, ShopifyUnavailable, get_shopify_scheduler
+
+
+class ShopifyGraphQLError(Exception):
+    """
+    A GraphQL request failed with a non-retryable HTTP or query error
+    """
+
+
+class ShopifyUnauthorized(ShopifyGraphQLError):
+    """
+    Shopify rejected the access token, e.g. after it was rotated or the app reinstalled
+    """
+
+
+class ShopifyGraphQLClient:
+    """
+    Async client for one shop's GraphQL Admin API
+
+    Requests share a keep-alive connection pool per shop and are paced by the
+    shop's GraphQL cost budget in the ShopifyScheduler.
+    """
+
+    def __init__(
+        self,
+        shop: str,
+        access_token: str,
+        api_version: str = "2023-07",
+        scheduler: Optional[ShopifyScheduler] = None,
+        http_client: Optional[httpx.AsyncClient] = None
+    ):
+        self.shop = shop
+        self.access_token = access_token
+        self.api_version = api_version
+        self.endpoint = f"https://{shop}/admin/api/{api_version}/graphql.json"
+        self.scheduler = scheduler or get_shopify_scheduler()
+        self._http_client = http_client
+
+    @property
+    def http_client(self) -> httpx.AsyncClient:
+        # Looked up on each request so a pool closed on shutdown is recreated
+        if self._http_client is not None:
+            return self._http_client
+        return get_http_client(
+            f"shopify:{self.shop}",
+            max_connections=int(os.environ.get("SHOPIFY_POOL_MAX_CONNECTIONS", "10")),
+            max_keepalive_connections=int(os.environ.get("SHOPIFY_POOL_MAX_KEEPALIVE", "5"))
+        )
+
+    async def execute(self, query: str, variables: Optional[Dict[str, Any]] = None, cost: float = 10) -> Dict[str, Any]:
+        """
+        Run a GraphQL query or mutation
+
+        Args:
+            query: The GraphQL document
+            variables: The query variables
+            cost: The request's estimated query cost, reserved from the shop's budget
+
+        Returns:
+            The parsed response, including data and any query errors
+
+        Raises:
+            ShopifyThrottled: If the request was still throttled after the scheduler's retries
+            ShopifyUnavailable: If Shopify failed a mutation, or a query after the scheduler's retries
+            ShopifyUnauthorized: If Shopify rejected the access token
+            ShopifyGraphQLError: If Shopify rejected the request
+        """
+        return await self.scheduler.run_graphql(
+            self.shop, lambda: self._post(query, variables), cost=cost, mutation=_is_mutation(query)
+        )
+
+    async def _post(self, query: str, variables: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        response = await self.http_client.post(
+            self.endpoint,
+            json={"query": query, "variables": variables or {}},
+            headers={"X-Shopify-Access-Token": self.access_token}
+        )
+
+        if response.status_code == 429:
+            retry_after = response.headers.get("Retry-After")
+            raise ShopifyThrottled("Shopify returned 429", float(retry_after) if retry_after else None)
+        if response.status_code >= 500:
+            # Transient on Shopify's side, but a mutation may have been applied
+            raise ShopifyUnavailable(f"Shopify returned {response.status_code}")
+        if response.status_code == 401:
+            raise ShopifyUnauthorized(f"Shopify returned 401 for {self.shop}: {response.text}")
+        if response.status_code >= 400:
+            raise ShopifyGraphQLError(f"Shopify returned {response.status_code}: {response.text}")
+
+        result = response.json()
+        throttle_status = ((result.get("extensions") or {}).get("cost") or {}).get("throttleStatus")
+        self.scheduler.budget(self.shop).update_graphql(throttle_status)
+
+        if any((error.get("extensions") or {}).get("code") == "THROTTLED" for error in result.get("errors") or []):
+            raise ShopifyThrottled("GraphQL query throttled")
+        return result
+
+
+def _is_mutation(query: str) -> bool:
+    return query.lstrip().startswith("mutation")
@@ -0,0 +1,159 @@
+import os
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+from app.utils.rate_limiter import TokenBucket
+
+
+T = TypeVar("T")
+
+# Shopify's standard GraphQL limit: a 1000-point bucket restoring 50 points/s.
+# It is corrected from each response, so higher Shopify Plus limits are picked
+# up automatically.
+GRAPHQL_BUCKET_SIZE = 1000
+GRAPHQL_RESTORE_RATE = 50.0
+
+
+class ShopifyThrottled(Exception):
+    """
+    Shopify rejected a call for exceeding the shop's rate limit
+    """
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ShopifyUnavailable(Exception):
+    """
+    Shopify failed a call with a server error, so it may or may not have been applied
+    """
+
+
+class ShopBudget:
+    """
+    Local accounting of one shop's GraphQL cost bucket
+
+    Shopify's GraphQL limit is a bucket of query cost points, modelled as a
+    token bucket of what is still available and corrected after every call
+    from the response's throttleStatus.
+    """
+
+    def __init__(self):
+        self.graphql = TokenBucket(GRAPHQL_RESTORE_RATE, GRAPHQL_BUCKET_SIZE)
+
+    def update_graphql(self, throttle_status: Optional[Dict[str, Any]]) -> None:
+        """
+        Correct the GraphQL bucket from a response's extensions.cost.throttleStatus
+        """
+        if not throttle_status:
+            return
+        self.graphql.update(
+            throttle_status["currentlyAvailable"],
+            capacity=throttle_status.get("maximumAvailable"),
+            rate=throttle_status.get("restoreRate")
+        )
+
+
+class ShopifyScheduler:
+    """
+    Paces Shopify API calls per shop to stay just below the rate limits
+
+    Calls wait for room in the shop's bucket before being sent, in arrival
+    order. Calls that Shopify still throttles (other apps share the budget)
+    are retried after the Retry-After delay or an exponential backoff, and so
+    are queries that fail with a server error. Mutations are not retried on a
+    server error, since Shopify may already have applied them.
+    """
+
+    def __init__(self, max_retries: int = 5, backoff_base: float = 1.0):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self._budgets: Dict[str, ShopBudget] = {}
+        self.calls = 0
+        self.throttled = 0
+
+    def budget(self, shop: str) -> ShopBudget:
+        """
+        Get the rate-limit accounting for a shop
+
+        Args:
+            shop: The shop domain
+
+        Returns:
+            The shop's budget
+        """
+        budget = self._budgets.get(shop)
+        if budget is None:
+            budget = self._budgets[shop] = ShopBudget()
+        return budget
+
+    async def run_graphql(self, shop: str, call: Callable[[], Awaitable[T]], cost: float = 10, mutation: bool = False) -> T:
+        """
+        Run a GraphQL request within the shop's cost budget
+
+        Args:
+            shop: The shop domain
+            call: Coroutine function making the request; it should raise
+                ShopifyThrottled when throttled (429 or THROTTLED),
+                ShopifyUnavailable on a 5xx, and report the throttleStatus with
+                budget(shop).update_graphql
+            cost: The request's estimated query cost
+            mutation: Whether the request changes data, so server errors are not retried
+
+        Returns:
+            The call's result
+        """
+        bucket = self.budget(shop).graphql
+        attempt = 0
+        while True:
+            await bucket.acquire(min(cost, bucket.capacity))
+            self.calls += 1
+            try:
+                return await call()
+            except ShopifyThrottled as e:
+                self.throttled += 1
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise
+                delay = e.retry_after if e.retry_after is not None else self.backoff_base * 2 ** (attempt - 1)
+                bucket.pause(delay)
+                print(f"Shopify call throttled, retrying in {delay}s")
+            except ShopifyUnavailable:
+                attempt += 1
+                if mutation or attempt > self.max_retries:
+                    raise
+                delay = self.backoff_base * 2 ** (attempt - 1)
+                bucket.pause(delay)
+                print(f"Shopify query failed with a server error, retrying in {delay}s")
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Get call counters and each shop's remaining budget
+
+        Returns:
+            A dictionary with calls, throttled and per-shop available GraphQL points
+        """
+        return {
+            "calls": self.calls,
+            "throttled": self.throttled,
+            "shops": {
+                shop: {"graphql_available": round(budget.graphql.available)}
+                for shop, budget in self._budgets.items()
+            },
+        }
+
+
+_shopify_scheduler: Optional[ShopifyScheduler] = None
+
+
+def get_shopify_scheduler() -> ShopifyScheduler:
+    """
+    Get the process-wide Shopify scheduler, so every caller shares each shop's budget
+
+    Returns:
+        The scheduler
+    """
+    global _shopify_scheduler
+    if _shopify_scheduler is None:
+        _shopify_scheduler = ShopifyScheduler(max_retries=int(os.environ.get("SHOPIFY_MAX_RETRIES", "5")))
+    return _shopify_scheduler
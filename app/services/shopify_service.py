@@ -1,10 +1,82 @@
 import os
-import json
 import hmac
+import json
 import hashlib
 import base64
-import shopify
-from typing import Dict, Any, Optional, List, Tuple
+from typing import Dict, Any, Awaitable, Callable, Optional, List, Tuple, TypeVar
+
+from app.services.shopify_graphql import ShopifyGraphQLClient, ShopifyUnauthorized
+from app.services.shopify_clients import get_shopify_clients
+
+T = TypeVar("T")
+
+# Estimated GraphQL query costs, reserved from the shop's budget before each request
+QUERY_COST = 15
+MUTATION_COST = 20
+
+# The order's note, for appending the size confirmation
+ORDER_NOTE_QUERY = """
+query OrderNote($id: ID!) {
+  order(id: $id) {
+    note
+  }
+}
+"""
+
+# The order's open fulfillment orders, for fulfilling every remaining line item
+FULFILLMENT_ORDERS_QUERY = """
+query FulfillmentOrders($id: ID!) {
+  order(id: $id) {
+    fulfillmentOrders(first: 10, query: "status:open") {
+      nodes { id }
+    }
+  }
+}
+"""
+
+# Everything a confirmation needs from the order, in one query
+CONFIRMATION_ORDER_QUERY = """
+query ConfirmationOrder($id: ID!) {
+  order(id: $id) {
+    note
+    fulfillmentOrders(first: 10, query: "status:open") {
+      nodes { id }
+    }
+  }
+}
+"""
+
+# The size note/metafield and the fulfillment, in one request
+CONFIRM_AND_FULFIL_MUTATION = """
+mutation ConfirmAndFulfil($order: OrderInput!, $fulfillment: FulfillmentV2Input!) {
+  orderUpdate(input: $order) {
+    userErrors { field message }
+  }
+  fulfillmentCreateV2(fulfillment: $fulfillment) {
+    fulfillment { id }
+    userErrors { field message }
+  }
+}
+"""
+
+# The size note/metafield alone
+CONFIRM_MUTATION = """
+mutation Confirm($order: OrderInput!) {
+  orderUpdate(input: $order) {
+    userErrors { field message }
+  }
+}
+"""
+
+# The fulfillment alone
+FULFIL_MUTATION = """
+mutation Fulfil($fulfillment: FulfillmentV2Input!) {
+  fulfillmentCreateV2(fulfillment: $fulfillment) {
+    fulfillment { id }
+    userErrors { field message }
+  }
+}
+"""
 
 
 class ShopifyService:
@@ -18,14 +90,45 @@ class ShopifyService:
         self.api_version = os.environ.get("SHOPIFY_API_VERSION", "2023-07")
         self.webhook_secret = os.environ.get("SHOPIFY_WEBHOOK_SECRET")
 
-        # Initialize the Shopify API if not in testing mode
-        if not self.testing:
-            shop_url = f"https://{self.api_key}:{self.api_secret}@{self.shop_url}/admin/api/{self.api_version}"
-            try:
-                shopify.ShopifyResource.set_site(shop_url)
-            except Exception as e:
-                if not self.testing:
-                    print(f"Warning: Could not initialize Shopify API: {e}")
+        # Async GraphQL Admin API clients per shop, each with a keep-alive connection
+        # pool and paced within the shop's cost budget. Calls without a shop go to
+        # SHOPIFY_STORE_URL
+        self.clients = get_shopify_clients()
+
+    async def client_for(self, shop: Optional[str] = None) -> ShopifyGraphQLClient:
+        """
+        Get the GraphQL client for a shop
+
+        Args:
+            shop: The shop domain, defaulting to SHOPIFY_STORE_URL
+
+        Returns:
+            The shop's client
+
+        Raises:
+            UnknownShopError: If the app has no access token for the shop
+        """
+        return await self.clients.get(shop or self.shop_url)
+
+    async def _with_client(self, shop: Optional[str], operation: Callable[[ShopifyGraphQLClient], Awaitable[T]]) -> T:
+        """
+        Run an operation with the shop's client, reloading the client once if its token was rejected
+
+        Args:
+            shop: The shop domain, defaulting to SHOPIFY_STORE_URL
+            operation: Coroutine function making the calls with the client
+
+        Returns:
+            The operation's result
+        """
+        client = await self.client_for(shop)
+        try:
+            return await operation(client)
+        except ShopifyUnauthorized:
+            # A reinstall or token rotation leaves the cached client with a stale token;
+            # Shopify applied nothing, so the operation is safe to run again
+            await self.clients.invalidate(client.shop)
+            return await operation(await self.client_for(shop))
 
     def verify_webhook(self, data: bytes, hmac_header: str) -> bool:
         """
@@ -58,11 +161,14 @@ class ShopifyService:
         """
         Parse the order data to extract relevant information
 
+        Every line item with a size is parsed into order_details["line_items"];
+        the first one's fields are also set on order_details itself.
+
         Args:
             order_data: The order data from Shopify webhook
 
         Returns:
-            Tuple of (customer_data, order_details) or (customer_data, None) if no item found
+            Tuple of (customer_data, order_details) or (customer_data, None) if no sized item found
         """
         try:
             # Extract customer information
@@ -74,43 +180,63 @@ class ShopifyService:
                 "last_name": order_data["customer"].get("last_name", "")
             }
 
-            # Find the first line item (clothing product)
-            if "line_items" in order_data and len(order_data["line_items"]) > 0:
-                item = order_data["line_items"][0]
-
-                # Get size from properties or variant title
-                original_size = None
-                if "properties" in item and item["properties"]:
-                    for prop in item["properties"]:
-                        if prop.get("name") == "Size":
-                            original_size = prop.get("value")
-                            break
-
-                # If no size property, use variant title
-                if not original_size and "variant_title" in item:
-                    original_size = item["variant_title"]
-
-                # Create order details
-                order_details = {
-                    "shopify_order_id": str(order_data["id"]),
-                    "order_number": order_data["order_number"],
-                    "original_size": original_size,
-                    "product_id": str(item["product_id"]),
-                    "variant_id": str(item["variant_id"]),
-                    "line_item_id": str(item["id"]),
-                    "product_title": item["title"]
-                }
-                return customer_data, order_details
-
-            # No suitable line item found
-            return customer_data, None
+            # Collect every sized line item (clothing product) in one pass
+            line_items = []
+            for item in order_data.get("line_items") or []:
+                line_item = self._parse_line_item(item)
+                if line_item["original_size"]:
+                    line_items.append(line_item)
+
+            if not line_items:
+                # No suitable line item found
+                return customer_data, None
+
+            # Create order details
+            order_details = {
+                "shopify_order_id": str(order_data["id"]),
+                "order_number": order_data["order_number"],
+                **line_items[0],
+                "line_items": line_items
+            }
+            return customer_data, order_details
 
         except (KeyError, IndexError) as e:
             # Handle missing data
             print(f"Error parsing order data: {e}")
             return {}, None
 
-    async def update_order_size(self, order_id: str, line_item_id: str, new_size: str) -> bool:
+    @staticmethod
+    def _parse_line_item(item: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Extract the product and size of one line item
+
+        Args:
+            item: The line item from the order webhook
+
+        Returns:
+            The line item's details, with original_size None if it has no size
+        """
+        # Get size from properties or variant title
+        original_size = None
+        if "properties" in item and item["properties"]:
+            for prop in item["properties"]:
+                if prop.get("name") == "Size":
+                    original_size = prop.get("value")
+                    break
+
+        # If no size property, use variant title
+        if not original_size and "variant_title" in item:
+            original_size = item["variant_title"]
+
+        return {
+            "original_size": original_size,
+            "product_id": str(item["product_id"]),
+            "variant_id": str(item["variant_id"]),
+            "line_item_id": str(item["id"]),
+            "product_title": item["title"]
+        }
+
+    async def update_order_size(self, order_id: str, line_item_id: str, new_size: str, shop: Optional[str] = None) -> bool:
         """
         Update the order size in Shopify
 
@@ -118,6 +244,7 @@ class ShopifyService:
             order_id: The Shopify order ID
             line_item_id: The line item ID to update
             new_size: The new size to set
+            shop: The order's shop domain, defaulting to SHOPIFY_STORE_URL
 
         Returns:
             True if successful, False otherwise
@@ -126,42 +253,33 @@ class ShopifyService:
             return True
 
         try:
-            # Get the order
-            order = shopify.Order.find(order_id)
-
-            # Add a note about the size change
-            note = f"Size confirmation: Changed to {new_size} via WhatsApp conversation"
-
-            # Update order note
-            order.note = f"{order.note or ''}\n{note}".strip()
-            order.save()
-
-            # For full implementation, we would need to find the correct variant ID
-            # for the new size and update the line item
-            # This would require additional API calls to get the product variants
-
-            # Instead, we'll just add a metafield to track the confirmed size
-            order.add_metafield(
-                shopify.Metafield({
-                    'namespace': 'size_confirmation',
-                    'key': 'confirmed_size',
-                    'value': new_size,
-                    'value_type': 'string'
-                })
-            )
-
-            return True
-
+            return await self._with_client(shop, lambda client: self._update_order_size(client, order_id, new_size))
         except Exception as e:
             print(f"Error updating order size: {e}")
             return False
 
-    async def trigger_fulfillment(self, order_id: str) -> bool:
+    async def _update_order_size(self, client: ShopifyGraphQLClient, order_id: str, new_size: str) -> bool:
+        order_gid = _order_gid(order_id)
+        result = await client.execute(ORDER_NOTE_QUERY, {"id": order_gid}, cost=QUERY_COST)
+        order = (result.get("data") or {}).get("order")
+        if not order:
+            print(f"Order {order_id} not found: {result.get('errors')}")
+            return False
+
+        # For full implementation, we would need to find the correct variant ID
+        # for the new size and update the line item. Instead, we add a note and
+        # a metafield to track the confirmed size
+        order_input = _confirmation_input(order_gid, order.get("note"), new_size)
+        result = await client.execute(CONFIRM_MUTATION, {"order": order_input}, cost=MUTATION_COST)
+        return not _user_errors(result, "orderUpdate")
+
+    async def trigger_fulfillment(self, order_id: str, shop: Optional[str] = None) -> bool:
         """
         Trigger fulfillment for an order
 
         Args:
             order_id: The Shopify order ID
+            shop: The order's shop domain, defaulting to SHOPIFY_STORE_URL
 
         Returns:
             True if successful, False otherwise
@@ -170,31 +288,153 @@ class ShopifyService:
             return True
 
         try:
-            # Get the order
-            order = shopify.Order.find(order_id)
-
-            # Create a new fulfillment for all line items
-            fulfillment = shopify.Fulfillment({
-                'order_id': order_id,
-                'notify_customer': True,
-                'tracking_info': {
-                    'number': 'N/A',
-                    'company': 'Size Confirmation Service'
-                }
-            })
-
-            # Add all line items to the fulfillment
-            line_items = []
-            for item in order.line_items:
-                line_items.append({
-                    'id': item.id
-                })
+            return await self._with_client(shop, lambda client: self._trigger_fulfillment(client, order_id))
+        except Exception as e:
+            print(f"Error triggering fulfillment: {e}")
+            return False
 
-            fulfillment.line_items = line_items
-            result = fulfillment.save()
+    async def _trigger_fulfillment(self, client: ShopifyGraphQLClient, order_id: str) -> bool:
+        result = await client.execute(FULFILLMENT_ORDERS_QUERY, {"id": _order_gid(order_id)}, cost=QUERY_COST)
+        order = (result.get("data") or {}).get("order")
+        if not order:
+            print(f"Order {order_id} not found: {result.get('errors')}")
+            return False
 
-            return result
+        fulfillment_orders = order["fulfillmentOrders"]["nodes"]
+        if not fulfillment_orders:
+            return False
 
+        result = await client.execute(
+            FULFIL_MUTATION,
+            {"fulfillment": _fulfillment_input(fulfillment_orders)},
+            cost=MUTATION_COST
+        )
+        return not _user_errors(result, "fulfillmentCreateV2")
+
+    async def confirm_and_fulfil(
+        self,
+        order_id: str,
+        new_size: str,
+        shop: Optional[str] = None,
+        line_item_sizes: Optional[List[Dict[str, str]]] = None
+    ) -> Tuple[bool, bool]:
+        """
+        Record the confirmed size on the order and fulfil it
+
+        Fetches the order once, then sends the note, the confirmed_size
+        metafield and the fulfillment of its open fulfillment orders in a single
+        GraphQL request, so a confirmation costs two API calls.
+
+        Args:
+            order_id: The Shopify order ID
+            new_size: The confirmed size
+            shop: The order's shop domain, defaulting to SHOPIFY_STORE_URL
+            line_item_sizes: For orders with several sized items, each item's
+                line_item_id, product_title and confirmed size
+
+        Returns:
+            Tuple of (size_updated, fulfilled)
+        """
+        if self.testing:
+            return True, True
+
+        try:
+            return await self._with_client(
+                shop, lambda client: self._confirm_and_fulfil(client, order_id, new_size, line_item_sizes)
+            )
         except Exception as e:
-            print(f"Error triggering fulfillment: {e}")
-            return False
+            print(f"Error confirming and fulfilling order: {e}")
+            return False, False
+
+    async def _confirm_and_fulfil(
+        self,
+        client: ShopifyGraphQLClient,
+        order_id: str,
+        new_size: str,
+        line_item_sizes: Optional[List[Dict[str, str]]]
+    ) -> Tuple[bool, bool]:
+        order_gid = _order_gid(order_id)
+
+        result = await client.execute(CONFIRMATION_ORDER_QUERY, {"id": order_gid}, cost=QUERY_COST)
+        order = (result.get("data") or {}).get("order")
+        if not order:
+            print(f"Order {order_id} not found: {result.get('errors')}")
+            return False, False
+
+        order_input = _confirmation_input(order_gid, order.get("note"), new_size, line_item_sizes)
+        fulfillment_orders = order["fulfillmentOrders"]["nodes"]
+
+        if not fulfillment_orders:
+            result = await client.execute(CONFIRM_MUTATION, {"order": order_input}, cost=MUTATION_COST)
+            return not _user_errors(result, "orderUpdate"), False
+
+        result = await client.execute(
+            CONFIRM_AND_FULFIL_MUTATION,
+            {"order": order_input, "fulfillment": _fulfillment_input(fulfillment_orders)},
+            cost=2 * MUTATION_COST
+        )
+        return not _user_errors(result, "orderUpdate"), not _user_errors(result, "fulfillmentCreateV2")
+
+
+def _order_gid(order_id: str) -> str:
+    return f"gid://shopify/Order/{order_id}"
+
+
+def _confirmation_input(
+    order_gid: str,
+    current_note: Optional[str],
+    new_size: str,
+    line_item_sizes: Optional[List[Dict[str, str]]] = None
+) -> Dict[str, Any]:
+    """
+    Build the OrderInput that records the confirmed sizes in the note and metafields
+    """
+    metafields = [{
+        "namespace": "size_confirmation",
+        "key": "confirmed_size",
+        "value": new_size,
+        "type": "single_line_text_field"
+    }]
+
+    if line_item_sizes:
+        sizes = ", ".join(f"{item['product_title']} in {item['size']}" for item in line_item_sizes)
+        note = f"Size confirmation: {sizes} via WhatsApp conversation"
+        metafields.append({
+            "namespace": "size_confirmation",
+            "key": "confirmed_sizes",
+            "value": json.dumps({item["line_item_id"]: item["size"] for item in line_item_sizes}),
+            "type": "json"
+        })
+    else:
+        note = f"Size confirmation: Changed to {new_size} via WhatsApp conversation"
+
+    return {
+        "id": order_gid,
+        "note": f"{current_note or ''}\n{note}".strip(),
+        "metafields": metafields
+    }
+
+
+def _fulfillment_input(fulfillment_orders: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Build the FulfillmentV2Input that fulfils every remaining line item of the fulfillment orders
+    """
+    return {
+        "notifyCustomer": True,
+        "trackingInfo": {"number": "N/A", "company": "Size Confirmation Service"},
+        "lineItemsByFulfillmentOrder": [{"fulfillmentOrderId": fo["id"]} for fo in fulfillment_orders]
+    }
+
+
+def _user_errors(result: Dict[str, Any], mutation: str) -> List[Dict[str, Any]]:
+    """
+    Get the errors for one mutation of a GraphQL response, logging them
+    """
+    if result.get("errors"):
+        print(f"Shopify GraphQL errors: {result['errors']}")
+        return result["errors"]
+
+    errors = ((result.get("data") or {}).get(mutation) or {}).get("userErrors") or []
+    if errors:
+        print(f"Shopify {mutation} errors: {errors}")
+    return errors
@@ -1,12 +1,18 @@
 import os
-from supabase import create_client, Client
+import json
+import inspect
+from datetime import datetime, timedelta, timezone
+from supabase import create_client, Client, AsyncClient, AsyncClientOptions
 from typing import Optional, Dict, Any, List
 from uuid import UUID
 
 from app.models.customer import Customer, CustomerCreate, CustomerUpdate
-from app.models.order import Order, OrderCreate, OrderUpdate
+from app.models.order import Order, OrderCreate, OrderUpdate, OrderLineItem, OrderLineItemCreate
 from app.models.message import Message, MessageCreate
-from app.models.conversation import Conversation, ConversationUpdate
+from app.models.conversation import Conversation, ConversationCreate, ConversationUpdate, ReplyContext
+from app.models.job import Job
+from app.utils.http_pool import get_http_client
+from app.services.customer_cache import get_customer_cache
 
 
 class SupabaseService:
@@ -14,6 +20,14 @@ class SupabaseService:
         # Check if we're in testing mode
         self.testing = os.environ.get("TESTING", "").lower() == "true"
 
+        # Async mode routes every query through a non-blocking PostgREST client
+        # backed by a shared keep-alive pool; set SUPABASE_ASYNC=false for the sync client
+        self.async_mode = os.environ.get("SUPABASE_ASYNC", "true").lower() == "true"
+
+        # Customer lookups by phone and Shopify ID are read through a process-wide
+        # cache; set CUSTOMER_CACHE_TTL=0 to always query Supabase
+        self.customer_cache = get_customer_cache()
+
         # Only create a real client if not in testing mode
         if not self.testing:
             supabase_url = os.environ.get("SUPABASE_URL")
@@ -29,28 +43,75 @@ class SupabaseService:
                     self.supabase = None
                     return
 
-            self.supabase: Client = create_client(supabase_url, supabase_key)
+            if self.async_mode:
+                self.supabase = self._create_async_client(supabase_url, supabase_key)
+            else:
+                self.supabase: Client = create_client(supabase_url, supabase_key)
         else:
             # In testing mode, we'll use the mocks instead
             self.supabase = None
 
+    @staticmethod
+    def _create_async_client(supabase_url: str, supabase_key: str) -> AsyncClient:
+        """
+        Create an async Supabase client that shares one bounded connection pool per project
+
+        Args:
+            supabase_url: The Supabase project URL
+            supabase_key: The Supabase API key
+
+        Returns:
+            The async Supabase client
+        """
+        http_client = get_http_client(
+            f"supabase:{supabase_url}",
+            max_connections=int(os.environ.get("SUPABASE_POOL_MAX_CONNECTIONS", "50")),
+            max_keepalive_connections=int(os.environ.get("SUPABASE_POOL_MAX_KEEPALIVE", "20"))
+        )
+        return AsyncClient(supabase_url, supabase_key, AsyncClientOptions(httpx_client=http_client))
+
+    async def _execute(self, query):
+        """
+        Execute a query builder, awaiting it when the async client is in use
+
+        Args:
+            query: A sync or async PostgREST request builder
+
+        Returns:
+            The API response
+        """
+        response = query.execute()
+        if inspect.isawaitable(response):
+            response = await response
+        return response
+
     # Customer methods
     async def get_customer_by_shopify_id(self, shopify_customer_id: int) -> Optional[Customer]:
         if self.testing:
             return None  # Testing will use mocks
 
-        response = self.supabase.table("customers").select("*").eq("shopify_customer_id", shopify_customer_id).execute()
+        if self.customer_cache is not None:
+            customer = self.customer_cache.get_by_shopify_id(shopify_customer_id)
+            if customer is not None:
+                return customer
+
+        response = await self._execute(self.supabase.table("customers").select("*").eq("shopify_customer_id", shopify_customer_id))
         if response.data and len(response.data) > 0:
-            return Customer(**response.data[0])
+            return self._cache_customer(Customer(**response.data[0]))
         return None
 
     async def get_customer_by_phone(self, phone: str) -> Optional[Customer]:
         if self.testing:
             return None  # Testing will use mocks
 
-        response = self.supabase.table("customers").select("*").eq("phone", phone).execute()
+        if self.customer_cache is not None:
+            customer = self.customer_cache.get_by_phone(phone)
+            if customer is not None:
+                return customer
+
+        response = await self._execute(self.supabase.table("customers").select("*").eq("phone", phone))
         if response.data and len(response.data) > 0:
-            return Customer(**response.data[0])
+            return self._cache_customer(Customer(**response.data[0]))
         return None
 
     async def create_customer(self, customer: CustomerCreate) -> Customer:
@@ -64,8 +125,31 @@ class SupabaseService:
                 **customer_dict
             )
 
-        response = self.supabase.table("customers").insert(customer.dict()).execute()
-        return Customer(**response.data[0])
+        response = await self._execute(self.supabase.table("customers").insert(customer.dict()))
+        return self._cache_customer(Customer(**response.data[0]))
+
+    async def upsert_customer(self, customer: CustomerCreate) -> Customer:
+        """
+        Insert a customer, or update the one with the same Shopify customer ID
+
+        Only the fields set on the model are written, so sizing preferences
+        stored by earlier conversations are kept. Concurrent orders from a new
+        customer both get the same row instead of a unique constraint violation.
+
+        Args:
+            customer: The customer data from the order webhook
+
+        Returns:
+            The stored customer
+        """
+        if self.testing:
+            return await self.create_customer(customer)
+
+        response = await self._execute(self.supabase.table("customers").upsert(
+            customer.dict(exclude_unset=True),
+            on_conflict="shopify_customer_id"
+        ))
+        return self._cache_customer(Customer(**response.data[0]))
 
     async def update_customer(self, customer_id: UUID, customer: CustomerUpdate) -> Customer:
         if self.testing:
@@ -80,10 +164,82 @@ class SupabaseService:
                 **customer.dict(exclude_unset=True)
             )
 
-        response = self.supabase.table("customers").update(customer.dict(exclude_unset=True)).eq("id", str(customer_id)).execute()
-        return Customer(**response.data[0])
+        # Drop the cached row first, so a failed update does not leave it stale
+        if self.customer_cache is not None:
+            self.customer_cache.invalidate(customer_id)
+
+        response = await self._execute(self.supabase.table("customers").update(customer.dict(exclude_unset=True)).eq("id", str(customer_id)))
+        return self._cache_customer(Customer(**response.data[0]))
+
+    def _cache_customer(self, customer: Customer) -> Customer:
+        if self.customer_cache is not None:
+            self.customer_cache.put(customer)
+        return customer
 
     # Conversation methods
+    async def create_conversation(self, conversation: ConversationCreate) -> Optional[Conversation]:
+        """
+        Store the conversation of an order
+
+        Safe to retry: an order's conversation is only stored once.
+
+        Args:
+            conversation: The conversation to store
+
+        Returns:
+            The newly stored conversation, or None if the order already has one
+        """
+        if self.testing:
+            # Return a mock conversation for testing
+            return Conversation(
+                id=UUID("00000000-0000-0000-0000-000000000000"),
+                created_at=datetime.now(timezone.utc),
+                updated_at=datetime.now(timezone.utc),
+                **conversation.dict()
+            )
+
+        response = await self._execute(self.supabase.table("conversations").upsert(
+            json.loads(conversation.json()),
+            on_conflict="order_id",
+            ignore_duplicates=True
+        ))
+        return Conversation(**response.data[0]) if response.data else None
+
+    async def update_conversation_state(
+        self,
+        conversation_id: UUID,
+        version: int,
+        conversation: ConversationUpdate
+    ) -> Optional[Conversation]:
+        """
+        Change a conversation's state if nobody else has since it was read
+
+        Args:
+            conversation_id: The UUID of the conversation
+            version: The version the state was read at
+            conversation: The new state
+
+        Returns:
+            The updated conversation, or None if its version has changed
+        """
+        if self.testing:
+            # Return a mock updated conversation for testing
+            return Conversation(
+                id=conversation_id,
+                order_id=UUID("12345678-1234-5678-1234-567812345678"),
+                phone_number="+1234567890",
+                version=version + 1,
+                created_at=datetime.now(timezone.utc),
+                updated_at=datetime.now(timezone.utc),
+                **conversation.dict(exclude_unset=True)
+            )
+
+        update = {**json.loads(conversation.json(exclude_unset=True)), "version": version + 1}
+        response = await self._execute(
+            self.supabase.table("conversations").update(update).eq("id", str(conversation_id)).eq("version", version)
+        )
+        return Conversation(**response.data[0]) if response.data else None
+
     async def update_conversation(self, conversation_id: UUID, conversation: ConversationUpdate) -> Conversation:
         if self.testing:
             # Return a mock updated conversation for testing
@@ -97,15 +253,16 @@ class SupabaseService:
                 updated_at=datetime.now()
             )
 
-        response = self.supabase.table("conversations").update(conversation.dict(exclude_unset=True)).eq("id", str(conversation_id)).execute()
+        response = await self._execute(self.supabase.table("conversations").update(conversation.dict(exclude_unset=True)).eq("id", str(conversation_id)))
         return Conversation(**response.data[0])
 
-    async def get_conversation_by_phone(self, phone_number: str) -> Optional[Conversation]:
+    async def get_conversation_by_phone(self, phone_number: str, order_id: Optional[UUID] = None) -> Optional[Conversation]:
         """
         Get a conversation by phone number
 
         Args:
             phone_number: The phone number to look up
+            order_id: Only the conversation about this order; otherwise the latest one for the phone number
 
         Returns:
             The conversation if found, None otherwise
@@ -113,17 +270,50 @@ class SupabaseService:
         if self.testing:
             return None  # Testing will use mocks
 
-        response = self.supabase.table("conversations").select("*").eq("phone_number", phone_number).order("created_at", desc=True).limit(1).execute()
+        query = self.supabase.table("conversations").select("*")
+        if order_id is not None:
+            # One conversation per order
+            query = query.eq("order_id", str(order_id))
+        else:
+            query = query.eq("phone_number", phone_number).order("created_at", desc=True)
+        response = await self._execute(query.limit(1))
         if response.data and len(response.data) > 0:
             return Conversation(**response.data[0])
         return None
 
+    async def get_reply_context(self, phone: str, message_limit: Optional[int] = 20) -> Optional[ReplyContext]:
+        """
+        Get the customer, pending order with its conversation and line items, and recent messages for a phone number
+
+        Backed by the get_reply_context Postgres function, so it costs one round trip.
+
+        Args:
+            phone: The customer's phone number
+            message_limit: Maximum number of recent messages to return, or None for all of them
+
+        Returns:
+            The reply context, or None if the function is unavailable
+        """
+        if self.testing:
+            return None  # Testing will use mocks
+
+        try:
+            response = await self._execute(self.supabase.rpc(
+                "get_reply_context",
+                {"p_phone": phone, "p_message_limit": message_limit}
+            ))
+        except Exception as e:
+            print(f"Error loading reply context, falling back to separate queries: {e}")
+            return None
+
+        return ReplyContext(**(response.data or {}))
+
     # Order methods
     async def get_order_by_shopify_id(self, shopify_order_id: int) -> Optional[Order]:
         if self.testing:
             return None  # Testing will use mocks
 
-        response = self.supabase.table("orders").select("*").eq("shopify_order_id", shopify_order_id).execute()
+        response = await self._execute(self.supabase.table("orders").select("*").eq("shopify_order_id", shopify_order_id))
         if response.data and len(response.data) > 0:
             return Order(**response.data[0])
         return None
@@ -143,7 +333,29 @@ class SupabaseService:
                 **order_dict
             )
 
-        response = self.supabase.table("orders").insert(order.dict()).execute()
+        response = await self._execute(self.supabase.table("orders").insert(json.loads(order.json())))
+        return Order(**response.data[0])
+
+    async def upsert_order(self, order: OrderCreate) -> Order:
+        """
+        Insert an order, or return the one with the same Shopify order ID
+
+        The webhook's columns never change for an order, and confirmation state
+        is not among them, so rewriting them on a redelivery is harmless.
+
+        Args:
+            order: The order data from the order webhook
+
+        Returns:
+            The stored order
+        """
+        if self.testing:
+            return await self.create_order(order)
+
+        response = await self._execute(self.supabase.table("orders").upsert(
+            json.loads(order.json()),
+            on_conflict="shopify_order_id"
+        ))
         return Order(**response.data[0])
 
     async def update_order(self, order_id: UUID, order: OrderUpdate) -> Order:
@@ -162,18 +374,108 @@ class SupabaseService:
                 **order.dict(exclude_unset=True)
             )
 
-        response = self.supabase.table("orders").update(order.dict(exclude_unset=True)).eq("id", str(order_id)).execute()
+        response = await self._execute(self.supabase.table("orders").update(order.dict(exclude_unset=True)).eq("id", str(order_id)))
         return Order(**response.data[0])
 
     async def get_order_with_pending_size_confirmation(self, customer_id: UUID) -> Optional[Order]:
         if self.testing:
             return None  # Testing will use mocks
 
-        response = self.supabase.table("orders").select("*").eq("customer_id", str(customer_id)).eq("size_confirmed", False).order("created_at", desc=True).limit(1).execute()
+        response = await self._execute(self.supabase.table("orders").select("*").eq("customer_id", str(customer_id)).eq("size_confirmed", False).order("created_at", desc=True).limit(1))
         if response.data and len(response.data) > 0:
             return Order(**response.data[0])
         return None
 
+    async def get_orders_for_recommendation(self, after_id: Optional[str] = None, limit: int = 1000) -> List[Dict[str, Any]]:
+        """
+        Get a page of orders with their customer's sizing facts, ordered by ID
+
+        Args:
+            after_id: Only return orders with a greater ID (keyset pagination)
+            limit: Maximum number of orders to return
+
+        Returns:
+            Rows with id, product_id, original_size and a customers object holding height, weight and usual_size
+        """
+        if self.testing:
+            return []  # Testing will use mocks
+
+        query = self.supabase.table("orders").select("id, product_id, original_size, customers(height, weight, usual_size)").order("id").limit(limit)
+        if after_id is not None:
+            query = query.gt("id", after_id)
+        response = await self._execute(query)
+        return response.data or []
+
+    async def set_order_recommendations(self, recommendations: List[Dict[str, Any]]) -> int:
+        """
+        Store size recommendations for many orders in one statement
+
+        Args:
+            recommendations: Rows with id, recommended_size and recommendation_confidence
+
+        Returns:
+            The number of orders updated
+        """
+        if self.testing or not recommendations:
+            return 0
+
+        response = await self._execute(self.supabase.rpc("set_order_recommendations", {"p_rows": recommendations}))
+        return response.data or 0
+
+    # Order line item methods
+    async def create_order_line_items(self, line_items: List[OrderLineItemCreate]) -> List[OrderLineItem]:
+        """
+        Store every sized line item of an order in one request
+
+        Safe to retry: line items that are already stored are skipped.
+
+        Args:
+            line_items: The line items to store
+
+        Returns:
+            The newly stored line items
+        """
+        if self.testing:
+            # Return mock line items for testing
+            return [
+                OrderLineItem(id=UUID("00000000-0000-0000-0000-000000000000"), **line_item.dict())
+                for line_item in line_items
+            ]
+
+        if not line_items:
+            return []
+
+        rows = [{**line_item.dict(), "order_id": str(line_item.order_id)} for line_item in line_items]
+        response = await self._execute(self.supabase.table("order_line_items").upsert(
+            rows,
+            on_conflict="order_id,line_item_id",
+            ignore_duplicates=True
+        ))
+        return [OrderLineItem(**row) for row in response.data or []]
+
+    async def get_order_line_items(self, order_id: UUID) -> List[OrderLineItem]:
+        if self.testing:
+            return []  # Testing will use mocks
+
+        response = await self._execute(self.supabase.table("order_line_items").select("*").eq("order_id", str(order_id)).order("line_item_id"))
+        return [OrderLineItem(**row) for row in response.data or []]
+
+    async def set_line_item_sizes(self, sizes: List[Dict[str, Any]]) -> int:
+        """
+        Store the confirmed sizes of many line items in one statement
+
+        Args:
+            sizes: Rows with id and confirmed_size
+
+        Returns:
+            The number of line items updated
+        """
+        if self.testing or not sizes:
+            return 0
+
+        response = await self._execute(self.supabase.rpc("set_line_item_sizes", {"p_rows": sizes}))
+        return response.data or 0
+
     # Message methods
     async def create_message(self, message: MessageCreate) -> Message:
         if self.testing:
@@ -183,21 +485,241 @@ class SupabaseService:
                 **message.dict()
             )
 
-        response = self.supabase.table("messages").insert(message.dict()).execute()
+        response = await self._execute(self.supabase.table("messages").insert(json.loads(message.json())))
         return Message(**response.data[0])
 
-    async def get_messages_by_order(self, order_id: UUID) -> List[Message]:
+    async def create_messages(self, messages: List[Message]) -> int:
+        """
+        Store many messages in one multi-row insert
+
+        Messages carry their own IDs and timestamps (together the key of the
+        partitioned table), so a batch that is written again (e.g. replayed
+        after a crash) skips the messages already stored.
+
+        Args:
+            messages: The messages, with id and created_at set
+
+        Returns:
+            The number of messages newly stored
+        """
+        if self.testing or not messages:
+            return 0
+
+        rows = [json.loads(message.json()) for message in messages]
+        response = await self._execute(self.supabase.table("messages").upsert(
+            rows,
+            on_conflict="id,created_at",
+            ignore_duplicates=True
+        ))
+        return len(response.data or [])
+
+    async def get_messages_by_order(self, order_id: UUID, limit: Optional[int] = None) -> List[Message]:
+        """
+        Get the messages for an order, oldest first
+
+        Args:
+            order_id: The UUID of the order
+            limit: Only return the most recent messages, or None for all of them
+
+        Returns:
+            The messages
+        """
         if self.testing:
             return []  # Testing will use mocks
 
-        response = self.supabase.table("messages").select("*").eq("order_id", str(order_id)).order("created_at").execute()
-        return [Message(**msg) for msg in response.data]
+        if limit is None:
+            response = await self._execute(self.supabase.table("messages").select("*").eq("order_id", str(order_id)).order("created_at"))
+            return [Message(**msg) for msg in response.data]
+
+        response = await self._execute(self.supabase.table("messages").select("*").eq("order_id", str(order_id)).order("created_at", desc=True).limit(limit))
+        return [Message(**msg) for msg in reversed(response.data)]
 
     async def get_last_message_by_order(self, order_id: UUID) -> Optional[Message]:
         if self.testing:
             return None  # Testing will use mocks
 
-        response = self.supabase.table("messages").select("*").eq("order_id", str(order_id)).order("created_at", desc=True).limit(1).execute()
+        response = await self._execute(self.supabase.table("messages").select("*").eq("order_id", str(order_id)).order("created_at", desc=True).limit(1))
         if response.data and len(response.data) > 0:
             return Message(**response.data[0])
         return None
+
+    # Message archive methods
+    async def get_archivable_messages(self, before: datetime, limit: int = 1000) -> List[Dict[str, Any]]:
+        """
+        Get a page of messages from conversations completed before a cutoff
+
+        Args:
+            before: Only include conversations completed (last updated) before this time
+            limit: Maximum number of messages to return
+
+        Returns:
+            Message rows, grouped by order and oldest first within each order
+        """
+        if self.testing:
+            return []  # Testing will use mocks
+
+        response = await self._execute(self.supabase.rpc(
+            "get_archivable_messages",
+            {"p_before": before.isoformat(), "p_limit": limit}
+        ))
+        return response.data or []
+
+    async def delete_messages(self, message_ids: List[str]) -> int:
+        """
+        Delete messages by ID in one statement
+
+        Args:
+            message_ids: The IDs of the messages
+
+        Returns:
+            The number of messages deleted
+        """
+        if self.testing or not message_ids:
+            return 0
+
+        response = await self._execute(self.supabase.rpc("delete_messages", {"p_ids": message_ids}))
+        return response.data or 0
+
+    async def create_message_partitions(self, months_ahead: int = 3) -> int:
+        """
+        Create the monthly messages partitions from this month, if missing
+
+        Args:
+            months_ahead: Number of months to create, including this one
+
+        Returns:
+            The number of partitions created
+        """
+        if self.testing:
+            return 0
+
+        today = datetime.now(timezone.utc).date()
+        response = await self._execute(self.supabase.rpc(
+            "create_message_partitions",
+            {"p_from": today.isoformat(), "p_months": months_ahead}
+        ))
+        return response.data or 0
+
+    async def drop_empty_message_partitions(self, before: datetime) -> int:
+        """
+        Drop the monthly messages partitions that end before a cutoff and are empty
+
+        Args:
+            before: Only drop partitions ending before this time
+
+        Returns:
+            The number of partitions dropped
+        """
+        if self.testing:
+            return 0
+
+        response = await self._execute(self.supabase.rpc("drop_empty_message_partitions", {"p_before": before.isoformat()}))
+        return response.data or 0
+
+    # Webhook delivery methods
+    async def record_webhook_delivery(self, delivery_key: str) -> bool:
+        """
+        Record a webhook delivery key, ignoring keys that are already recorded
+
+        Args:
+            delivery_key: The provider-assigned delivery ID, namespaced by provider
+
+        Returns:
+            True if the key was new, False if it had already been recorded
+        """
+        if self.testing:
+            return True  # Testing will use mocks
+
+        response = await self._execute(self.supabase.table("webhook_deliveries").upsert(
+            {"id": delivery_key},
+            on_conflict="id",
+            ignore_duplicates=True
+        ))
+        return bool(response.data)
+
+    async def delete_webhook_delivery(self, delivery_key: str) -> None:
+        if self.testing:
+            return None
+
+        await self._execute(self.supabase.table("webhook_deliveries").delete().eq("id", delivery_key))
+
+    # Job queue methods
+    async def enqueue_job(self, job_type: str, payload: Dict[str, Any]) -> int:
+        if self.testing:
+            return 0  # Testing will use mocks
+
+        response = await self._execute(self.supabase.table("jobs").insert({"job_type": job_type, "payload": payload}))
+        return response.data[0]["id"]
+
+    async def claim_jobs(self, limit: int, lease_seconds: int) -> List[Job]:
+        if self.testing:
+            return []  # Testing will use mocks
+
+        response = await self._execute(self.supabase.rpc("claim_jobs", {"p_limit": limit, "p_lease_seconds": lease_seconds}))
+        return [Job(**job) for job in response.data or []]
+
+    async def complete_job(self, job_id: int) -> None:
+        if self.testing:
+            return None
+
+        await self._execute(self.supabase.table("jobs").update({"status": "done", "locked_until": None}).eq("id", job_id))
+
+    async def fail_job(self, job_id: int, error: str, retry_at: Optional[str] = None) -> None:
+        """
+        Record a failed job attempt
+
+        Args:
+            job_id: The job ID
+            error: The error message
+            retry_at: ISO timestamp to retry at, or None to give up on the job
+        """
+        if self.testing:
+            return None
+
+        update = {"last_error": error, "locked_until": None}
+        if retry_at:
+            update.update({"status": "pending", "available_at": retry_at})
+        else:
+            update["status"] = "dead"
+        await self._execute(self.supabase.table("jobs").update(update).eq("id", job_id))
+
+    async def count_pending_jobs(self) -> int:
+        if self.testing:
+            return 0
+
+        response = await self._execute(self.supabase.table("jobs").select("id", count="exact", head=True).in_("status", ["pending", "running"]))
+        return response.count or 0
+
+    # Response cache methods
+    async def get_cached_response(self, key: str) -> Optional[str]:
+        if self.testing:
+            return None  # Testing will use mocks
+
+        now = datetime.now(timezone.utc).isoformat()
+        response = await self._execute(self.supabase.table("response_cache").select("value").eq("key", key).gt("expires_at", now).limit(1))
+        if response.data:
+            return response.data[0]["value"]
+        return None
+
+    async def set_cached_response(self, key: str, value: str, ttl: float) -> None:
+        if self.testing:
+            return None
+
+        expires_at = (datetime.now(timezone.utc) + timedelta(seconds=ttl)).isoformat()
+        await self._execute(self.supabase.table("response_cache").upsert(
+            {"key": key, "value": value, "expires_at": expires_at},
+            on_conflict="key"
+        ))
+
+    # Shopify session methods
+    async def get_shopify_access_token(self, shop: str) -> Optional[str]:
+        if self.testing:
+            return None  # Testing will use mocks
+
+        # The embedded app's Prisma session table; offline sessions hold the shop's long-lived token
+        response = await self._execute(
+            self.supabase.table("Session").select("accessToken").eq("shop", shop).eq("isOnline", False).limit(1)
+        )
+        if response.data:
+            return response.data[0]["accessToken"]
+        return None
@@ -2,6 +2,8 @@ import os
 from twilio.rest import Client
 from typing import Optional, Dict, List, Any
 
+from app.services.whatsapp_dispatcher import TransportError, get_outbound_dispatcher
+
 
 class TwilioService:
     def __init__(self):
@@ -22,6 +24,10 @@ class TwilioService:
         else:
             self.client = None
 
+        # Outbound messages are queued, paced per sender number and retried on rate limits
+        self.stub_transport = os.environ.get("TWILIO_TRANSPORT", "twilio").lower() == "stub"
+        self.dispatcher = get_outbound_dispatcher(self.client) if not self.testing else None
+
     async def send_whatsapp_message(self, to_phone: str, message: str) -> Optional[str]:
         """
         Send a WhatsApp message through Twilio
@@ -37,24 +43,13 @@ class TwilioService:
             print(f"[TEST] Would send WhatsApp message to {to_phone}: {message}")
             return "TEST_MESSAGE_SID"
 
-        if not self.client or not self.from_phone:
+        if not (self.client or self.stub_transport) or not self.from_phone:
             print("Cannot send message: Twilio client not initialized or from_phone not set")
             return None
 
         try:
-            # Format numbers for WhatsApp
-            from_whatsapp = f"whatsapp:{self.from_phone}"
-            to_whatsapp = f"whatsapp:{to_phone}"
-
-            # Send the message
-            message = self.client.messages.create(
-                body=message,
-                from_=from_whatsapp,
-                to=to_whatsapp
-            )
-
-            return message.sid
-        except Exception as e:
+            return await self.dispatcher.send(self.from_phone, to_phone, message)
+        except TransportError as e:
             print(f"Error sending WhatsApp message: {e}")
             return None
 
@@ -2,6 +2,10 @@ import os
 import json
 from typing import Dict, List, Optional, Any, Tuple
 
+from app.utils.executor import get_executor
+from app.utils.intent_classifier import get_intent_classifier
+from app.services.response_cache import get_response_cache
+
 # Only import Google Cloud libraries if not in testing mode
 TESTING = os.environ.get("TESTING", "").lower() == "true"
 if not TESTING:
@@ -11,13 +15,15 @@ if not TESTING:
     except ImportError:
         print("Warning: Google Cloud libraries not available, AI features will be disabled")
 
+# Bump whenever SIZE_CONFIRMATION_PROMPT changes so cached responses are not reused
+PROMPT_VERSION = "4"
+
 # Constants for prompts
 SIZE_CONFIRMATION_PROMPT = """
 You are a helpful sizing assistant for a clothing store. Your job is to confirm if the customer's order size is correct.
 
 ORDER INFORMATION:
-- Product: {product_title}
-- Size ordered: {original_size}
+{order_information}
 
 INTERACTION GUIDELINES:
 1. Be friendly, brief, and conversational
@@ -25,9 +31,14 @@ INTERACTION GUIDELINES:
 3. If they're unsure about their size, ask helpful questions about:
    - Their usual size at common retailers (Zara, H&M)
    - Their height and weight
-4. Make a sizing recommendation based on their responses
+4. Make a sizing recommendation based on their responses. If recommended sizes are
+   listed under KNOWN SIZING FACTS, recommend exactly those sizes
+5. If the order has several items, confirm the sizes of all of them together in
+   each message rather than one item at a time
 
 CURRENT CONVERSATION PHASE: {phase}
+KNOWN SIZING FACTS:
+{sizing_facts}
 CONVERSATION HISTORY:
 {conversation_history}
 
@@ -42,18 +53,78 @@ Analyze the customer's message below and extract:
 Customer message: "{message}"
 
 Respond in valid JSON format ONLY, like this:
-{
+{{
   "intent": "INTENT_TYPE",
-  "entities": {
+  "entities": {{
     "usual_size": "Value if mentioned",
     "height": "Value if mentioned",
     "weight": "Value if mentioned",
     "preferred_size": "Value if mentioned"
-  }
-}
+  }}
+}}
 """
 
 
+def _format_fact(value: Any) -> str:
+    # Heights and weights are stored as floats; 180.0 reads better as 180
+    return f"{value:g}" if isinstance(value, float) else str(value)
+
+
+def describe_order(product_title: str, original_size: str, line_items: Optional[List[Dict[str, str]]] = None) -> str:
+    """
+    Describe the ordered items and their sizes for the prompt
+
+    Args:
+        product_title: The title of the product
+        original_size: The original size ordered
+        line_items: For orders with several sized items, each item's product_title and original_size
+
+    Returns:
+        One line per item
+    """
+    if line_items and len(line_items) > 1:
+        return "\n".join(f"- {item['product_title']}: size {item['original_size']}" for item in line_items)
+    return f"- Product: {product_title}\n- Size ordered: {original_size}"
+
+
+def build_prompt(
+    product_title: str,
+    original_size: str,
+    conversation_history: List[Dict[str, str]],
+    phase: str,
+    sizing_facts: Optional[Dict[str, Any]] = None,
+    line_items: Optional[List[Dict[str, str]]] = None
+) -> str:
+    """
+    Build the size confirmation prompt
+
+    Args:
+        product_title: The title of the product
+        original_size: The original size ordered
+        conversation_history: Messages to include, oldest first
+        phase: The current phase of the conversation
+        sizing_facts: Known usual_size, height, weight and preferred_size values
+        line_items: For orders with several sized items, each item's product_title and original_size
+
+    Returns:
+        The prompt
+    """
+    facts = "\n".join(
+        f"- {key.replace('_', ' ').capitalize()}: {_format_fact(value)}"
+        for key, value in (sizing_facts or {}).items()
+    )
+    history = "\n".join(
+        f"{'Assistant' if msg['direction'] == 'outbound' else 'Customer'}: {msg['content']}"
+        for msg in conversation_history
+    )
+    return SIZE_CONFIRMATION_PROMPT.format(
+        order_information=describe_order(product_title, original_size, line_items),
+        phase=getattr(phase, "value", phase),
+        sizing_facts=facts or "- None yet",
+        conversation_history=history
+    )
+
+
 class VertexAIService:
     def __init__(self):
         # Check if we're in testing mode
@@ -63,6 +134,16 @@ class VertexAIService:
         self.location = os.environ.get("VERTEX_AI_LOCATION", "us-central1")
         self.model_name = "chat-bison"
 
+        # Model predictions are blocking, so they run on a bounded thread pool
+        self.executor = get_executor("vertex_ai")
+
+        # Unambiguous replies are classified locally; set INTENT_FAST_PATH=false to always use the model
+        self.intent_fast_path = os.environ.get("INTENT_FAST_PATH", "true").lower() == "true"
+        self.intent_classifier = get_intent_classifier()
+
+        # Openers are shared across orders of the same products and sizes
+        self.response_cache = get_response_cache()
+
         # Initialize Vertex AI only if not in testing mode
         if not self.testing:
             try:
@@ -80,7 +161,9 @@ class VertexAIService:
         product_title: str,
         original_size: str,
         conversation_history: List[Dict[str, str]],
-        phase: str = "CONFIRMATION"
+        phase: str = "CONFIRMATION",
+        sizing_facts: Optional[Dict[str, Any]] = None,
+        line_items: Optional[List[Dict[str, str]]] = None
     ) -> str:
         """
         Generate a response from the AI model for the size confirmation conversation
@@ -90,12 +173,18 @@ class VertexAIService:
             original_size: The original size ordered
             conversation_history: List of previous messages in the conversation
             phase: The current phase of the conversation
+            sizing_facts: Known sizing facts, including any that fall outside conversation_history
+            line_items: For orders with several sized items, each item's product_title and
+                original_size, so all of them are confirmed in the same conversation
 
         Returns:
             The model's response
         """
         # Return mock responses in testing mode
         if self.testing:
+            if line_items and len(line_items) > 1 and getattr(phase, "value", phase) == "CONFIRMATION":
+                items = ", ".join(f"{item['product_title']} in size {item['original_size']}" for item in line_items)
+                return f"Hi! We noticed you ordered {items}. Are these the correct sizes for you?"
             responses = {
                 "CONFIRMATION": f"Hi! We noticed you ordered a {product_title} in size {original_size}. Is this the correct size for you?",
                 "SIZING_QUESTIONS": "What's your usual size at stores like Zara or H&M? Also, could you share your height and weight to help me recommend the best size?",
@@ -107,27 +196,44 @@ class VertexAIService:
         if not self.chat_model:
             return "Sorry, I'm currently unable to process your request. Please contact customer support."
 
-        # Format conversation history
-        formatted_history = ""
-        for msg in conversation_history:
-            role = "Assistant" if msg["direction"] == "outbound" else "Customer"
-            formatted_history += f"{role}: {msg['content']}\n"
+        # The opener depends only on the products and sizes ordered; every later reply,
+        # including the sign-off naming the confirmed sizes, depends on what the customer said
+        phase_name = getattr(phase, "value", phase)
+        cacheable = phase_name == "CONFIRMATION" and not conversation_history
+        if self.response_cache is not None and cacheable:
+            if line_items and len(line_items) > 1:
+                order_key = "|".join(f"{item['product_title']}:{item['original_size']}" for item in line_items)
+            else:
+                order_key = f"{product_title}:{original_size}"
+            key = f"v{PROMPT_VERSION}:{phase_name}:{order_key}"
+            response = await self.response_cache.get_or_generate(
+                key, lambda: self._predict_response(product_title, original_size, conversation_history, phase, sizing_facts, line_items)
+            )
+        else:
+            response = await self._predict_response(product_title, original_size, conversation_history, phase, sizing_facts, line_items)
+
+        if response is None:
+            return "I'm sorry, I'm having trouble processing your request right now. Could you please try again?"
+        return response
 
-        # Prepare the prompt
-        prompt = SIZE_CONFIRMATION_PROMPT.format(
-            product_title=product_title,
-            original_size=original_size,
-            conversation_history=formatted_history,
-            phase=phase
-        )
+    async def _predict_response(
+        self,
+        product_title: str,
+        original_size: str,
+        conversation_history: List[Dict[str, str]],
+        phase: str,
+        sizing_facts: Optional[Dict[str, Any]],
+        line_items: Optional[List[Dict[str, str]]] = None
+    ) -> Optional[str]:
+        prompt = build_prompt(product_title, original_size, conversation_history, phase, sizing_facts, line_items)
 
         try:
             # Generate response
-            response = self.chat_model.predict(prompt=prompt, temperature=0.2, max_output_tokens=256)
+            response = await self.executor.run(self.chat_model.predict, prompt=prompt, temperature=0.2, max_output_tokens=256)
             return response.text
         except Exception as e:
             print(f"Error generating AI response: {e}")
-            return "I'm sorry, I'm having trouble processing your request right now. Could you please try again?"
+            return None
 
     async def detect_intent(self, message: str) -> Tuple[str, Dict[str, Any]]:
         """
@@ -139,6 +245,11 @@ class VertexAIService:
         Returns:
             Tuple of (intent, entities)
         """
+        if self.intent_fast_path:
+            result = self.intent_classifier.classify(message)
+            if result is not None:
+                return result
+
         # Mock intent detection in testing mode
         if self.testing:
             # Simple rules for testing mode
@@ -166,7 +277,7 @@ class VertexAIService:
 
         try:
             # Generate response with intent analysis
-            response = self.chat_model.predict(prompt=prompt, temperature=0.1, max_output_tokens=512)
+            response = await self.executor.run(self.chat_model.predict, prompt=prompt, temperature=0.1, max_output_tokens=512)
 
             try:
                 # Parse the JSON response
@@ -0,0 +1,281 @@
+import os
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from app.utils.executor import IntegrationExecutor, get_executor
+from app.utils.rate_limiter import TokenBucket
+
+
+class TransportError(Exception):
+    """
+    A failed send, with the HTTP status when the provider returned one
+
+    before_send marks network errors raised while connecting, so the provider
+    never saw the request. Other errors without a status, such as timeouts,
+    may have been sent and are not retried, so the customer is not messaged twice.
+    """
+
+    def __init__(self, message: str, status: Optional[int] = None, before_send: bool = False):
+        super().__init__(message)
+        self.status = status
+        self.before_send = before_send
+
+    @property
+    def retryable(self) -> bool:
+        # Rate limits, server errors and connections that were never made are worth retrying
+        if self.status is None:
+            return self.before_send
+        return self.status == 429 or self.status >= 500
+
+
+def _failed_before_sending(error: Exception) -> bool:
+    """
+    Check whether a Twilio SDK network error happened while connecting, before the request was sent
+    """
+    from requests.exceptions import ConnectionError, ConnectTimeout
+    from urllib3.exceptions import NewConnectionError
+
+    if isinstance(error, ConnectTimeout):
+        return True
+    if isinstance(error, ConnectionError) and error.args:
+        # DNS failures and refused connections; a dropped connection may have delivered the request
+        return isinstance(getattr(error.args[0], "reason", None), NewConnectionError)
+    return False
+
+
+class TwilioTransport:
+    """
+    Sends WhatsApp messages through the Twilio REST API
+
+    The Twilio SDK is blocking, so API calls run on the twilio thread pool.
+    """
+
+    def __init__(self, client: Any, executor: Optional[IntegrationExecutor] = None):
+        self.client = client
+        self.executor = executor or get_executor("twilio")
+
+    async def send(self, from_phone: str, to_phone: str, body: str) -> str:
+        from twilio.base.exceptions import TwilioRestException
+
+        try:
+            message = await self.executor.run(
+                self.client.messages.create,
+                body=body,
+                from_=f"whatsapp:{from_phone}",
+                to=f"whatsapp:{to_phone}"
+            )
+        except TwilioRestException as e:
+            raise TransportError(str(e), status=e.status) from e
+        except asyncio.TimeoutError as e:
+            # The call may still reach Twilio on its thread, so the send is ambiguous
+            raise TransportError("Timed out waiting for Twilio") from e
+        except Exception as e:
+            raise TransportError(str(e), before_send=_failed_before_sending(e)) from e
+        return message.sid
+
+
+class StubTransport:
+    """
+    Records messages instead of sending them, for local development and tests
+
+    Errors queued in failures are raised by the next sends, in order.
+    """
+
+    def __init__(self):
+        self.sent: List[Dict[str, str]] = []
+        self.failures: List[TransportError] = []
+
+    async def send(self, from_phone: str, to_phone: str, body: str) -> str:
+        if self.failures:
+            raise self.failures.pop(0)
+        self.sent.append({"from": from_phone, "to": to_phone, "body": body})
+        return f"STUB{len(self.sent):030d}"
+
+
+@dataclass
+class OutboundMessage:
+    from_phone: str
+    to_phone: str
+    body: str
+    result: asyncio.Future = field(repr=False)
+    attempts: int = 0
+
+
+class OutboundDispatcher:
+    """
+    Sends outbound messages from a bounded queue, paced per sender number
+
+    Each sender number gets a token bucket of rate messages per second. Sends
+    that fail with a rate limit, a server error or a connection that was never
+    made are retried with exponential backoff, and a 429 also pauses the
+    sender's bucket. Timeouts are not retried, since the message may have been sent. When the queue is full,
+    callers wait for room rather than the message being dropped.
+    """
+
+    def __init__(
+        self,
+        transport: Any,
+        rate: float = 20.0,
+        burst: Optional[float] = None,
+        max_queue: int = 1000,
+        concurrency: int = 8,
+        max_attempts: int = 5,
+        backoff_base: float = 1.0
+    ):
+        self.transport = transport
+        self.rate = rate
+        self.burst = burst
+        self.max_queue = max_queue
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self._queue: Optional[asyncio.Queue] = None
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._workers: List[asyncio.Task] = []
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+
+    def _bucket(self, from_phone: str) -> TokenBucket:
+        bucket = self._buckets.get(from_phone)
+        if bucket is None:
+            bucket = self._buckets[from_phone] = TokenBucket(self.rate, self.burst)
+        return bucket
+
+    def _ensure_started(self) -> None:
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+        if not self._workers:
+            self._workers = [asyncio.ensure_future(self._work()) for _ in range(self.concurrency)]
+
+    async def send(self, from_phone: str, to_phone: str, body: str) -> str:
+        """
+        Queue a message and wait until it is sent
+
+        Args:
+            from_phone: The sender number
+            to_phone: The recipient number
+            body: The message content
+
+        Returns:
+            The provider's message ID
+
+        Raises:
+            TransportError: If the message could not be sent
+        """
+        self._ensure_started()
+        message = OutboundMessage(from_phone, to_phone, body, asyncio.get_running_loop().create_future())
+        await self._queue.put(message)
+        return await message.result
+
+    async def _work(self) -> None:
+        while True:
+            message = await self._queue.get()
+            try:
+                await self._deliver(message)
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, message: OutboundMessage) -> None:
+        bucket = self._bucket(message.from_phone)
+        while True:
+            await bucket.acquire()
+            message.attempts += 1
+            try:
+                sid = await self.transport.send(message.from_phone, message.to_phone, message.body)
+            except TransportError as e:
+                if not e.retryable or message.attempts >= self.max_attempts:
+                    self.failed += 1
+                    if not message.result.done():
+                        message.result.set_exception(e)
+                    return
+
+                delay = self.backoff_base * 2 ** (message.attempts - 1)
+                if e.status == 429:
+                    bucket.pause(delay)
+                self.retried += 1
+                print(f"Send to {message.to_phone} failed ({e.status or e}), retrying in {delay}s")
+                await asyncio.sleep(delay)
+                continue
+
+            self.sent += 1
+            if not message.result.done():
+                message.result.set_result(sid)
+            return
+
+    async def stop(self) -> None:
+        """
+        Send everything already queued, then stop the workers
+        """
+        if self._queue is not None and self._workers:
+            await self._queue.join()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Get queue and delivery counters
+
+        Returns:
+            A dictionary with queue depth, senders, sent, retried and failed counts
+        """
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue": self.max_queue,
+            "senders": len(self._buckets),
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
+
+
+_outbound_dispatcher: Optional[OutboundDispatcher] = None
+
+
+def get_outbound_dispatcher(client: Any = None) -> OutboundDispatcher:
+    """
+    Get the process-wide WhatsApp dispatcher, so every sender's rate limit is shared
+
+    TWILIO_TRANSPORT=stub records messages locally instead of calling Twilio.
+
+    Args:
+        client: The Twilio client used when the dispatcher is first created
+
+    Returns:
+        The dispatcher
+    """
+    global _outbound_dispatcher
+    if _outbound_dispatcher is None:
+        if os.environ.get("TWILIO_TRANSPORT", "twilio").lower() == "stub":
+            transport = StubTransport()
+        else:
+            transport = TwilioTransport(client)
+
+        burst = os.environ.get("TWILIO_SEND_BURST")
+        _outbound_dispatcher = OutboundDispatcher(
+            transport,
+            rate=float(os.environ.get("TWILIO_SEND_RATE", "20")),
+            burst=float(burst) if burst else None,
+            max_queue=int(os.environ.get("TWILIO_SEND_QUEUE_SIZE", "1000")),
+            concurrency=int(os.environ.get("TWILIO_SEND_CONCURRENCY", "8")),
+            max_attempts=int(os.environ.get("TWILIO_SEND_MAX_ATTEMPTS", "5"))
+        )
+    return _outbound_dispatcher
+
+
+def outbound_metrics() -> Optional[Dict[str, Any]]:
+    """
+    Get the dispatcher's metrics, if it has been created
+    """
+    return _outbound_dispatcher.metrics() if _outbound_dispatcher is not None else None
+
+
+async def stop_outbound_dispatcher() -> None:
+    """
+    Flush and stop the process-wide dispatcher, if it has been created
+    """
+    if _outbound_dispatcher is not None:
+        await _outbound_dispatcher.stop()
@@ -0,0 +1,162 @@
+import os
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+
+T = TypeVar("T")
+
+# Default (max_workers, timeout_seconds) per integration; override with
+# EXECUTOR_<NAME>_MAX_WORKERS and EXECUTOR_<NAME>_TIMEOUT
+DEFAULT_LIMITS = {
+    "twilio": (8, 10.0),
+    "vertex_ai": (8, 30.0),
+}
+
+
+class IntegrationExecutor:
+    """
+    A bounded thread pool for one blocking SDK integration
+
+    Blocking SDK calls are run off the event loop, with at most max_workers in
+    flight. Calls beyond that wait in the pool's queue; a call that does not
+    finish within the timeout is cancelled (dropped if it has not started yet)
+    and raises asyncio.TimeoutError.
+    """
+
+    def __init__(self, name: str, max_workers: int, timeout: Optional[float] = None):
+        self.name = name
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-executor")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._timed_out = 0
+
+    def _invoke(self, func: Callable[..., T]) -> T:
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+        try:
+            return func()
+        finally:
+            with self._lock:
+                self._running -= 1
+
+    async def run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """
+        Run a blocking callable on this integration's pool
+
+        Args:
+            func: The blocking callable
+            *args: Positional arguments for func
+            **kwargs: Keyword arguments for func
+
+        Returns:
+            The callable's return value
+
+        Raises:
+            asyncio.TimeoutError: If the call does not finish within the timeout
+        """
+        with self._lock:
+            self._queued += 1
+        call = self._pool.submit(self._invoke, functools.partial(func, *args, **kwargs))
+
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(call), self.timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self._timed_out += 1
+            raise
+        except Exception:
+            with self._lock:
+                self._failed += 1
+            raise
+        finally:
+            # A call cancelled before it started (timed out, or its caller was
+            # cancelled) never reaches _invoke, so it leaves the queue here
+            if call.cancelled():
+                with self._lock:
+                    self._queued -= 1
+
+        with self._lock:
+            self._completed += 1
+        return result
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Get a snapshot of this executor's counters
+
+        Returns:
+            A dictionary with queue depth, in-flight calls and outcome counts
+        """
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "timeout": self.timeout,
+                "queue_depth": self._queued,
+                "running": self._running,
+                "completed": self._completed,
+                "failed": self._failed,
+                "timed_out": self._timed_out,
+            }
+
+    def shutdown(self) -> None:
+        """
+        Stop accepting work and drop calls that have not started
+        """
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+_executors: Dict[str, IntegrationExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor(name: str) -> IntegrationExecutor:
+    """
+    Get the shared executor for an integration, creating it on first use
+
+    Args:
+        name: The integration name (e.g. "twilio", "vertex_ai")
+
+    Returns:
+        The integration's executor
+    """
+    with _executors_lock:
+        executor = _executors.get(name)
+        if executor is None:
+            default_workers, default_timeout = DEFAULT_LIMITS.get(name, (4, 30.0))
+            prefix = f"EXECUTOR_{name.upper()}"
+            max_workers = int(os.environ.get(f"{prefix}_MAX_WORKERS", default_workers))
+            timeout = float(os.environ.get(f"{prefix}_TIMEOUT", default_timeout))
+            executor = IntegrationExecutor(name, max_workers=max_workers, timeout=timeout)
+            _executors[name] = executor
+        return executor
+
+
+def executor_metrics() -> Dict[str, Dict[str, Any]]:
+    """
+    Get metrics for every executor created so far
+
+    Returns:
+        A dictionary of metrics keyed by integration name
+    """
+    with _executors_lock:
+        executors = list(_executors.values())
+    return {executor.name: executor.metrics() for executor in executors}
+
+
+def shutdown_executors() -> None:
+    """
+    Shut down every executor
+    """
+    with _executors_lock:
+        executors = list(_executors.values())
+        _executors.clear()
+    for executor in executors:
+        executor.shutdown()
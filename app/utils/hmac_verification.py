@@ -48,3 +48,55 @@ async def verify_shopify_webhook(request: Request) -> None:
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid HMAC signature"
         )
+
+
+async def verify_admin_token(request: Request) -> None:
+    """
+    Verify that an admin API request carries the configured token
+
+    Args:
+        request: The FastAPI request object
+
+    Raises:
+        HTTPException: If the token is missing or invalid
+    """
+    admin_token = os.environ.get("ADMIN_API_TOKEN")
+    if not admin_token:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="ADMIN_API_TOKEN not configured"
+        )
+
+    token_header = request.headers.get("X-Admin-Token", "")
+    if not hmac.compare_digest(token_header.encode(), admin_token.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid admin token"
+        )
+
+
+async def verify_cron_secret(request: Request) -> None:
+    """
+    Verify that a scheduled request carries the configured cron secret
+
+    Vercel Cron Jobs send it as "Authorization: Bearer <CRON_SECRET>".
+
+    Args:
+        request: The FastAPI request object
+
+    Raises:
+        HTTPException: If the secret is missing or invalid
+    """
+    cron_secret = os.environ.get("CRON_SECRET")
+    if not cron_secret:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="CRON_SECRET not configured"
+        )
+
+    authorization = request.headers.get("Authorization", "")
+    if not hmac.compare_digest(authorization.encode(), f"Bearer {cron_secret}".encode()):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid cron secret"
+        )
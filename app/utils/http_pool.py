@@ -0,0 +1,73 @@
+import os
+from typing import Dict, Optional
+
+import httpx
+
+
+# Shared keep-alive pools, keyed by integration (e.g. "supabase:<project url>")
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+
+def get_http_client(
+    key: str,
+    max_connections: Optional[int] = None,
+    max_keepalive_connections: Optional[int] = None,
+    timeout: float = 30.0
+) -> httpx.AsyncClient:
+    """
+    Get (or lazily create) a shared async HTTP client with a bounded connection pool
+
+    Every caller using the same key shares one pool, so concurrent requests
+    reuse warm keep-alive connections instead of opening new ones.
+
+    Args:
+        key: The pool key, one per upstream base URL
+        max_connections: Upper bound on open connections (defaults to HTTP_POOL_MAX_CONNECTIONS or 50)
+        max_keepalive_connections: Idle connections kept open (defaults to HTTP_POOL_MAX_KEEPALIVE or 20)
+        timeout: Request timeout in seconds
+
+    Returns:
+        The shared httpx.AsyncClient for this key
+    """
+    client = _clients.get(key)
+    if client is not None and not client.is_closed:
+        return client
+
+    if max_connections is None:
+        max_connections = int(os.environ.get("HTTP_POOL_MAX_CONNECTIONS", "50"))
+    if max_keepalive_connections is None:
+        max_keepalive_connections = int(os.environ.get("HTTP_POOL_MAX_KEEPALIVE", "20"))
+
+    client = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections
+        ),
+        timeout=timeout,
+        follow_redirects=True
+    )
+    _clients[key] = client
+    return client
+
+
+async def close_http_clients() -> None:
+    """
+    Close every shared HTTP client, releasing pooled connections
+    """
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        if not client.is_closed:
+            await client.aclose()
+
+
+async def close_http_client(key: str) -> None:
+    """
+    Close one shared HTTP client, e.g. when its upstream is no longer in use
+
+    Args:
+        key: The pool key
+    """
+    client = _clients.pop(key, None)
+    if client is not None and not client.is_closed:
+        await client.aclose()
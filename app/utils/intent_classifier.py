@@ -0,0 +1,251 @@
+import re
+import threading
+from collections import Counter
+from typing import Dict, Any, Optional, Tuple, List
+
+
+# Letter sizes and their spelled-out forms, normalized to the letter code
+SIZE_ALIASES = {
+    "xxs": "XXS", "xs": "XS", "s": "S", "m": "M", "l": "L", "xl": "XL",
+    "xxl": "XXL", "2xl": "XXL", "xxxl": "XXXL", "3xl": "XXXL",
+    "extra small": "XS", "small": "S", "medium": "M", "large": "L",
+    "extra large": "XL",
+}
+
+_SIZE = r"(?:extra small|extra large|xxs|xxxl|xxl|[23]xl|xs|xl|small|medium|large|s|m|l|(?:eu|uk|us|it|fr)\s?\d{1,2})"
+_BOUNDARY_START = r"(?<![\w'])"
+_BOUNDARY_END = r"(?![\w'])"
+
+HEIGHT_CM = re.compile(r"(?<![\d.])(1\d{2}|2[0-2]\d)\s*(?:cm|centimet(?:er|re)s?)\b")
+HEIGHT_M = re.compile(r"(?<![\d.])([12][.,]\d{1,2})\s*(?:m|meters?|metres?)\b")
+HEIGHT_FT = re.compile(r"(?<![\d.])([4-7])\s*(?:'|ft|foot|feet)\s*(?:(\d{1,2})\s*(?:\"|''|in|inch|inches)?)?(?![\w.])")
+WEIGHT_KG = re.compile(r"(?<![\d.])(\d{2,3}(?:[.,]\d)?)\s*(?:kg|kgs|kilos?|kilograms?)\b")
+WEIGHT_LB = re.compile(r"(?<![\d.])(\d{2,3}(?:[.,]\d)?)\s*(?:lbs?|pounds?)\b")
+USUAL_SIZE = re.compile(
+    _BOUNDARY_START + r"(?:usually|normally|typically|always)\s+(?:wear\s+|take\s+|get\s+|buy\s+|am\s+|an?\s+)*(?:a\s+|an\s+|size\s+)?(" + _SIZE + r")" + _BOUNDARY_END
+)
+SIZE_TOKEN = re.compile(_BOUNDARY_START + "(" + _SIZE + ")" + _BOUNDARY_END)
+WORD = re.compile(r"[\w']+")
+BRAND = re.compile(r"\b(zara|hm)\b")
+
+# Multi-word phrases are collapsed to a marker before the remaining words are checked
+PHRASES = [
+    (re.compile(r"\b(?:not sure|unsure|don't know|dont know|no idea|not certain)\b"), " __unsure__ "),
+    (re.compile(r"\b(?:too (?:small|big|large|tight|loose)|(?:a )?size (?:up|down))\b"), " __change__ "),
+    (re.compile(r"\b(?:sounds good|looks good|all good|that's right|thats right|that is right|no problem|no worries|go ahead|of course)\b"), " __yes__ "),
+]
+
+YES_WORDS = {
+    "yes", "yeah", "yea", "yep", "yup", "y", "ok", "okay", "okey", "k", "sure",
+    "correct", "right", "perfect", "great", "fine", "confirm", "confirmed",
+    "si", "sí", "oui", "ja", "__yes__",
+}
+NO_WORDS = {"no", "nope", "nah", "n", "wrong", "incorrect", "change"}
+UNSURE_WORDS = {"__unsure__", "maybe", "unsure"}
+CHANGE_WORDS = {"__change__", "bigger", "smaller"}
+FILLER_WORDS = {
+    "i", "i'm", "im", "am", "a", "an", "the", "and", "is", "it", "it's", "its",
+    "that", "that's", "thats", "this", "me", "my", "for", "size", "please",
+    "thanks", "thank", "you", "tall", "weigh", "weight", "height", "wear",
+    "usually", "normally", "typically", "at", "in", "of", "so", "just",
+    "about", "around", "roughly", "hi", "hello", "be", "will", "would",
+    "zara", "hm", "should", "good", "thx", "ty",
+}
+# Words that open a question, e.g. "is M ok" - a question is never a confirmation
+QUESTION_WORDS = {
+    "is", "isn't", "are", "aren't", "am", "do", "does", "did", "can", "could",
+    "should", "would", "will", "shall", "may", "what", "which", "who", "why",
+    "how", "when", "where",
+}
+YES_SYMBOLS = {"👍", "👌", "✅", "✔", "✔️"}
+NO_SYMBOLS = {"👎", "❌"}
+
+
+def _format_number(value: float) -> str:
+    return f"{round(value, 1):g}"
+
+
+def _normalize_size(token: str) -> str:
+    token = re.sub(r"\s+", " ", token.strip().lower())
+    if token in SIZE_ALIASES:
+        return SIZE_ALIASES[token]
+    # Regional sizes, e.g. "eu38" -> "EU 38"
+    match = re.match(r"([a-z]{2})\s?(\d{1,2})$", token)
+    if match:
+        return f"{match.group(1).upper()} {match.group(2)}"
+    return token.upper()
+
+
+class IntentClassifier:
+    """
+    Deterministic intent classifier and entity extractor for short replies
+
+    Handles the common, unambiguous replies ("yes", "ok 👍", "180cm 75kg",
+    "I usually wear L") with precompiled patterns. Anything it cannot fully
+    account for is left to the LLM: classify returns None for questions, and
+    unless every word in the message was recognized.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.hits_by_intent: Counter = Counter()
+
+    def classify(self, message: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """
+        Classify a customer message when the answer is certain
+
+        Args:
+            message: The customer's message
+
+        Returns:
+            Tuple of (intent, entities), or None if the message needs the LLM
+        """
+        result = self._classify(message)
+        with self._lock:
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.hits_by_intent[result[0]] += 1
+        return result
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Get fast-path hit-rate counters
+
+        Returns:
+            A dictionary with hits, misses, hit_rate and hits per intent
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "hits_by_intent": dict(self.hits_by_intent),
+            }
+
+    def _classify(self, message: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        text = message.lower().replace("’", "'").replace("”", "\"").strip()
+        if not text or len(text) > 200:
+            return None
+        # "Is that right?" reads as a confirmation word by word; only the LLM can answer it
+        words = WORD.findall(text)
+        if "?" in text or "¿" in text or (words and words[0] in QUESTION_WORDS):
+            return None
+        # Brand names would otherwise read as size tokens ("h&m" -> "m")
+        text = text.replace("h&m", " hm ")
+
+        entities: Dict[str, Any] = {}
+        text = self._extract_measurements(text, entities)
+
+        match = USUAL_SIZE.search(text)
+        if match:
+            entities["usual_size"] = _normalize_size(match.group(1))
+            # Only a single brand says which label the usual size refers to
+            brands = set(BRAND.findall(text))
+            if len(brands) == 1:
+                entities["usual_brand"] = brands.pop()
+            text = text[:match.start()] + " " + text[match.end():]
+
+        sizes = {_normalize_size(size) for size in SIZE_TOKEN.findall(text)}
+        if len(sizes) > 1:
+            return None
+        text = SIZE_TOKEN.sub(" ", text)
+
+        for pattern, marker in PHRASES:
+            text = pattern.sub(marker, text)
+
+        words = WORD.findall(text)
+        symbols = set(re.sub(r"[\w'\s]", "", text))
+        flags = {
+            "yes": bool(symbols & YES_SYMBOLS),
+            "no": bool(symbols & NO_SYMBOLS),
+            "unsure": False,
+            "change": False,
+        }
+        for word in words:
+            if word in YES_WORDS:
+                flags["yes"] = True
+            elif word in NO_WORDS:
+                flags["no"] = True
+            elif word in UNSURE_WORDS:
+                flags["unsure"] = True
+            elif word in CHANGE_WORDS:
+                flags["change"] = True
+            elif word not in FILLER_WORDS:
+                return None
+
+        if flags["yes"] and (flags["no"] or flags["unsure"] or flags["change"]):
+            return None
+
+        size = sizes.pop() if sizes else None
+        if flags["unsure"]:
+            return "UNSURE", entities
+        if flags["no"] or flags["change"]:
+            if size:
+                entities["preferred_size"] = size
+            return "CHANGE_SIZE", entities
+        if flags["yes"]:
+            if size:
+                entities["preferred_size"] = size
+            return "CONFIRM", entities
+        if size:
+            # A bare size is ambiguous without the conversation context
+            return None
+        if "height" in entities or "weight" in entities:
+            return "PROVIDE_INFO", entities
+        if "usual_size" in entities:
+            return "UNSURE", entities
+        return None
+
+    def _extract_measurements(self, text: str, entities: Dict[str, Any]) -> str:
+        spans: List[Tuple[int, int]] = []
+
+        match = HEIGHT_CM.search(text)
+        if match:
+            entities["height"] = _format_number(float(match.group(1)))
+            spans.append(match.span())
+        else:
+            match = HEIGHT_M.search(text)
+            if match:
+                entities["height"] = _format_number(float(match.group(1).replace(",", ".")) * 100)
+                spans.append(match.span())
+            else:
+                match = HEIGHT_FT.search(text)
+                if match:
+                    inches = int(match.group(1)) * 12 + int(match.group(2) or 0)
+                    entities["height"] = _format_number(inches * 2.54)
+                    spans.append(match.span())
+
+        match = WEIGHT_KG.search(text)
+        if match:
+            entities["weight"] = _format_number(float(match.group(1).replace(",", ".")))
+            spans.append(match.span())
+        else:
+            match = WEIGHT_LB.search(text)
+            if match:
+                entities["weight"] = _format_number(float(match.group(1).replace(",", ".")) * 0.45359237)
+                spans.append(match.span())
+
+        for start, end in sorted(spans, reverse=True):
+            text = text[:start] + " " + text[end:]
+        return text
+
+
+_intent_classifier: Optional[IntentClassifier] = None
+
+
+def get_intent_classifier() -> IntentClassifier:
+    """
+    Get the process-wide intent classifier, so hit-rate metrics cover every caller
+
+    Returns:
+        The intent classifier
+    """
+    global _intent_classifier
+    if _intent_classifier is None:
+        _intent_classifier = IntentClassifier()
+    return _intent_classifier
@@ -0,0 +1,71 @@
+import time
+import asyncio
+from typing import Callable, Optional
+
+
+class TokenBucket:
+    """
+    An asyncio token bucket
+
+    Tokens refill continuously at rate per second up to capacity. Waiters are
+    served in arrival order, so a steady backlog drains at exactly the rate.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated_at = clock()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def acquire(self, tokens: float = 1) -> None:
+        """
+        Wait until tokens are available and take them
+
+        Args:
+            tokens: The number of tokens to take
+        """
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        """
+        Withhold tokens for a while, e.g. after the upstream reported a rate limit
+
+        Args:
+            seconds: How long until tokens are available again
+        """
+        self._refill()
+        self._tokens = min(self._tokens, -seconds * self.rate)
+
+    def update(self, available: float, capacity: Optional[float] = None, rate: Optional[float] = None) -> None:
+        """
+        Correct the bucket from the upstream's own accounting
+
+        Args:
+            available: Tokens the upstream reports as available
+            capacity: The upstream's bucket size, if reported
+            rate: The upstream's refill rate per second, if reported
+        """
+        if capacity is not None:
+            self.capacity = capacity
+        if rate is not None:
+            self.rate = rate
+        self._refill()
+        self._tokens = min(self.capacity, available)
+
+    @property
+    def available(self) -> float:
+        self._refill()
+        return self._tokens
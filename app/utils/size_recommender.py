@@ -0,0 +1,269 @@
+import os
+import json
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+# Letter sizes in order; usual sizes are compared by their position in this list
+SIZE_ORDER = ["XXS", "XS", "S", "M", "L", "XL", "XXL", "XXXL"]
+
+# How many sizes a brand's label differs from a standard chart, e.g. Zara runs
+# about half a size small, so a Zara L is closer to a standard M/L
+BRAND_OFFSETS = {
+    "zara": -0.5,
+    "hm": -0.25,
+    "h&m": -0.25,
+}
+
+# Standard letter-size chart, used for products without their own when a charts
+# file's "default" entry is "standard": (size, (min, max) height in cm, (min, max) weight in kg)
+DEFAULT_CHART = [
+    ("XS", (150, 163), (45, 56)),
+    ("S", (160, 170), (54, 65)),
+    ("M", (168, 178), (63, 75)),
+    ("L", (176, 185), (73, 86)),
+    ("XL", (183, 191), (84, 97)),
+    ("XXL", (189, 198), (95, 110)),
+]
+
+# Relative weight of each signal in the combined score
+HEIGHT_WEIGHT = 1.0
+WEIGHT_WEIGHT = 1.0
+USUAL_SIZE_WEIGHT = 1.5
+
+
+class SizeRecommendation(NamedTuple):
+    size: str
+    confidence: float
+
+
+class SizeChart:
+    """
+    A product's size chart as NumPy arrays
+
+    Each size's height and weight range is stored as a center and half-width,
+    so a measurement's distance from every size is one array operation.
+    """
+
+    def __init__(self, rows: Sequence[Tuple[str, Tuple[float, float], Tuple[float, float]]]):
+        self.sizes = [size for size, _, _ in rows]
+        heights = np.array([height for _, height, _ in rows], dtype=float)
+        weights = np.array([weight for _, _, weight in rows], dtype=float)
+        self.height_center = heights.mean(axis=1)
+        self.height_spread = np.diff(heights, axis=1)[:, 0] / 2
+        self.weight_center = weights.mean(axis=1)
+        self.weight_spread = np.diff(weights, axis=1)[:, 0] / 2
+        # Position of each chart size on the standard size scale
+        self.size_index = np.array([SIZE_ORDER.index(size) if size in SIZE_ORDER else np.nan for size in self.sizes])
+
+    def has_size(self, size: Optional[str]) -> bool:
+        """
+        Check whether a size is one of the chart's, ignoring case and surrounding spaces
+        """
+        return str(size or "").strip().upper() in {chart_size.upper() for chart_size in self.sizes}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SizeChart":
+        """
+        Build a chart from {"sizes": [...], "height": [[min, max], ...], "weight": [[min, max], ...]}
+        """
+        return cls(list(zip(data["sizes"], data["height"], data["weight"])))
+
+    def score(self, heights: np.ndarray, weights: np.ndarray, usual_indices: np.ndarray) -> np.ndarray:
+        """
+        Score every size for a batch of customers
+
+        Args:
+            heights: Heights in cm, NaN where unknown
+            weights: Weights in kg, NaN where unknown
+            usual_indices: Brand-adjusted usual sizes on the SIZE_ORDER scale, NaN where unknown
+
+        Returns:
+            Array of shape (customers, sizes) with a log-score per size; higher fits better
+        """
+        height_z = (heights[:, None] - self.height_center) / self.height_spread
+        weight_z = (weights[:, None] - self.weight_center) / self.weight_spread
+        usual_z = usual_indices[:, None] - self.size_index
+
+        # Unknown measurements contribute nothing to any size
+        return -(
+            HEIGHT_WEIGHT * np.nan_to_num(height_z ** 2)
+            + WEIGHT_WEIGHT * np.nan_to_num(weight_z ** 2)
+            + USUAL_SIZE_WEIGHT * np.nan_to_num(usual_z ** 2)
+        )
+
+    def recommend_batch(self, heights: np.ndarray, weights: np.ndarray, usual_indices: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Recommend a size for a batch of customers in one vectorized pass
+
+        Args:
+            heights: Heights in cm, NaN where unknown
+            weights: Weights in kg, NaN where unknown
+            usual_indices: Brand-adjusted usual sizes on the SIZE_ORDER scale, NaN where unknown
+
+        Returns:
+            Tuple of (index into sizes, confidence) arrays; customers with no
+            known measurements get index -1 and confidence 0
+        """
+        scores = self.score(heights, weights, usual_indices)
+        best = scores.argmax(axis=1)
+        # Softmax probability of the best size
+        shifted = np.exp(scores - scores.max(axis=1, keepdims=True))
+        confidence = shifted[np.arange(len(best)), best] / shifted.sum(axis=1)
+
+        known = ~(np.isnan(heights) & np.isnan(weights) & np.isnan(usual_indices))
+        return np.where(known, best, -1), np.where(known, confidence, 0.0)
+
+
+def usual_size_index(usual_size: Optional[str], brand: Optional[str] = None) -> float:
+    """
+    Place a usual size on the SIZE_ORDER scale, adjusted for the brand it was worn at
+
+    Args:
+        usual_size: A letter size, e.g. "M"
+        brand: The brand, e.g. "zara"
+
+    Returns:
+        The position, or NaN if the size is not a letter size
+    """
+    size = (usual_size or "").strip().upper()
+    if size not in SIZE_ORDER:
+        return np.nan
+    return SIZE_ORDER.index(size) + BRAND_OFFSETS.get((brand or "").lower(), 0.0)
+
+
+def _to_float(value: Any) -> float:
+    try:
+        return float(value) if value not in (None, "") else np.nan
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class SizeRecommender:
+    """
+    Deterministic size recommendations from per-product size charts
+
+    Charts are loaded from the JSON file at SIZE_CHARTS_PATH, keyed by Shopify
+    product ID. No size is recommended for a product without a chart, or for an
+    ordered size that is not in its chart, unless the file's "default" entry
+    gives a chart for products without their own ("standard" for DEFAULT_CHART).
+    """
+
+    def __init__(self, charts: Optional[Dict[str, SizeChart]] = None, default_chart: Optional[SizeChart] = None):
+        self.charts = charts or {}
+        self.default_chart = default_chart
+
+    @classmethod
+    def from_file(cls, path: str) -> "SizeRecommender":
+        with open(path) as f:
+            data = json.load(f)
+        default = data.pop("default", None)
+        if default == "standard":
+            default_chart = SizeChart(DEFAULT_CHART)
+        else:
+            default_chart = SizeChart.from_dict(default) if default else None
+        return cls({str(product_id): SizeChart.from_dict(chart) for product_id, chart in data.items()}, default_chart)
+
+    def chart_for(self, product_id: Optional[str], ordered_size: Optional[str] = None) -> Optional[SizeChart]:
+        """
+        Get the chart to recommend a product's sizes from
+
+        Args:
+            product_id: The Shopify product ID
+            ordered_size: The size ordered, which must be in the chart; None to skip the check
+
+        Returns:
+            The product's chart (or the default), or None if the product has no
+            chart or the ordered size is not in it
+        """
+        chart = self.charts.get(str(product_id), self.default_chart)
+        if chart is None:
+            return None
+        if ordered_size is not None and not chart.has_size(ordered_size):
+            return None
+        return chart
+
+    def recommend(
+        self,
+        product_id: Optional[str],
+        height: Any = None,
+        weight: Any = None,
+        usual_size: Optional[str] = None,
+        brand: Optional[str] = None,
+        ordered_size: Optional[str] = None
+    ) -> Optional[SizeRecommendation]:
+        """
+        Recommend a size for one customer
+
+        Args:
+            product_id: The Shopify product ID
+            height: Height in cm
+            weight: Weight in kg
+            usual_size: The letter size the customer usually wears
+            brand: Where they wear their usual size, e.g. "zara"
+            ordered_size: The size ordered
+
+        Returns:
+            The recommendation, or None if nothing is known about the customer,
+            the product has no chart or the ordered size is not in it
+        """
+        chart = self.chart_for(product_id, ordered_size)
+        if chart is None:
+            return None
+        best, confidence = chart.recommend_batch(
+            np.array([_to_float(height)]),
+            np.array([_to_float(weight)]),
+            np.array([usual_size_index(usual_size, brand)])
+        )
+        if best[0] < 0:
+            return None
+        return SizeRecommendation(chart.sizes[best[0]], round(float(confidence[0]), 2))
+
+    def recommend_many(
+        self,
+        product_id: Optional[str],
+        customers: List[Dict[str, Any]],
+        ordered_size: Optional[str] = None
+    ) -> List[Optional[SizeRecommendation]]:
+        """
+        Recommend sizes for many customers buying the same product in the same size
+
+        Args:
+            product_id: The Shopify product ID
+            customers: Dictionaries with height, weight, usual_size and optionally usual_brand
+            ordered_size: The size ordered
+
+        Returns:
+            A recommendation (or None) per customer, in order; all None if the
+            product has no chart or the ordered size is not in it
+        """
+        chart = self.chart_for(product_id, ordered_size)
+        if chart is None:
+            return [None] * len(customers)
+        best, confidence = chart.recommend_batch(
+            np.array([_to_float(c.get("height")) for c in customers]),
+            np.array([_to_float(c.get("weight")) for c in customers]),
+            np.array([usual_size_index(c.get("usual_size"), c.get("usual_brand")) for c in customers], dtype=float)
+        )
+        return [
+            SizeRecommendation(chart.sizes[index], round(float(score), 2)) if index >= 0 else None
+            for index, score in zip(best, confidence)
+        ]
+
+
+_size_recommender: Optional[SizeRecommender] = None
+
+
+def get_size_recommender() -> SizeRecommender:
+    """
+    Get the process-wide size recommender, loading charts from SIZE_CHARTS_PATH if set
+
+    Returns:
+        The size recommender
+    """
+    global _size_recommender
+    if _size_recommender is None:
+        path = os.environ.get("SIZE_CHARTS_PATH")
+        _size_recommender = SizeRecommender.from_file(path) if path else SizeRecommender()
+    return _size_recommender
@@ -1,5 +1,7 @@
 from enum import Enum
-from typing import Dict, Any, Optional, List, Union
+from typing import Dict, Any, Optional, List, NamedTuple, Tuple, Type, Union
+
+from app.models.conversation import ConversationPhase
 
 
 class State(str, Enum):
@@ -24,55 +26,103 @@ class Event(str, Enum):
     INFO_PROVIDED = "INFO_PROVIDED"  # Customer provided sizing info
     RECOMMENDATION_ACCEPTED = "RECOMMENDATION_ACCEPTED"  # Customer accepted recommendation
     RECOMMENDATION_REJECTED = "RECOMMENDATION_REJECTED"  # Customer rejected recommendation
+    OTHER = "OTHER"  # Anything else
+
+
+class Effect(str, Enum):
+    """
+    Side effects run when a transition is taken
+    """
+    RECOMMEND = "RECOMMEND"  # Recommend sizes, unless already done with the same facts
+    CONFIRM_ORDERED_SIZES = "CONFIRM_ORDERED_SIZES"  # Store the sizes as ordered (or as named)
+    CONFIRM_RECOMMENDED_SIZES = "CONFIRM_RECOMMENDED_SIZES"  # Store the recommended sizes (or as named)
+    FULFIL = "FULFIL"  # Record the confirmed sizes in Shopify and fulfil the order
+
+
+class Transition(NamedTuple):
+    """
+    Where an event leads from a state, and what happens on the way
+    """
+    target: Any
+    effects: Tuple[Effect, ...] = ()
+
+
+TransitionSpec = Dict[Any, Dict[Event, Union[Any, Transition]]]
 
 
 class StateMachine:
     """
-    A simple state machine to manage conversation flow
+    A table-driven state machine
+
+    The transitions are compiled once into a table indexed by the position of
+    the state and the event in their enums, so taking a transition is two list
+    lookups however many states there are. Adding a phase adds table entries,
+    not branches in the code that runs the machine.
     """
 
-    def __init__(self):
-        # Define the state transitions
-        self.transitions = {
-            State.INIT: {
-                Event.START: State.CONFIRMATION
-            },
-            State.CONFIRMATION: {
-                Event.CONFIRM: State.CONFIRMED,
-                Event.DENY: State.SIZING_QUESTIONS
-            },
-            State.SIZING_QUESTIONS: {
-                Event.INFO_PROVIDED: State.RECOMMENDATION
-            },
-            State.RECOMMENDATION: {
-                Event.RECOMMENDATION_ACCEPTED: State.CONFIRMED,
-                Event.RECOMMENDATION_REJECTED: State.SIZING_QUESTIONS
-            },
-            State.CONFIRMED: {
-                Event.START: State.COMPLETE
+    def __init__(self, transitions: Optional[TransitionSpec] = None, states: Type[Enum] = State):
+        if transitions is None:
+            transitions = {
+                State.INIT: {
+                    Event.START: State.CONFIRMATION
+                },
+                State.CONFIRMATION: {
+                    Event.CONFIRM: State.CONFIRMED,
+                    Event.DENY: State.SIZING_QUESTIONS
+                },
+                State.SIZING_QUESTIONS: {
+                    Event.INFO_PROVIDED: State.RECOMMENDATION
+                },
+                State.RECOMMENDATION: {
+                    Event.RECOMMENDATION_ACCEPTED: State.CONFIRMED,
+                    Event.RECOMMENDATION_REJECTED: State.SIZING_QUESTIONS
+                },
+                State.CONFIRMED: {
+                    Event.START: State.COMPLETE
+                }
             }
-        }
 
-    def get_next_state(self, current_state: State, event: Event) -> Optional[State]:
+        self.states = list(states)
+        self._state_index = {state: index for index, state in enumerate(self.states)}
+        self._event_index = {event: index for index, event in enumerate(Event)}
+        self._table: List[List[Optional[Transition]]] = [[None] * len(self._event_index) for _ in self.states]
+        for state, events in transitions.items():
+            for event, transition in events.items():
+                if not isinstance(transition, Transition):
+                    transition = Transition(transition)
+                self._table[self._state_index[state]][self._event_index[event]] = transition
+
+    def transition(self, current_state: Any, event: Event) -> Optional[Transition]:
         """
-        Get the next state based on the current state and event
+        Get the transition an event takes from a state
 
         Args:
             current_state: The current state
             event: The event that occurred
 
         Returns:
-            The next state, or None if the transition is not defined
+            The transition, or None if it is not defined
         """
-        if current_state not in self.transitions:
+        state_index = self._state_index.get(current_state)
+        if state_index is None:
             return None
+        return self._table[state_index][self._event_index[event]]
 
-        if event not in self.transitions[current_state]:
-            return None
+    def get_next_state(self, current_state: Any, event: Event) -> Optional[Any]:
+        """
+        Get the next state based on the current state and event
+
+        Args:
+            current_state: The current state
+            event: The event that occurred
 
-        return self.transitions[current_state][event]
+        Returns:
+            The next state, or None if the transition is not defined
+        """
+        transition = self.transition(current_state, event)
+        return transition.target if transition is not None else None
 
-    def get_available_events(self, current_state: State) -> List[Event]:
+    def get_available_events(self, current_state: Any) -> List[Event]:
         """
         Get the available events for the current state
 
@@ -82,10 +132,41 @@ class StateMachine:
         Returns:
             A list of available events
         """
-        if current_state not in self.transitions:
+        state_index = self._state_index.get(current_state)
+        if state_index is None:
             return []
 
-        return list(self.transitions[current_state].keys())
+        return [event for event, index in self._event_index.items() if self._table[state_index][index] is not None]
+
+
+def _stay(phase: ConversationPhase) -> Dict[Event, Transition]:
+    return {event: Transition(phase) for event in Event}
+
+
+# The size confirmation conversation; events without an entry leave the phase unchanged
+CONVERSATION_TRANSITIONS: TransitionSpec = {
+    ConversationPhase.CONFIRMATION: {
+        **_stay(ConversationPhase.CONFIRMATION),
+        Event.CONFIRM: Transition(ConversationPhase.COMPLETE, (Effect.CONFIRM_ORDERED_SIZES,)),
+        Event.DENY: Transition(ConversationPhase.SIZING_QUESTIONS),
+        Event.INFO_PROVIDED: Transition(ConversationPhase.SIZING_QUESTIONS),
+    },
+    ConversationPhase.SIZING_QUESTIONS: {
+        **_stay(ConversationPhase.SIZING_QUESTIONS),
+        Event.INFO_PROVIDED: Transition(ConversationPhase.RECOMMENDATION, (Effect.RECOMMEND,)),
+    },
+    ConversationPhase.RECOMMENDATION: {
+        **_stay(ConversationPhase.RECOMMENDATION),
+        Event.CONFIRM: Transition(
+            ConversationPhase.COMPLETE,
+            (Effect.RECOMMEND, Effect.CONFIRM_RECOMMENDED_SIZES, Effect.FULFIL)
+        ),
+        Event.INFO_PROVIDED: Transition(ConversationPhase.RECOMMENDATION, (Effect.RECOMMEND,)),
+    },
+    ConversationPhase.COMPLETE: _stay(ConversationPhase.COMPLETE),
+}
+
+conversation_machine = StateMachine(CONVERSATION_TRANSITIONS, states=ConversationPhase)
 
 
 def map_intent_to_event(intent: str, entities: Dict[str, Any]) -> Event:
@@ -94,20 +175,20 @@ def map_intent_to_event(intent: str, entities: Dict[str, Any]) -> Event:
 
     Args:
         intent: The detected intent
-        entities: The detected entities
+        entities: The sizing facts known so far
 
     Returns:
-        The corresponding event
+        The corresponding event: CONFIRM, else INFO_PROVIDED once the usual size
+        or both height and weight are known, else DENY or OTHER
     """
     if intent == "CONFIRM":
         return Event.CONFIRM
+    elif entities.get("usual_size") or (entities.get("height") and entities.get("weight")):
+        return Event.INFO_PROVIDED
     elif intent in ["UNSURE", "CHANGE_SIZE"]:
         return Event.DENY
-    elif intent == "OTHER" and (entities.get("usual_size") or entities.get("height") or entities.get("weight")):
-        return Event.INFO_PROVIDED
 
-    # Default to DENY if no clear mapping
-    return Event.DENY
+    return Event.OTHER
 
 
 def determine_phase_from_state(state: State) -> str:
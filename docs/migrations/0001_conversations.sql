@@ -0,0 +1,24 @@
+-- 0001: track applied migrations, and define the conversations table
+-- (read by get_reply_context, but missing from supabase_schema.sql)
+
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version VARCHAR(50) PRIMARY KEY,
+    applied_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS conversations (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    order_id UUID REFERENCES orders(id) ON DELETE CASCADE,
+    phone_number VARCHAR(20) NOT NULL,
+    status VARCHAR(50) NOT NULL DEFAULT 'awaiting_size_confirmation',
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+DROP TRIGGER IF EXISTS update_conversations_updated_at ON conversations;
+CREATE TRIGGER update_conversations_updated_at
+BEFORE UPDATE ON conversations
+FOR EACH ROW
+EXECUTE FUNCTION update_updated_at_column();
+
+INSERT INTO schema_migrations (version) VALUES ('0001') ON CONFLICT DO NOTHING;
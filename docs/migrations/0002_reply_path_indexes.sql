@@ -0,0 +1,28 @@
+-- 0002: indexes matching the reply path's lookups, so each is an index scan
+-- in the requested order (no sort) however large the tables grow.
+-- On a large live database, run each CREATE INDEX on its own with
+-- CONCURRENTLY (outside a transaction) to avoid blocking writes.
+
+-- Latest conversation for a phone number
+CREATE INDEX IF NOT EXISTS idx_conversations_phone_created_at
+    ON conversations(phone_number, created_at DESC);
+
+-- Latest pending order for a customer; confirmed orders are left out, so the
+-- index only holds the orders still being confirmed
+CREATE INDEX IF NOT EXISTS idx_orders_pending_by_customer
+    ON orders(customer_id, created_at DESC)
+    WHERE size_confirmed = FALSE;
+
+-- Recent or full history of an order, oldest or newest first
+CREATE INDEX IF NOT EXISTS idx_messages_order_created_at
+    ON messages(order_id, created_at);
+
+-- Superseded: a prefix of idx_messages_order_created_at
+DROP INDEX IF EXISTS idx_messages_order_id;
+
+-- Duplicates of the indexes behind the UNIQUE constraints, only adding write cost
+DROP INDEX IF EXISTS idx_customers_shopify_id;
+DROP INDEX IF EXISTS idx_customers_phone;
+DROP INDEX IF EXISTS idx_orders_shopify_id;
+
+INSERT INTO schema_migrations (version) VALUES ('0002') ON CONFLICT DO NOTHING;
@@ -0,0 +1,135 @@
+-- 0003: partition messages by month of created_at, and support archiving the
+-- messages of completed conversations (see app/services/message_archive.py).
+-- The primary key becomes (id, created_at), as a partitioned table's unique
+-- keys must include the partition key.
+
+-- Create the monthly partitions from p_from's month for p_months months, skipping
+-- existing ones. Rows outside every partition go to messages_default, and a month
+-- cannot be partitioned once it has rows there, so keep partitions created ahead
+-- (the archive job creates the next three months on every run; or schedule
+-- SELECT create_message_partitions(CURRENT_DATE, 3) monthly, e.g. with pg_cron)
+CREATE OR REPLACE FUNCTION create_message_partitions(p_from DATE, p_months INTEGER)
+RETURNS INTEGER AS $$
+DECLARE
+    v_month DATE;
+    v_name TEXT;
+    v_created INTEGER := 0;
+BEGIN
+    FOR i IN 0..p_months - 1 LOOP
+        v_month := (date_trunc('month', p_from) + make_interval(months => i))::DATE;
+        v_name := 'messages_' || to_char(v_month, 'YYYY_MM');
+        IF to_regclass(v_name) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF messages FOR VALUES FROM (%L) TO (%L)',
+                v_name, v_month, (v_month + INTERVAL '1 month')::DATE
+            );
+            v_created := v_created + 1;
+        END IF;
+    END LOOP;
+    RETURN v_created;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    v_first DATE;
+    v_months INTEGER;
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = 'messages'::regclass) = 'p' THEN
+        RETURN;
+    END IF;
+
+    ALTER TABLE messages RENAME TO messages_unpartitioned;
+    ALTER TABLE messages_unpartitioned RENAME CONSTRAINT messages_pkey TO messages_unpartitioned_pkey;
+
+    CREATE TABLE messages (
+        id UUID NOT NULL DEFAULT uuid_generate_v4(),
+        order_id UUID REFERENCES orders(id),
+        customer_id UUID REFERENCES customers(id),
+        direction VARCHAR(10) NOT NULL CHECK (direction IN ('inbound', 'outbound')),
+        content TEXT NOT NULL,
+        media_url TEXT,
+        conversation_phase VARCHAR(50),
+        intent VARCHAR(50),
+        entities JSONB,
+        created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+        PRIMARY KEY (id, created_at)
+    ) PARTITION BY RANGE (created_at);
+
+    CREATE TABLE messages_default PARTITION OF messages DEFAULT;
+
+    -- One partition per month from the oldest message to three months ahead
+    SELECT COALESCE(MIN(created_at), NOW())::DATE INTO v_first FROM messages_unpartitioned;
+    v_months := (EXTRACT(YEAR FROM age(date_trunc('month', NOW()), date_trunc('month', v_first))) * 12
+        + EXTRACT(MONTH FROM age(date_trunc('month', NOW()), date_trunc('month', v_first))))::INTEGER + 4;
+    PERFORM create_message_partitions(v_first, v_months);
+
+    INSERT INTO messages (id, order_id, customer_id, direction, content, media_url,
+                          conversation_phase, intent, entities, created_at)
+    SELECT id, order_id, customer_id, direction, content, media_url,
+           conversation_phase, intent, entities, COALESCE(created_at, NOW())
+    FROM messages_unpartitioned;
+
+    DROP TABLE messages_unpartitioned;
+END $$;
+
+-- Created on every partition, including future ones
+CREATE INDEX IF NOT EXISTS idx_messages_order_created_at ON messages(order_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_messages_customer_id ON messages(customer_id);
+
+-- Conversations completed before a cutoff, for archiving
+CREATE INDEX IF NOT EXISTS idx_conversations_completed_updated_at
+    ON conversations(updated_at)
+    WHERE status = 'completed';
+
+-- A page of messages from conversations completed before p_before, grouped by order
+CREATE OR REPLACE FUNCTION get_archivable_messages(p_before TIMESTAMP WITH TIME ZONE, p_limit INTEGER)
+RETURNS SETOF messages AS $$
+    SELECT m.* FROM messages m
+    WHERE m.order_id IN (
+        SELECT cv.order_id FROM conversations cv
+        WHERE cv.status = 'completed' AND cv.updated_at < p_before
+    )
+    ORDER BY m.order_id, m.created_at
+    LIMIT p_limit;
+$$ LANGUAGE sql STABLE;
+
+-- Delete archived messages by ID (sent in the request body, as a page of IDs
+-- is too long for a query string filter)
+CREATE OR REPLACE FUNCTION delete_messages(p_ids UUID[])
+RETURNS INTEGER AS $$
+DECLARE
+    v_count INTEGER;
+BEGIN
+    DELETE FROM messages WHERE id = ANY(p_ids);
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+    RETURN v_count;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Drop the monthly partitions ending before p_before that archiving has emptied
+CREATE OR REPLACE FUNCTION drop_empty_message_partitions(p_before TIMESTAMP WITH TIME ZONE)
+RETURNS INTEGER AS $$
+DECLARE
+    v_partition REGCLASS;
+    v_empty BOOLEAN;
+    v_dropped INTEGER := 0;
+BEGIN
+    FOR v_partition IN
+        SELECT i.inhrelid::REGCLASS FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'messages'::REGCLASS
+          AND c.relname ~ '^messages_[0-9]{4}_[0-9]{2}$'
+          AND to_date(right(c.relname, 7), 'YYYY_MM') + INTERVAL '1 month' <= p_before
+    LOOP
+        EXECUTE format('SELECT NOT EXISTS (SELECT 1 FROM %s)', v_partition) INTO v_empty;
+        IF v_empty THEN
+            EXECUTE format('DROP TABLE %s', v_partition);
+            v_dropped := v_dropped + 1;
+        END IF;
+    END LOOP;
+    RETURN v_dropped;
+END;
+$$ LANGUAGE plpgsql;
+
+INSERT INTO schema_migrations (version) VALUES ('0003') ON CONFLICT DO NOTHING;
@@ -0,0 +1,26 @@
+-- 0004: keep each conversation's state on its row (phase, sizing facts collected
+-- so far and the recommendation awaiting confirmation) instead of inferring it
+-- from the last message. Replies change it only if version is still the one
+-- they read, then increment it.
+
+ALTER TABLE conversations
+    ADD COLUMN IF NOT EXISTS phase VARCHAR(50) NOT NULL DEFAULT 'CONFIRMATION',
+    ADD COLUMN IF NOT EXISTS entities JSONB NOT NULL DEFAULT '{}'::JSONB,
+    ADD COLUMN IF NOT EXISTS recommendation JSONB,
+    ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 0;
+
+-- Existing conversations continue from their last message's phase
+UPDATE conversations cv
+SET phase = CASE WHEN cv.status = 'completed' THEN 'COMPLETE' ELSE last.conversation_phase END
+FROM (
+    SELECT DISTINCT ON (order_id) order_id, conversation_phase
+    FROM messages
+    WHERE conversation_phase IS NOT NULL
+    ORDER BY order_id, created_at DESC
+) last
+WHERE last.order_id = cv.order_id AND cv.version = 0;
+
+-- One conversation per order, so a retried order job does not start a second one
+CREATE UNIQUE INDEX IF NOT EXISTS idx_conversations_order_id ON conversations(order_id);
+
+INSERT INTO schema_migrations (version) VALUES ('0004') ON CONFLICT DO NOTHING;
@@ -0,0 +1,59 @@
+-- 0005: get_reply_context, which loads everything an inbound WhatsApp reply
+-- needs in one round trip (customer, pending order with its conversation and
+-- line items, and the most recent messages). The conversation is the pending
+-- order's, not the latest for the phone number, which may be about an order
+-- already confirmed
+
+CREATE OR REPLACE FUNCTION get_reply_context(p_phone VARCHAR, p_message_limit INTEGER DEFAULT 20)
+RETURNS JSONB AS $$
+DECLARE
+    v_customer JSONB;
+    v_customer_id UUID;
+    v_conversation JSONB;
+    v_order JSONB;
+    v_order_id UUID;
+    v_line_items JSONB := '[]'::JSONB;
+    v_messages JSONB := '[]'::JSONB;
+BEGIN
+    SELECT to_jsonb(c), c.id INTO v_customer, v_customer_id
+    FROM customers c
+    WHERE c.phone = p_phone
+    LIMIT 1;
+
+    IF v_customer_id IS NOT NULL THEN
+        SELECT to_jsonb(o), o.id INTO v_order, v_order_id
+        FROM orders o
+        WHERE o.customer_id = v_customer_id AND o.size_confirmed = FALSE
+        ORDER BY o.created_at DESC
+        LIMIT 1;
+    END IF;
+
+    IF v_order_id IS NOT NULL THEN
+        SELECT to_jsonb(cv) INTO v_conversation
+        FROM conversations cv
+        WHERE cv.order_id = v_order_id;
+
+        SELECT COALESCE(jsonb_agg(to_jsonb(li) ORDER BY li.line_item_id), '[]'::JSONB) INTO v_line_items
+        FROM order_line_items li
+        WHERE li.order_id = v_order_id;
+
+        SELECT COALESCE(jsonb_agg(to_jsonb(m) ORDER BY m.created_at), '[]'::JSONB) INTO v_messages
+        FROM (
+            SELECT * FROM messages
+            WHERE order_id = v_order_id
+            ORDER BY created_at DESC
+            LIMIT p_message_limit
+        ) m;
+    END IF;
+
+    RETURN jsonb_build_object(
+        'customer', v_customer,
+        'conversation', v_conversation,
+        'order', v_order,
+        'line_items', v_line_items,
+        'messages', v_messages
+    );
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+INSERT INTO schema_migrations (version) VALUES ('0005') ON CONFLICT DO NOTHING;
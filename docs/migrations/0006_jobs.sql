@@ -0,0 +1,35 @@
+-- 0006: the background job queue (JOB_QUEUE_BACKEND=supabase, the default)
+
+CREATE TABLE IF NOT EXISTS jobs (
+    id BIGSERIAL PRIMARY KEY,
+    job_type VARCHAR(50) NOT NULL,
+    payload JSONB NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'running', 'done', 'dead')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    locked_until TIMESTAMP WITH TIME ZONE,
+    last_error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_jobs_claimable ON jobs(available_at) WHERE status IN ('pending', 'running');
+
+-- Claim up to p_limit due jobs (and jobs whose worker lease expired) without blocking other workers
+CREATE OR REPLACE FUNCTION claim_jobs(p_limit INTEGER, p_lease_seconds INTEGER DEFAULT 300)
+RETURNS SETOF jobs AS $$
+    UPDATE jobs
+    SET status = 'running',
+        attempts = attempts + 1,
+        locked_until = NOW() + make_interval(secs => p_lease_seconds)
+    WHERE id IN (
+        SELECT id FROM jobs
+        WHERE (status = 'pending' AND available_at <= NOW())
+           OR (status = 'running' AND locked_until < NOW())
+        ORDER BY id
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING *;
+$$ LANGUAGE sql;
+
+INSERT INTO schema_migrations (version) VALUES ('0006') ON CONFLICT DO NOTHING;
@@ -0,0 +1,13 @@
+-- 0007: processed webhook deliveries (X-Shopify-Webhook-Id / Twilio MessageSid),
+-- for idempotency. Rows only need to outlive the providers' retry windows;
+-- prune periodically, e.g.
+-- DELETE FROM webhook_deliveries WHERE created_at < NOW() - INTERVAL '7 days';
+
+CREATE TABLE IF NOT EXISTS webhook_deliveries (
+    id VARCHAR(255) PRIMARY KEY,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_webhook_deliveries_created_at ON webhook_deliveries(created_at);
+
+INSERT INTO schema_migrations (version) VALUES ('0007') ON CONFLICT DO NOTHING;
@@ -0,0 +1,11 @@
+-- 0008: shared cache of generated AI responses (RESPONSE_CACHE_BACKEND=supabase).
+-- Expired rows are ignored on read; prune periodically, e.g.
+-- DELETE FROM response_cache WHERE expires_at < NOW();
+
+CREATE TABLE IF NOT EXISTS response_cache (
+    key VARCHAR(512) PRIMARY KEY,
+    value TEXT NOT NULL,
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL
+);
+
+INSERT INTO schema_migrations (version) VALUES ('0008') ON CONFLICT DO NOTHING;
@@ -0,0 +1,28 @@
+-- 0009: size recommendations computed from size charts
+-- (see app/services/recommendation_batch.py)
+
+ALTER TABLE orders
+    ADD COLUMN IF NOT EXISTS recommended_size VARCHAR(50),
+    ADD COLUMN IF NOT EXISTS recommendation_confidence NUMERIC(3, 2),
+    ADD COLUMN IF NOT EXISTS recommended_at TIMESTAMP WITH TIME ZONE;
+
+-- Bulk-write recommendations: p_rows is a JSON array of
+-- {"id": ..., "recommended_size": ..., "recommendation_confidence": ...}
+CREATE OR REPLACE FUNCTION set_order_recommendations(p_rows JSONB)
+RETURNS INTEGER AS $$
+DECLARE
+    v_count INTEGER;
+BEGIN
+    UPDATE orders o
+    SET recommended_size = r.recommended_size,
+        recommendation_confidence = r.recommendation_confidence,
+        recommended_at = NOW()
+    FROM jsonb_to_recordset(p_rows) AS r(id UUID, recommended_size VARCHAR(50), recommendation_confidence NUMERIC)
+    WHERE o.id = r.id;
+
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+    RETURN v_count;
+END;
+$$ LANGUAGE plpgsql;
+
+INSERT INTO schema_migrations (version) VALUES ('0009') ON CONFLICT DO NOTHING;
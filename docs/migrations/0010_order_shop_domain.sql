@@ -0,0 +1,7 @@
+-- 0010: the shop each order belongs to, so one deployment can serve many shops
+-- (NULL for orders from SHOPIFY_STORE_URL stored before multi-shop support)
+
+ALTER TABLE orders
+    ADD COLUMN IF NOT EXISTS shop_domain VARCHAR(255);
+
+INSERT INTO schema_migrations (version) VALUES ('0010') ON CONFLICT DO NOTHING;
@@ -0,0 +1,34 @@
+-- 0011: every sized line item of an order, confirmed together in the order's
+-- conversation. The orders row keeps the first sized item's columns for
+-- single-item orders
+
+CREATE TABLE IF NOT EXISTS order_line_items (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    order_id UUID NOT NULL REFERENCES orders(id) ON DELETE CASCADE,
+    line_item_id BIGINT NOT NULL,
+    product_id BIGINT NOT NULL,
+    variant_id BIGINT NOT NULL,
+    product_title VARCHAR(255) NOT NULL,
+    original_size VARCHAR(50) NOT NULL,
+    confirmed_size VARCHAR(50),
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    UNIQUE (order_id, line_item_id)
+);
+
+-- Bulk-write confirmed sizes: p_rows is a JSON array of {"id": ..., "confirmed_size": ...}
+CREATE OR REPLACE FUNCTION set_line_item_sizes(p_rows JSONB)
+RETURNS INTEGER AS $$
+DECLARE
+    v_count INTEGER;
+BEGIN
+    UPDATE order_line_items li
+    SET confirmed_size = r.confirmed_size
+    FROM jsonb_to_recordset(p_rows) AS r(id UUID, confirmed_size VARCHAR(50))
+    WHERE li.id = r.id;
+
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+    RETURN v_count;
+END;
+$$ LANGUAGE plpgsql;
+
+INSERT INTO schema_migrations (version) VALUES ('0011') ON CONFLICT DO NOTHING;
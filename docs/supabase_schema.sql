@@ -1,3 +1,6 @@
+-- Baseline schema. Apply the files in docs/migrations after it, in order;
+-- each records its version in schema_migrations.
+
 -- Customers table
 CREATE TABLE customers (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
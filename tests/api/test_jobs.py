@@ -0,0 +1,32 @@
+import os
+from unittest.mock import patch, AsyncMock, MagicMock
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+os.environ["TESTING"] = "true"
+
+client = TestClient(app)
+
+
+def test_drain_requires_cron_secret():
+    """Test that the drain endpoint rejects requests without the cron secret"""
+    with patch.dict(os.environ, {"CRON_SECRET": "secret"}), \
+         patch("app.api.jobs.create_worker") as mock_create_worker:
+        response = client.get("/jobs/drain", headers={"Authorization": "Bearer wrong"})
+
+    assert response.status_code == 401
+    mock_create_worker.assert_not_called()
+
+
+def test_drain_runs_due_jobs():
+    """Test that a cron request drains the queue within its time budget"""
+    worker = MagicMock()
+    worker.drain = AsyncMock(return_value=3)
+    with patch.dict(os.environ, {"CRON_SECRET": "secret", "JOB_DRAIN_MAX_SECONDS": "5"}), \
+         patch("app.api.jobs.create_worker", return_value=worker):
+        response = client.get("/jobs/drain", headers={"Authorization": "Bearer secret"})
+
+    assert response.status_code == 200
+    assert response.json() == {"processed": 3}
+    worker.drain.assert_called_once_with(5.0)
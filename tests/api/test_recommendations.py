@@ -0,0 +1,48 @@
+import os
+from unittest.mock import patch, AsyncMock
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.job_queue import QueueFullError
+from app.services.job_worker import RECOMMENDATION_BACKFILL
+
+os.environ["TESTING"] = "true"
+
+client = TestClient(app)
+
+
+def test_backfill_requires_admin_token():
+    """Test that the back-fill endpoint rejects requests without the admin token"""
+    with patch.dict(os.environ, {"ADMIN_API_TOKEN": "secret"}):
+        response = client.post("/recommendations/backfill", headers={"X-Admin-Token": "wrong"})
+
+    assert response.status_code == 401
+
+
+def test_backfill_enqueues_job():
+    """Test that the back-fill is queued for the job worker"""
+    with patch.dict(os.environ, {"ADMIN_API_TOKEN": "secret"}), \
+         patch("app.api.recommendations.job_queue") as mock_queue:
+        mock_queue.enqueue = AsyncMock(return_value=7)
+
+        response = client.post(
+            "/recommendations/backfill",
+            headers={"X-Admin-Token": "secret"},
+            json={"page_size": 500}
+        )
+
+    assert response.status_code == 202
+    assert response.json() == {"job_id": 7}
+    mock_queue.enqueue.assert_called_once_with(RECOMMENDATION_BACKFILL, {"page_size": 500})
+
+
+def test_backfill_queue_full():
+    """Test that a full queue asks the caller to retry later"""
+    with patch.dict(os.environ, {"ADMIN_API_TOKEN": "secret"}), \
+         patch("app.api.recommendations.job_queue") as mock_queue:
+        mock_queue.enqueue = AsyncMock(side_effect=QueueFullError("Job queue is full"))
+
+        response = client.post("/recommendations/backfill", headers={"X-Admin-Token": "secret"})
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "30"
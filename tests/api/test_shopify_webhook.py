@@ -6,50 +6,50 @@ from fastapi.testclient import TestClient
 from fastapi import HTTPException, status
 
 from app.main import app
-from app.api.shopify_webhook import router, verify_shopify_webhook
-from app.models.customer import CustomerCreate
-from app.models.order import OrderCreate
+from app.api.shopify_webhook import router, verify_shopify_webhook, idempotency_service
+from app.services.job_queue import QueueFullError
+from app.services.job_worker import ORDER_CREATED
 
 # Set testing flag for the entire module
 os.environ["TESTING"] = "true"
 
 # Create test client with patches for our services
 with patch("app.api.shopify_webhook.shopify_service") as mock_shopify, \
-     patch("app.api.shopify_webhook.supabase_service") as mock_supabase, \
-     patch("app.api.shopify_webhook.conversation_service") as mock_conversation, \
+     patch("app.api.shopify_webhook.job_queue") as mock_queue, \
      patch("app.api.shopify_webhook.verify_shopify_webhook") as mock_verify:
 
     # Mock setup for common functionality
     mock_verify.return_value = None
-    mock_customer = MagicMock(id="customer-uuid")
-    mock_supabase.get_customer_by_shopify_id.return_value = None
-    mock_supabase.create_customer.return_value = mock_customer
-    mock_order = MagicMock(id="order-uuid")
-    mock_supabase.create_order.return_value = mock_order
+    mock_queue.enqueue = AsyncMock(return_value=1)
 
     # Create test client
     client = TestClient(app)
 
+@pytest.fixture(autouse=True)
+def reset_idempotency():
+    idempotency_service.clear()
+    yield
+
+
 @pytest.fixture
 def mock_verify_webhook():
     with patch("app.api.shopify_webhook.verify_shopify_webhook", return_value=None) as mock:
         yield mock
 
 @pytest.fixture
-def mock_services(mock_shopify_service, mock_supabase_service, mock_conversation_service):
+def mock_services(mock_shopify_service):
     with patch("app.api.shopify_webhook.shopify_service", mock_shopify_service), \
-         patch("app.api.shopify_webhook.supabase_service", mock_supabase_service), \
-         patch("app.api.shopify_webhook.conversation_service", mock_conversation_service):
-        yield
+         patch("app.api.shopify_webhook.job_queue") as mock_queue:
+        mock_queue.enqueue = AsyncMock(return_value=1)
+        yield mock_queue
 
 
 class TestShopifyWebhook:
 
     @patch("app.api.shopify_webhook.verify_shopify_webhook")
     @patch("app.api.shopify_webhook.shopify_service")
-    @patch("app.api.shopify_webhook.supabase_service")
-    @patch("app.api.shopify_webhook.conversation_service")
-    async def test_order_webhook_success(self, mock_conversation, mock_supabase, mock_shopify, mock_verify, shopify_webhook_payload):
+    @patch("app.api.shopify_webhook.job_queue")
+    async def test_order_webhook_success(self, mock_queue, mock_shopify, mock_verify, shopify_webhook_payload):
         """Test successful order webhook processing"""
         # Setup mocks
         mock_verify.return_value = None
@@ -73,29 +73,45 @@ class TestShopifyWebhook:
         }
 
         mock_shopify.parse_order_data.return_value = (customer_data, order_details)
-
-        mock_customer = MagicMock(id="customer-uuid")
-        mock_supabase.get_customer_by_shopify_id.return_value = None
-        mock_supabase.create_customer.return_value = mock_customer
-
-        mock_order = MagicMock(id="order-uuid")
-        mock_supabase.create_order.return_value = mock_order
-
-        # Make conversation service return a proper coroutine
-        mock_conversation.start_conversation.return_value = None
+        mock_queue.enqueue = AsyncMock(return_value=1)
 
         # Make request
         response = client.post(
             "/webhook/order",
             json=shopify_webhook_payload,
-            headers={"X-Shopify-Hmac-SHA256": "valid-signature"}
+            headers={"X-Shopify-Hmac-SHA256": "valid-signature", "X-Shopify-Shop-Domain": "test-store.myshopify.com"}
         )
 
         # Verify response
         assert response.status_code == 200
+        assert order_details["shop_domain"] == "test-store.myshopify.com"
+
+        # Verify the order was queued for the worker instead of processed inline
+        mock_queue.enqueue.assert_called_once_with(ORDER_CREATED, {
+            "customer_data": customer_data,
+            "order_details": order_details
+        })
+
+    @patch("app.api.shopify_webhook.verify_shopify_webhook")
+    @patch("app.api.shopify_webhook.shopify_service")
+    @patch("app.api.shopify_webhook.job_queue")
+    async def test_order_webhook_queue_full(self, mock_queue, mock_shopify, mock_verify, shopify_webhook_payload):
+        """Test that a full job queue asks Shopify to retry later"""
+        mock_verify.return_value = None
+        mock_shopify.parse_order_data.return_value = (
+            {"shopify_customer_id": "123456789", "phone": "+1234567890"},
+            {"shopify_order_id": "987654321"}
+        )
+        mock_queue.enqueue = AsyncMock(side_effect=QueueFullError("Job queue is full"))
+
+        response = client.post(
+            "/webhook/order",
+            json=shopify_webhook_payload,
+            headers={"X-Shopify-Hmac-SHA256": "valid-signature"}
+        )
 
-        # We're no longer verifying all the mock calls since they may not be reliable
-        # in the testing environment where errors are being caught and handled
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "30"
 
     @patch("app.api.shopify_webhook.verify_shopify_webhook")
     @patch("app.api.shopify_webhook.shopify_service")
@@ -184,3 +200,54 @@ class TestShopifyWebhook:
         # Verify response
         assert response.status_code == 401
         assert "Invalid HMAC" in response.json()["detail"]
+
+    @patch("app.api.shopify_webhook.verify_shopify_webhook")
+    @patch("app.api.shopify_webhook.shopify_service")
+    @patch("app.api.shopify_webhook.job_queue")
+    async def test_order_webhook_duplicate_delivery(self, mock_queue, mock_shopify, mock_verify, mock_shopify_service, shopify_webhook_payload):
+        """Test that a redelivered webhook ID is acknowledged without enqueueing again"""
+        mock_verify.return_value = None
+        mock_shopify.parse_order_data.return_value = mock_shopify_service.parse_order_data.return_value
+        mock_queue.enqueue = AsyncMock(return_value=1)
+        headers = {"X-Shopify-Hmac-SHA256": "valid-signature", "X-Shopify-Webhook-Id": "webhook-1"}
+
+        first = client.post("/webhook/order", json=shopify_webhook_payload, headers=headers)
+        second = client.post("/webhook/order", json=shopify_webhook_payload, headers=headers)
+
+        assert first.status_code == 200
+        assert second.status_code == 200
+        mock_queue.enqueue.assert_called_once()
+
+    @patch("app.api.shopify_webhook.verify_shopify_webhook")
+    @patch("app.api.shopify_webhook.shopify_service")
+    @patch("app.api.shopify_webhook.job_queue")
+    async def test_order_webhook_retry_after_failure(self, mock_queue, mock_shopify, mock_verify, mock_shopify_service, shopify_webhook_payload):
+        """Test that a redelivery is processed when the first attempt could not be enqueued"""
+        mock_verify.return_value = None
+        mock_shopify.parse_order_data.return_value = mock_shopify_service.parse_order_data.return_value
+        mock_queue.enqueue = AsyncMock(side_effect=[QueueFullError("Job queue is full"), 1])
+        headers = {"X-Shopify-Hmac-SHA256": "valid-signature", "X-Shopify-Webhook-Id": "webhook-2"}
+
+        first = client.post("/webhook/order", json=shopify_webhook_payload, headers=headers)
+        second = client.post("/webhook/order", json=shopify_webhook_payload, headers=headers)
+
+        assert first.status_code == 503
+        assert second.status_code == 200
+        assert mock_queue.enqueue.call_count == 2
+
+    @patch("app.api.shopify_webhook.verify_shopify_webhook")
+    @patch("app.api.shopify_webhook.shopify_service")
+    @patch("app.api.shopify_webhook.job_queue")
+    async def test_order_webhook_retry_after_bad_body(self, mock_queue, mock_shopify, mock_verify, mock_shopify_service, shopify_webhook_payload):
+        """Test that a corrected redelivery is processed after the first body was rejected"""
+        mock_verify.return_value = None
+        mock_shopify.parse_order_data.return_value = mock_shopify_service.parse_order_data.return_value
+        mock_queue.enqueue = AsyncMock(return_value=1)
+        headers = {"X-Shopify-Hmac-SHA256": "valid-signature", "X-Shopify-Webhook-Id": "webhook-3"}
+
+        first = client.post("/webhook/order", content="invalid json", headers=headers)
+        second = client.post("/webhook/order", json=shopify_webhook_payload, headers=headers)
+
+        assert first.status_code == 400
+        assert second.status_code == 200
+        mock_queue.enqueue.assert_called_once()
@@ -5,6 +5,7 @@ from fastapi.testclient import TestClient
 from fastapi import status
 
 from app.main import app
+from app.api.twilio_webhook import idempotency_service
 
 # Set testing flag for the entire module
 os.environ["TESTING"] = "true"
@@ -25,6 +26,13 @@ with patch("app.api.twilio_webhook.twilio_service") as mock_twilio, \
     # Create test client
     client = TestClient(app)
 
+@pytest.fixture(autouse=True)
+def reset_idempotency():
+    # Tests reuse the same MessageSid, so start each one with an empty cache
+    idempotency_service.clear()
+    yield
+
+
 @pytest.fixture
 def mock_validate_twilio():
     with patch("app.api.twilio_webhook.validate_twilio_request", return_value=True) as mock:
@@ -136,3 +144,21 @@ class TestTwilioWebhook:
         # The API should return 200 since we're handling the error gracefully to ensure Twilio gets a success response
         assert response.status_code == 200
         assert "<?xml version=\"1.0\" encoding=\"UTF-8\"?><Response></Response>" in response.text
+
+    @patch("app.api.twilio_webhook.twilio_service")
+    @patch("app.api.twilio_webhook.conversation_service")
+    async def test_reply_webhook_duplicate_message_sid(self, mock_conversation, mock_twilio, twilio_webhook_payload):
+        """Test that a retried delivery of the same MessageSid is processed once"""
+        mock_twilio.parse_webhook_request.return_value = {
+            "from_phone": "+1234567890",
+            "body": "Yes, the size is correct"
+        }
+        mock_conversation.process_customer_reply = AsyncMock(return_value=None)
+
+        first = client.post("/webhook/reply", data=twilio_webhook_payload)
+        second = client.post("/webhook/reply", data=twilio_webhook_payload)
+
+        assert first.status_code == 200
+        assert second.status_code == 200
+        assert "<Response></Response>" in second.text
+        mock_conversation.process_customer_reply.assert_called_once()
@@ -27,6 +27,7 @@ def mock_supabase_service():
         confirmed_size=None,
         product_id="product_123",
         product_title="Test Product",
+        shop_domain="test-store.myshopify.com",
         variant_id="variant_123",
         line_item_id="line_item_123",
         status="pending",
@@ -34,9 +35,26 @@ def mock_supabase_service():
         fulfilled=False
     )
 
+    # A conversation awaiting size confirmation, with nothing collected yet
+    service.get_conversation_by_phone.return_value = MagicMock(
+        id=UUID("87654321-8765-4321-8765-432187654321"),
+        order_id=UUID("87654321-4321-8765-4321-876543210987"),
+        phone_number="+1234567890",
+        phase="CONFIRMATION",
+        entities={},
+        recommendation=None,
+        version=0
+    )
+
+    # Orders stored without line items are a single item
+    service.get_order_line_items.return_value = []
+
     # Mock message data
     service.get_messages_by_order.return_value = []
 
+    # No single-query reply context, so services fall back to separate lookups
+    service.get_reply_context.return_value = None
+
     return service
 
 @pytest.fixture
@@ -74,11 +92,19 @@ def mock_shopify_service():
             "product_id": "product_123",
             "variant_id": "variant_123",
             "line_item_id": "line_item_123",
-            "product_title": "Test Product"
+            "product_title": "Test Product",
+            "line_items": [{
+                "original_size": "M",
+                "product_id": "product_123",
+                "variant_id": "variant_123",
+                "line_item_id": "line_item_123",
+                "product_title": "Test Product"
+            }]
         }
     )
     service.update_order_size.return_value = None
     service.trigger_fulfillment.return_value = None
+    service.confirm_and_fulfil.return_value = (True, True)
     return service
 
 @pytest.fixture
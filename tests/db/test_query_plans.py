@@ -0,0 +1,129 @@
+import os
+from pathlib import Path
+from uuid import UUID
+
+import pytest
+
+psycopg = pytest.importorskip("psycopg")
+
+DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+DOCS = Path(__file__).resolve().parents[2] / "docs"
+CUSTOMER_ID = UUID("12345678-1234-5678-1234-567812345678")
+ORDER_ID = UUID("87654321-4321-8765-4321-876543210987")
+
+pytestmark = [
+    pytest.mark.supabase,
+    pytest.mark.skipif(not DATABASE_URL, reason="TEST_DATABASE_URL is not set"),
+]
+
+# The reply path's lookups, as issued by get_reply_context and SupabaseService
+REPLY_PATH_QUERIES = {
+    "customer_by_phone": "SELECT * FROM customers WHERE phone = '+1234567890' LIMIT 1",
+    "order_conversation": f"SELECT * FROM conversations WHERE order_id = '{ORDER_ID}'",
+    "pending_order": (
+        f"SELECT * FROM orders WHERE customer_id = '{CUSTOMER_ID}' AND size_confirmed = FALSE "
+        "ORDER BY created_at DESC LIMIT 1"
+    ),
+    "line_items": f"SELECT * FROM order_line_items WHERE order_id = '{ORDER_ID}' ORDER BY line_item_id",
+    "recent_messages": f"SELECT * FROM messages WHERE order_id = '{ORDER_ID}' ORDER BY created_at DESC LIMIT 20",
+    "full_history": f"SELECT * FROM messages WHERE order_id = '{ORDER_ID}' ORDER BY created_at",
+}
+
+
+def apply_schema(connection) -> None:
+    """
+    Create the baseline schema, then apply every migration in order
+    """
+    connection.execute((DOCS / "supabase_schema.sql").read_text())
+    for migration in sorted((DOCS / "migrations").glob("*.sql")):
+        connection.execute(migration.read_text())
+
+
+def seed(connection) -> None:
+    connection.execute("""
+        INSERT INTO customers (shopify_customer_id, phone)
+        SELECT n, '+1' || lpad(n::text, 10, '0') FROM generate_series(1, 2000) n;
+
+        INSERT INTO orders (shopify_order_id, customer_id, order_number, original_size,
+                            product_id, variant_id, line_item_id, product_title, size_confirmed)
+        SELECT n, c.id, n::text, 'M', 1, 1, 1, 'Test Product', n % 10 <> 0
+        FROM generate_series(1, 2000) n
+        JOIN customers c ON c.shopify_customer_id = n;
+
+        INSERT INTO messages (order_id, direction, content)
+        SELECT o.id, 'inbound', 'yes'
+        FROM orders o, generate_series(1, 5);
+
+        INSERT INTO conversations (order_id, phone_number)
+        SELECT o.id, c.phone FROM orders o JOIN customers c ON c.id = o.customer_id;
+
+        ANALYZE;
+    """)
+
+
+def plan_nodes(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+@pytest.fixture(scope="module")
+def connection():
+    with psycopg.connect(DATABASE_URL, autocommit=True) as connection:
+        connection.execute('CREATE EXTENSION IF NOT EXISTS "uuid-ossp"')
+        connection.execute("DROP SCHEMA IF EXISTS query_plan_test CASCADE")
+        connection.execute("CREATE SCHEMA query_plan_test")
+        connection.execute("SET search_path TO query_plan_test, public")
+        try:
+            apply_schema(connection)
+            seed(connection)
+            # Small test tables would otherwise be scanned whole; what matters
+            # is whether an index serves the lookup in the requested order
+            connection.execute("SET enable_seqscan = off")
+            yield connection
+        finally:
+            connection.execute("DROP SCHEMA query_plan_test CASCADE")
+
+
+class TestReplyPathQueryPlans:
+
+    def test_migrations_are_recorded(self, connection):
+        """Test that every migration records its version"""
+        versions = [row[0] for row in connection.execute("SELECT version FROM schema_migrations ORDER BY version")]
+        expected = [path.name.split("_")[0] for path in sorted((DOCS / "migrations").glob("*.sql"))]
+        assert versions == expected
+
+    @pytest.mark.parametrize("name", [
+        "conversations", "jobs", "webhook_deliveries", "response_cache", "order_line_items",
+        "get_reply_context(varchar, integer)", "claim_jobs(integer, integer)",
+        "set_order_recommendations(jsonb)", "set_line_item_sizes(jsonb)",
+    ])
+    def test_migrations_create_app_objects(self, connection, name):
+        """Test that the migrations create every table and function the app uses"""
+        lookup = "to_regprocedure" if "(" in name else "to_regclass"
+        assert connection.execute(f"SELECT {lookup}(%s)", (name,)).fetchone()[0] is not None
+
+    def test_migrations_add_order_columns(self, connection):
+        """Test that the migrations add the order columns the app writes"""
+        columns = {
+            row[0] for row in connection.execute(
+                "SELECT column_name FROM information_schema.columns "
+                "WHERE table_schema = 'query_plan_test' AND table_name = 'orders'"
+            )
+        }
+        assert {"recommended_size", "recommendation_confidence", "recommended_at", "shop_domain"} <= columns
+
+    def test_migrations_can_be_reapplied(self, connection):
+        """Test that applying the migrations twice is harmless"""
+        for migration in sorted((DOCS / "migrations").glob("*.sql")):
+            connection.execute(migration.read_text())
+
+    @pytest.mark.parametrize("name", sorted(REPLY_PATH_QUERIES))
+    def test_lookup_uses_index_without_sort(self, connection, name):
+        """Test that each reply-path lookup is an index scan that needs no sort"""
+        result = connection.execute(f"EXPLAIN (FORMAT JSON) {REPLY_PATH_QUERIES[name]}").fetchone()[0]
+        node_types = [node["Node Type"] for node in plan_nodes(result[0]["Plan"])]
+
+        assert "Seq Scan" not in node_types, node_types
+        assert "Sort" not in node_types, node_types
+        assert any("Index" in node_type for node_type in node_types), node_types
@@ -0,0 +1,108 @@
+import asyncio
+import gc
+
+from app.services.conversation_actors import ConversationActors
+
+
+class RecordingHandler:
+    """Records each turn and how many ran at once, taking delay seconds per turn"""
+
+    def __init__(self, delay: float = 0.01):
+        self.delay = delay
+        self.turns = []
+        self.running = {}
+        self.max_running = {}
+        self.max_total = 0
+
+    async def __call__(self, key: str, message: str) -> None:
+        self.running[key] = self.running.get(key, 0) + 1
+        self.max_running[key] = max(self.max_running.get(key, 0), self.running[key])
+        self.max_total = max(self.max_total, sum(self.running.values()))
+        try:
+            await asyncio.sleep(self.delay)
+            self.turns.append((key, message))
+        finally:
+            self.running[key] -= 1
+
+
+class TestConversationActors:
+
+    async def test_burst_is_one_turn(self):
+        """Test that messages arriving within the window are processed as one turn"""
+        handler = RecordingHandler()
+        actors = ConversationActors(handler, coalesce_window=0.05)
+
+        await asyncio.gather(actors.submit("+1", "yes"), actors.submit("+1", "180cm"))
+
+        assert handler.turns == [("+1", "yes\n180cm")]
+        assert actors.metrics() == {"actors": 0, "turns": 1, "coalesced": 1}
+
+    async def test_turns_are_serialized_per_conversation(self):
+        """Test that a message arriving mid-turn waits for the next turn"""
+        handler = RecordingHandler(delay=0.05)
+        actors = ConversationActors(handler, coalesce_window=0)
+
+        first = asyncio.ensure_future(actors.submit("+1", "yes"))
+        await asyncio.sleep(0.01)
+        second = asyncio.ensure_future(actors.submit("+1", "180cm"))
+        third = asyncio.ensure_future(actors.submit("+1", "80kg"))
+        await asyncio.gather(first, second, third)
+
+        assert handler.turns == [("+1", "yes"), ("+1", "180cm\n80kg")]
+        assert handler.max_running["+1"] == 1
+
+    async def test_conversations_run_concurrently(self):
+        """Test that different customers' turns are not serialized with each other"""
+        handler = RecordingHandler(delay=0.05)
+        actors = ConversationActors(handler, coalesce_window=0)
+
+        await asyncio.gather(*(actors.submit(f"+{n}", "yes") for n in range(5)))
+
+        assert len(handler.turns) == 5
+        assert handler.max_total == 5
+
+    async def test_error_reaches_every_caller_in_the_turn(self):
+        """Test that a failed turn fails each message in it, and the next turn still runs"""
+        calls = []
+
+        async def handler(key, message):
+            calls.append(message)
+            if len(calls) == 1:
+                raise ValueError("failed")
+
+        actors = ConversationActors(handler, coalesce_window=0.01)
+
+        results = await asyncio.gather(actors.submit("+1", "a"), actors.submit("+1", "b"), return_exceptions=True)
+        await actors.submit("+1", "c")
+
+        assert [type(result) for result in results] == [ValueError, ValueError]
+        assert calls == ["a\nb", "c"]
+
+    async def test_cancelled_turn_fails_every_caller(self):
+        """Test that cancelling an actor fails its callers, and the next message starts a new turn"""
+        handler = RecordingHandler(delay=1)
+        actors = ConversationActors(handler, coalesce_window=0)
+
+        first = asyncio.ensure_future(actors.submit("+1", "yes"))
+        await asyncio.sleep(0.01)
+        second = asyncio.ensure_future(actors.submit("+1", "180cm"))
+        await asyncio.sleep(0)
+        actors._actors["+1"]._task.cancel()
+        results = await asyncio.gather(first, second, return_exceptions=True)
+
+        assert [type(result) for result in results] == [asyncio.CancelledError] * 2
+        handler.delay = 0
+        await actors.submit("+1", "80kg")
+        assert handler.turns == [("+1", "80kg")]
+
+    async def test_idle_actors_are_dropped(self):
+        """Test that an actor goes away once its conversation has nothing pending"""
+        actors = ConversationActors(RecordingHandler(), coalesce_window=0)
+
+        pending = asyncio.ensure_future(actors.submit("+1", "yes"))
+        await asyncio.sleep(0)
+        assert actors.metrics()["actors"] == 1
+
+        await pending
+        gc.collect()
+        assert actors.metrics()["actors"] == 0
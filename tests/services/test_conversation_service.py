@@ -1,3 +1,4 @@
+import asyncio
 import pytest
 from unittest.mock import patch, AsyncMock, MagicMock
 from uuid import UUID
@@ -6,7 +7,38 @@ from datetime import datetime
 
 from app.services.conversation_service import ConversationService, ConversationPhase
 from app.models.message import MessageCreate
-from app.models.conversation import Conversation, ConversationStatus
+from app.models.conversation import Conversation, ConversationCreate, ConversationStatus, ConversationUpdate, ReplyContext
+from app.models.order import OrderLineItem
+from app.models.customer import CustomerUpdate
+from app.services.message_log import MessageLog
+from app.utils.size_recommender import DEFAULT_CHART, SizeChart, SizeRecommender
+
+ORDER_ID = UUID("87654321-4321-8765-4321-876543210987")
+
+
+@pytest.fixture
+def line_items():
+    return [
+        OrderLineItem(
+            id=UUID("00000000-0000-0000-0000-000000000001"),
+            order_id=ORDER_ID,
+            line_item_id="line_item_123",
+            product_id="product_123",
+            variant_id="variant_123",
+            product_title="Test Product",
+            original_size="M"
+        ),
+        OrderLineItem(
+            id=UUID("00000000-0000-0000-0000-000000000002"),
+            order_id=ORDER_ID,
+            line_item_id="line_item_456",
+            product_id="product_456",
+            variant_id="variant_456",
+            product_title="Test Jeans",
+            original_size="32"
+        ),
+    ]
+
 
 @pytest.fixture
 def conversation_service(mock_supabase_service, mock_twilio_service, mock_vertex_ai_service, mock_shopify_service):
@@ -18,6 +50,10 @@ def conversation_service(mock_supabase_service, mock_twilio_service, mock_vertex
     service.twilio_service = mock_twilio_service
     service.vertex_ai_service = mock_vertex_ai_service
     service.shopify_service = mock_shopify_service
+    # Write messages straight to the mocked Supabase service
+    service.message_log = None
+    # Letter sizes are recommended from the standard chart
+    service.size_recommender = SizeRecommender(default_chart=SizeChart(DEFAULT_CHART))
     return service
 
 class TestConversationService:
@@ -43,12 +79,18 @@ class TestConversationService:
             original_size=original_size
         )
 
+        # Verify the conversation was stored, awaiting size confirmation
+        conversation_service.supabase_service.create_conversation.assert_called_once_with(
+            ConversationCreate(order_id=order_id, phone_number=phone)
+        )
+
         # Verify the AI service was called correctly
         conversation_service.vertex_ai_service.generate_response.assert_called_once_with(
             product_title=product_title,
             original_size=original_size,
             conversation_history=[],
-            phase=ConversationPhase.CONFIRMATION
+            phase=ConversationPhase.CONFIRMATION,
+            line_items=None
         )
 
         # Verify the Twilio service was called correctly
@@ -87,15 +129,21 @@ class TestConversationService:
             id=order_id,
             confirmed_size="L"
         ))
-        conversation_service.update_conversation_status = AsyncMock()
         conversation_service.supabase_service.update_order = AsyncMock()
         conversation_service.messenger_service.send_message = AsyncMock()
 
         await conversation_service.process_customer_reply(phone_number, message_body)
 
-        # Assert that the conversation status was updated
-        conversation_service.update_conversation_status.assert_called_once_with(
-            conversation.id, ConversationStatus.COMPLETED
+        # Assert that the conversation state was changed at the version it was read
+        conversation_service.supabase_service.update_conversation_state.assert_called_once_with(
+            conversation.id,
+            0,
+            ConversationUpdate(
+                phase=ConversationPhase.COMPLETE,
+                status=ConversationStatus.COMPLETED,
+                entities={"preferred_size": "M"},
+                recommendation=None
+            )
         )
 
         # Assert that the order was updated
@@ -113,9 +161,8 @@ class TestConversationService:
         # Mock intent detection
         conversation_service.vertex_ai_service.detect_intent.return_value = ("UNSURE", {"usual_size": "L"})
 
-        # Mock conversation history
-        previous_message = MagicMock(conversation_phase=ConversationPhase.CONFIRMATION)
-        conversation_service.supabase_service.get_messages_by_order.return_value = [previous_message]
+        # The conversation is in the CONFIRMATION phase
+        conversation_service.supabase_service.get_conversation_by_phone.return_value.phase = ConversationPhase.CONFIRMATION
 
         # Call the method
         await conversation_service.process_customer_reply(
@@ -131,7 +178,7 @@ class TestConversationService:
         # Verify customer info was updated
         conversation_service.supabase_service.update_customer.assert_called_with(
             conversation_service.supabase_service.get_customer_by_phone.return_value.id,
-            {"usual_size": "L"}
+            CustomerUpdate(usual_size="L")
         )
 
     async def test_process_customer_reply_sizing_to_recommendation(self, conversation_service):
@@ -146,9 +193,8 @@ class TestConversationService:
             {"height": "180", "weight": "80"}
         )
 
-        # Mock conversation history
-        previous_message = MagicMock(conversation_phase=ConversationPhase.SIZING_QUESTIONS)
-        conversation_service.supabase_service.get_messages_by_order.return_value = [previous_message]
+        # The conversation is in the SIZING_QUESTIONS phase
+        conversation_service.supabase_service.get_conversation_by_phone.return_value.phase = ConversationPhase.SIZING_QUESTIONS
 
         # Call the method
         await conversation_service.process_customer_reply(
@@ -164,7 +210,7 @@ class TestConversationService:
         # Verify customer info was updated
         conversation_service.supabase_service.update_customer.assert_called_with(
             conversation_service.supabase_service.get_customer_by_phone.return_value.id,
-            {"height": "180", "weight": "80"}
+            CustomerUpdate(height=180, weight=80)
         )
 
     async def test_process_customer_reply_recommendation_confirm(self, conversation_service):
@@ -176,9 +222,8 @@ class TestConversationService:
         # Mock intent detection
         conversation_service.vertex_ai_service.detect_intent.return_value = ("CONFIRM", {"preferred_size": "L"})
 
-        # Mock conversation history
-        previous_message = MagicMock(conversation_phase=ConversationPhase.RECOMMENDATION)
-        conversation_service.supabase_service.get_messages_by_order.return_value = [previous_message]
+        # The conversation is in the RECOMMENDATION phase
+        conversation_service.supabase_service.get_conversation_by_phone.return_value.phase = ConversationPhase.RECOMMENDATION
 
         # Call the method
         await conversation_service.process_customer_reply(
@@ -197,9 +242,16 @@ class TestConversationService:
         assert order_update_call.status == "confirmed"
         assert order_update_call.size_confirmed is True
 
-        # Verify Shopify order was updated and fulfillment triggered
-        conversation_service.shopify_service.update_order_size.assert_called()
-        conversation_service.shopify_service.trigger_fulfillment.assert_called()
+        # Verify Shopify order was updated and fulfillment triggered in one operation
+        conversation_service.shopify_service.confirm_and_fulfil.assert_called_once_with(
+            order_id="987654321",
+            new_size="L",
+            shop="test-store.myshopify.com",
+            line_item_sizes=None
+        )
+        conversation_service.shopify_service.update_order_size.assert_not_called()
+        fulfilled_update = conversation_service.supabase_service.update_order.call_args_list[1][0][1]
+        assert fulfilled_update.fulfilled is True
 
     async def test_process_customer_reply_no_customer(self, conversation_service):
         """Test handling a message from an unknown customer"""
@@ -216,9 +268,10 @@ class TestConversationService:
             message_content=message_content
         )
 
-        # Verify no further processing happened
+        # Verify no further processing happened (intent detection runs concurrently,
+        # but its result is discarded)
         conversation_service.supabase_service.get_order_with_pending_size_confirmation.assert_not_called()
-        conversation_service.vertex_ai_service.detect_intent.assert_not_called()
+        conversation_service.vertex_ai_service.generate_response.assert_not_called()
         conversation_service.supabase_service.create_message.assert_not_called()
 
     async def test_process_customer_reply_no_pending_order(self, conversation_service):
@@ -237,5 +290,357 @@ class TestConversationService:
         )
 
         # Verify no further processing happened
-        conversation_service.vertex_ai_service.detect_intent.assert_not_called()
+        conversation_service.supabase_service.get_messages_by_order.assert_not_called()
+        conversation_service.vertex_ai_service.generate_response.assert_not_called()
+        conversation_service.supabase_service.create_message.assert_not_called()
+
+    async def test_process_customer_reply_runs_lookups_concurrently(self, conversation_service):
+        """Test that intent detection overlaps the customer lookup instead of waiting for it"""
+        intent_started = asyncio.Event()
+        customer = conversation_service.supabase_service.get_customer_by_phone.return_value
+
+        async def detect_intent(message):
+            intent_started.set()
+            return "OTHER", {}
+
+        async def get_customer_by_phone(phone):
+            # Deadlocks (and times out) if intent detection only starts after this returns
+            await asyncio.wait_for(intent_started.wait(), timeout=1)
+            return customer
+
+        conversation_service.vertex_ai_service.detect_intent.side_effect = detect_intent
+        conversation_service.supabase_service.get_customer_by_phone.side_effect = get_customer_by_phone
+
+        await conversation_service.process_customer_reply(
+            from_phone="+1234567890",
+            message_content="Hello"
+        )
+
+        assert conversation_service.supabase_service.create_message.call_count == 2
+
+    async def test_process_customer_reply_uses_reply_context(self, conversation_service):
+        """Test that a single-query reply context replaces the separate lookups"""
+        supabase = conversation_service.supabase_service
+        conversation_service.vertex_ai_service.detect_intent.return_value = ("UNSURE", {})
+        supabase.get_reply_context.return_value = ReplyContext(
+            customer=dict(id=UUID("12345678-1234-5678-1234-567812345678"), shopify_customer_id="123456789", phone="+1234567890"),
+            conversation=dict(
+                id=UUID("87654321-8765-4321-8765-432187654321"),
+                order_id=UUID("87654321-4321-8765-4321-876543210987"),
+                phone_number="+1234567890",
+                created_at=datetime.now(),
+                updated_at=datetime.now()
+            ),
+            order=dict(
+                id=UUID("87654321-4321-8765-4321-876543210987"),
+                shopify_order_id="987654321",
+                customer_id=UUID("12345678-1234-5678-1234-567812345678"),
+                order_number="1001",
+                original_size="M",
+                product_id="product_123",
+                variant_id="variant_123",
+                line_item_id="line_item_123",
+                product_title="Test Product"
+            ),
+            messages=[dict(
+                order_id=UUID("87654321-4321-8765-4321-876543210987"),
+                customer_id=UUID("12345678-1234-5678-1234-567812345678"),
+                direction="outbound",
+                content="Is M the right size?",
+                conversation_phase=ConversationPhase.CONFIRMATION
+            )]
+        )
+
+        await conversation_service.process_customer_reply(
+            from_phone="+1234567890",
+            message_content="Not sure"
+        )
+
+        supabase.get_reply_context.assert_called_once_with("+1234567890", message_limit=10)
+        supabase.get_customer_by_phone.assert_not_called()
+        supabase.get_conversation_by_phone.assert_not_called()
+        supabase.get_order_with_pending_size_confirmation.assert_not_called()
+        supabase.get_messages_by_order.assert_not_called()
+
+        outbound_call = supabase.create_message.call_args_list[1][0][0]
+        assert outbound_call.conversation_phase == ConversationPhase.SIZING_QUESTIONS
+
+    async def test_process_customer_reply_windows_history(self, conversation_service):
+        """Test that only the last turns and a summary of sizing facts reach the model"""
+        conversation_service.history_window = 2
+        supabase = conversation_service.supabase_service
+        conversation_service.vertex_ai_service.detect_intent.return_value = ("PROVIDE_INFO", {"height": "180"})
+        supabase.get_messages_by_order.return_value = [
+            MagicMock(direction="outbound", content="Is M the right size?", conversation_phase=ConversationPhase.CONFIRMATION),
+            MagicMock(direction="inbound", content="Not sure", conversation_phase=ConversationPhase.CONFIRMATION),
+            MagicMock(direction="outbound", content="How tall are you?", conversation_phase=ConversationPhase.SIZING_QUESTIONS),
+        ]
+
+        await conversation_service.process_customer_reply(
+            from_phone="+1234567890",
+            message_content="180cm"
+        )
+
+        order = supabase.get_order_with_pending_size_confirmation.return_value
+        supabase.get_messages_by_order.assert_called_once_with(order.id, limit=2)
+        kwargs = conversation_service.vertex_ai_service.generate_response.call_args.kwargs
+        assert kwargs["conversation_history"] == [
+            {"direction": "outbound", "content": "How tall are you?"},
+            {"direction": "inbound", "content": "180cm"},
+        ]
+        assert kwargs["sizing_facts"] == {"usual_size": "M", "height": "180", "weight": 70}
+
+    async def test_process_customer_reply_recommends_size_from_chart(self, conversation_service):
+        """Test that the recommended size comes from the size chart, not the model"""
+        conversation_service.vertex_ai_service.detect_intent.return_value = ("PROVIDE_INFO", {"height": "185", "weight": "85"})
+        conversation_service.supabase_service.get_conversation_by_phone.return_value.phase = ConversationPhase.SIZING_QUESTIONS
+
+        await conversation_service.process_customer_reply(
+            from_phone="+1234567890",
+            message_content="185cm 85kg"
+        )
+
+        kwargs = conversation_service.vertex_ai_service.generate_response.call_args.kwargs
+        assert kwargs["phase"] == ConversationPhase.RECOMMENDATION
+        assert kwargs["sizing_facts"]["recommended_size"] == "L"
+
+    async def test_start_conversation_already_started(self, conversation_service):
+        """Test that a retried order job does not message the customer again"""
+        conversation_service.supabase_service.create_conversation.return_value = None
+
+        await conversation_service.start_conversation(
+            order_id=ORDER_ID,
+            customer_id=UUID("12345678-1234-5678-1234-567812345678"),
+            phone="+1234567890",
+            product_title="Test Product",
+            original_size="M"
+        )
+
+        conversation_service.vertex_ai_service.generate_response.assert_not_called()
+        conversation_service.twilio_service.send_whatsapp_message.assert_not_called()
         conversation_service.supabase_service.create_message.assert_not_called()
+
+    async def test_start_conversation_confirms_all_items(self, conversation_service, line_items):
+        """Test that the opener asks about every sized item of the order"""
+        await conversation_service.start_conversation(
+            order_id=ORDER_ID,
+            customer_id=UUID("12345678-1234-5678-1234-567812345678"),
+            phone="+1234567890",
+            product_title="Test Product",
+            original_size="M",
+            line_items=line_items
+        )
+
+        kwargs = conversation_service.vertex_ai_service.generate_response.call_args.kwargs
+        assert kwargs["line_items"] == [
+            {"product_title": "Test Product", "original_size": "M"},
+            {"product_title": "Test Jeans", "original_size": "32"},
+        ]
+        conversation_service.twilio_service.send_whatsapp_message.assert_called_once()
+
+    async def test_process_customer_reply_confirms_all_items(self, conversation_service, line_items):
+        """Test that one confirmation stores and sends the sizes of every item"""
+        supabase = conversation_service.supabase_service
+        supabase.get_order_line_items.return_value = line_items
+        supabase.get_conversation_by_phone.return_value.phase = ConversationPhase.RECOMMENDATION
+        # A preferred size can't be matched to one of several items, so the recommendations are used
+        conversation_service.vertex_ai_service.detect_intent.return_value = ("CONFIRM", {"preferred_size": "L"})
+        conversation_service._recommend_size = MagicMock(side_effect=lambda item, facts: MagicMock(
+            size={"product_123": "L", "product_456": "34"}[item.product_id]
+        ))
+
+        await conversation_service.process_customer_reply(
+            from_phone="+1234567890",
+            message_content="Yes please"
+        )
+
+        supabase.set_line_item_sizes.assert_called_once_with([
+            {"id": "00000000-0000-0000-0000-000000000001", "confirmed_size": "L"},
+            {"id": "00000000-0000-0000-0000-000000000002", "confirmed_size": "34"},
+        ])
+        assert supabase.update_order.call_args_list[0][0][1].confirmed_size == "L"
+        conversation_service.shopify_service.confirm_and_fulfil.assert_called_once_with(
+            order_id="987654321",
+            new_size="L",
+            shop="test-store.myshopify.com",
+            line_item_sizes=[
+                {"line_item_id": "line_item_123", "product_title": "Test Product", "size": "L"},
+                {"line_item_id": "line_item_456", "product_title": "Test Jeans", "size": "34"},
+            ]
+        )
+
+    async def test_process_customer_reply_writes_messages_behind(self, conversation_service):
+        """Test that replies buffer their messages and the next reply still sees them"""
+        supabase = conversation_service.supabase_service
+        conversation_service.message_log = MessageLog(supabase, flush_interval=60)
+        conversation_service.vertex_ai_service.detect_intent.return_value = ("UNSURE", {})
+        conversation = supabase.get_conversation_by_phone.return_value
+
+        def update_conversation_state(conversation_id, version, update):
+            conversation.phase, conversation.version = update.phase, version + 1
+            return conversation
+
+        supabase.update_conversation_state.side_effect = update_conversation_state
+
+        await conversation_service.process_customer_reply(from_phone="+1234567890", message_content="Not sure")
+
+        supabase.create_message.assert_not_called()
+        assert len(conversation_service.message_log.pending()) == 2
+
+        # The next reply continues from the stored phase, with the buffered messages in its history
+        conversation_service.vertex_ai_service.detect_intent.return_value = ("PROVIDE_INFO", {"height": "180", "weight": "80"})
+        await conversation_service.process_customer_reply(from_phone="+1234567890", message_content="180cm 80kg")
+
+        assert conversation_service.message_log.pending()[-1].conversation_phase == ConversationPhase.RECOMMENDATION
+        history = conversation_service.vertex_ai_service.generate_response.call_args.kwargs["conversation_history"]
+        assert [message["content"] for message in history][-3:] == ["Not sure", "Thank you for confirming your size.", "180cm 80kg"]
+        await conversation_service.message_log.stop()
+        supabase.create_messages.assert_called_once()
+        assert len(supabase.create_messages.call_args[0][0]) == 4
+
+    async def test_process_customer_reply_collects_facts_across_replies(self, conversation_service):
+        """Test that sizing facts from earlier replies count towards a recommendation"""
+        supabase = conversation_service.supabase_service
+        conversation = supabase.get_conversation_by_phone.return_value
+        conversation.phase = ConversationPhase.SIZING_QUESTIONS
+        conversation.entities = {"height": "180"}
+        conversation_service.vertex_ai_service.detect_intent.return_value = ("PROVIDE_INFO", {"weight": "80"})
+
+        await conversation_service.process_customer_reply(from_phone="+1234567890", message_content="80kg")
+
+        update = supabase.update_conversation_state.call_args[0][2]
+        assert update.phase == ConversationPhase.RECOMMENDATION
+        assert update.entities == {"height": "180", "weight": "80"}
+        assert update.recommendation["recommended_size"] == update.recommendation["sizes"]["line_item_123"]
+        kwargs = conversation_service.vertex_ai_service.generate_response.call_args.kwargs
+        assert kwargs["sizing_facts"]["recommended_size"] == update.recommendation["recommended_size"]
+
+    async def test_process_customer_reply_confirms_stored_recommendation(self, conversation_service):
+        """Test that confirming a recommendation confirms the size the customer was shown"""
+        supabase = conversation_service.supabase_service
+        conversation = supabase.get_conversation_by_phone.return_value
+        conversation.phase = ConversationPhase.RECOMMENDATION
+        conversation.recommendation = {"sizes": {"line_item_123": "XL"}, "recommended_size": "XL"}
+        conversation_service.vertex_ai_service.detect_intent.return_value = ("CONFIRM", {})
+        conversation_service._recommend_size = MagicMock()
+
+        await conversation_service.process_customer_reply(from_phone="+1234567890", message_content="Yes")
+
+        conversation_service._recommend_size.assert_not_called()
+        assert supabase.update_order.call_args_list[0][0][1].confirmed_size == "XL"
+        assert conversation_service.shopify_service.confirm_and_fulfil.call_args.kwargs["new_size"] == "XL"
+
+    async def test_process_customer_reply_retries_after_version_conflict(self, conversation_service):
+        """Test that a reply losing the race re-reads the conversation and acts once"""
+        supabase = conversation_service.supabase_service
+        conversation_service.vertex_ai_service.detect_intent.return_value = ("UNSURE", {})
+        supabase.update_conversation_state.side_effect = [None, MagicMock()]
+
+        await conversation_service.process_customer_reply(from_phone="+1234567890", message_content="Not sure")
+
+        assert supabase.update_conversation_state.call_count == 2
+        assert supabase.get_customer_by_phone.call_count == 2
+        assert supabase.create_message.call_count == 2
+        conversation_service.vertex_ai_service.generate_response.assert_called_once()
+
+    async def test_process_customer_reply_gives_up_on_contended_conversation(self, conversation_service):
+        """Test that a reply that keeps losing the race is recorded but has no side effects"""
+        supabase = conversation_service.supabase_service
+        conversation_service.vertex_ai_service.detect_intent.return_value = ("CONFIRM", {})
+        supabase.update_conversation_state.return_value = None
+
+        await conversation_service.process_customer_reply(from_phone="+1234567890", message_content="Yes")
+
+        supabase.update_order.assert_not_called()
+        supabase.create_message.assert_called_once()
+        assert supabase.create_message.call_args[0][0].direction == "inbound"
+        conversation_service.vertex_ai_service.generate_response.assert_not_called()
+
+    async def test_process_customer_reply_releases_claim_on_failure(self, conversation_service):
+        """Test that a reply that fails after claiming its transition puts the conversation back"""
+        supabase = conversation_service.supabase_service
+        conversation = supabase.get_conversation_by_phone.return_value
+        conversation.phase = ConversationPhase.SIZING_QUESTIONS
+        conversation.entities = {"height": "180"}
+        conversation_service.vertex_ai_service.detect_intent.return_value = ("PROVIDE_INFO", {"weight": "80"})
+        conversation_service.vertex_ai_service.generate_response.side_effect = RuntimeError("Vertex AI unavailable")
+
+        with pytest.raises(RuntimeError):
+            await conversation_service.process_customer_reply(from_phone="+1234567890", message_content="80kg")
+
+        claim, release = supabase.update_conversation_state.call_args_list
+        assert claim[0][2].phase == ConversationPhase.RECOMMENDATION
+        assert release[0][1] == supabase.update_conversation_state.return_value.version
+        assert release[0][2].phase == ConversationPhase.SIZING_QUESTIONS
+        assert release[0][2].entities == {"height": "180"}
+        assert release[0][2].recommendation is None
+        # The reply and its facts are kept for the next attempt
+        assert supabase.create_message.call_args[0][0].direction == "inbound"
+        supabase.update_customer.assert_called_once_with(supabase.get_customer_by_phone.return_value.id, CustomerUpdate(weight=80))
+
+    async def test_process_customer_reply_skips_malformed_customer_facts(self, conversation_service):
+        """Test that facts that don't fit the customer record are only kept on the conversation"""
+        supabase = conversation_service.supabase_service
+        supabase.get_conversation_by_phone.return_value.phase = ConversationPhase.SIZING_QUESTIONS
+        conversation_service.vertex_ai_service.detect_intent.return_value = ("PROVIDE_INFO", {"height": "5'10"})
+
+        await conversation_service.process_customer_reply(from_phone="+1234567890", message_content="I'm 5'10")
+
+        supabase.update_customer.assert_not_called()
+        assert supabase.update_conversation_state.call_args[0][2].entities["height"] == "5'10"
+
+    async def test_process_customer_reply_recommends_again_on_new_facts(self, conversation_service):
+        """Test that new sizing facts in the recommendation phase replace the recommendation"""
+        supabase = conversation_service.supabase_service
+        conversation = supabase.get_conversation_by_phone.return_value
+        conversation.phase = ConversationPhase.RECOMMENDATION
+        conversation.entities = {"height": "180", "weight": "80"}
+        conversation.recommendation = {"sizes": {"line_item_123": "XL"}, "recommended_size": "XL"}
+        conversation_service.vertex_ai_service.detect_intent.return_value = ("PROVIDE_INFO", {"usual_size": "S"})
+
+        await conversation_service.process_customer_reply(from_phone="+1234567890", message_content="I usually wear S")
+
+        update = supabase.update_conversation_state.call_args[0][2]
+        assert update.phase == ConversationPhase.RECOMMENDATION
+        assert update.recommendation != conversation.recommendation
+        supabase.update_order.assert_not_called()
+        conversation_service.shopify_service.confirm_and_fulfil.assert_not_called()
+
+    async def test_process_customer_reply_loads_pending_orders_conversation(self, conversation_service):
+        """Test that the fallback lookups read the pending order's conversation, not the latest for the phone"""
+        supabase = conversation_service.supabase_service
+        conversation_service.vertex_ai_service.detect_intent.return_value = ("UNSURE", {})
+
+        await conversation_service.process_customer_reply(from_phone="+1234567890", message_content="Not sure")
+
+        order = supabase.get_order_with_pending_size_confirmation.return_value
+        supabase.get_conversation_by_phone.assert_called_once_with("+1234567890", order.id)
+
+    async def test_process_customer_reply_keeps_sizes_without_chart(self, conversation_service, line_items):
+        """Test that an item whose size is not in a chart is not recommended a size, and keeps the size ordered"""
+        supabase = conversation_service.supabase_service
+        supabase.get_order_line_items.return_value = line_items
+        supabase.get_conversation_by_phone.return_value.phase = ConversationPhase.SIZING_QUESTIONS
+        conversation_service.vertex_ai_service.detect_intent.return_value = ("PROVIDE_INFO", {"height": "180", "weight": "75"})
+
+        await conversation_service.process_customer_reply(from_phone="+1234567890", message_content="180cm 75kg")
+
+        update = supabase.update_conversation_state.call_args[0][2]
+        assert update.recommendation["sizes"] == {"line_item_123": "L"}
+        confirmed = conversation_service._confirmed_sizes(
+            supabase.get_order_with_pending_size_confirmation.return_value, line_items, {}, update.recommendation["sizes"]
+        )
+        assert [size for _, size in confirmed] == ["L", "32"]
+
+    async def test_process_customer_reply_no_charts(self, conversation_service):
+        """Test that no size is recommended when no charts are configured"""
+        conversation_service.size_recommender = SizeRecommender()
+        supabase = conversation_service.supabase_service
+        supabase.get_conversation_by_phone.return_value.phase = ConversationPhase.SIZING_QUESTIONS
+        conversation_service.vertex_ai_service.detect_intent.return_value = ("PROVIDE_INFO", {"height": "180", "weight": "75"})
+
+        await conversation_service.process_customer_reply(from_phone="+1234567890", message_content="180cm 75kg")
+
+        kwargs = conversation_service.vertex_ai_service.generate_response.call_args.kwargs
+        assert "recommended_size" not in kwargs["sizing_facts"]
+
@@ -0,0 +1,92 @@
+from unittest.mock import MagicMock
+from uuid import UUID
+
+from app.models.customer import Customer, CustomerUpdate
+from app.services.customer_cache import CustomerCache
+from app.services.supabase_service import SupabaseService
+
+CUSTOMER_ID = UUID("12345678-1234-5678-1234-567812345678")
+
+
+def make_customer(phone="+1234567890", shopify_customer_id="123456"):
+    return Customer(id=CUSTOMER_ID, shopify_customer_id=shopify_customer_id, phone=phone)
+
+
+class TestCustomerCache:
+
+    def test_lookup_by_either_key(self):
+        """Test that a cached customer is found by phone and by Shopify ID"""
+        cache = CustomerCache()
+        cache.put(make_customer())
+
+        assert cache.get_by_phone("+1234567890").id == CUSTOMER_ID
+        assert cache.get_by_shopify_id(123456).id == CUSTOMER_ID
+        assert cache.get_by_phone("+1999999999") is None
+        assert cache.metrics()["hits"] == 2
+        assert cache.metrics()["misses"] == 1
+
+    def test_invalidate_drops_both_keys(self):
+        """Test that invalidating a customer misses through either key"""
+        cache = CustomerCache()
+        cache.put(make_customer())
+
+        cache.invalidate(CUSTOMER_ID)
+
+        assert cache.get_by_phone("+1234567890") is None
+        assert cache.get_by_shopify_id("123456") is None
+
+    def test_changed_phone_is_a_miss(self):
+        """Test that the old phone number no longer finds a customer whose phone changed"""
+        cache = CustomerCache()
+        cache.put(make_customer())
+        cache.put(make_customer(phone="+1999999999"))
+
+        assert cache.get_by_phone("+1234567890") is None
+        assert cache.get_by_phone("+1999999999").phone == "+1999999999"
+
+    def test_expired_customers_are_misses(self):
+        """Test that customers are only served for the TTL"""
+        now = [0.0]
+        cache = CustomerCache(ttl=60, clock=lambda: now[0])
+        cache.put(make_customer())
+        now[0] = 61.0
+
+        assert cache.get_by_phone("+1234567890") is None
+
+
+class TestSupabaseReadThrough:
+
+    def make_service(self):
+        service = SupabaseService()
+        service.testing = False
+        service.supabase = MagicMock()
+        service.customer_cache = CustomerCache()
+        return service
+
+    async def test_lookup_is_served_from_cache(self):
+        """Test that a second lookup by phone or Shopify ID skips Supabase"""
+        service = self.make_service()
+        table = service.supabase.table.return_value
+        table.select.return_value.eq.return_value.execute.return_value = MagicMock(data=[
+            {"id": str(CUSTOMER_ID), "shopify_customer_id": "123456", "phone": "+1234567890"}
+        ])
+
+        first = await service.get_customer_by_phone("+1234567890")
+        second = await service.get_customer_by_phone("+1234567890")
+        by_shopify_id = await service.get_customer_by_shopify_id("123456")
+
+        assert first.id == second.id == by_shopify_id.id == CUSTOMER_ID
+        table.select.return_value.eq.assert_called_once_with("phone", "+1234567890")
+
+    async def test_update_refreshes_cached_customer(self):
+        """Test that update_customer replaces the cached row with the stored one"""
+        service = self.make_service()
+        service.customer_cache.put(make_customer())
+        table = service.supabase.table.return_value
+        table.update.return_value.eq.return_value.execute.return_value = MagicMock(data=[
+            {"id": str(CUSTOMER_ID), "shopify_customer_id": "123456", "phone": "+1234567890", "height": 180.0}
+        ])
+
+        await service.update_customer(CUSTOMER_ID, CustomerUpdate(height=180.0))
+
+        assert service.customer_cache.get_by_phone("+1234567890").height == 180.0
@@ -0,0 +1,54 @@
+import pytest
+
+from app.services.idempotency_service import IdempotencyService
+
+
+@pytest.fixture
+def idempotency_service(mock_supabase_service):
+    mock_supabase_service.record_webhook_delivery.return_value = True
+    return IdempotencyService(max_size=2, supabase_service=mock_supabase_service)
+
+
+class TestIdempotencyService:
+
+    async def test_first_delivery_is_claimed(self, idempotency_service):
+        """Test that a new key is claimed and recorded"""
+        assert await idempotency_service.claim("twilio:SM1") is True
+        idempotency_service.supabase_service.record_webhook_delivery.assert_called_once_with("twilio:SM1")
+
+    async def test_duplicate_is_answered_from_memory(self, idempotency_service):
+        """Test that a repeated key short-circuits without a database round trip"""
+        await idempotency_service.claim("twilio:SM1")
+
+        assert await idempotency_service.claim("twilio:SM1") is False
+        assert idempotency_service.supabase_service.record_webhook_delivery.call_count == 1
+
+    async def test_duplicate_recorded_by_another_process(self, idempotency_service):
+        """Test that a key already in the table is reported as a duplicate"""
+        idempotency_service.supabase_service.record_webhook_delivery.return_value = False
+
+        assert await idempotency_service.claim("shopify:webhook-1") is False
+
+    async def test_lru_eviction(self, idempotency_service):
+        """Test that the in-memory cache is bounded and falls back to the table"""
+        for key in ("a", "b", "c"):
+            await idempotency_service.claim(key)
+
+        idempotency_service.supabase_service.record_webhook_delivery.return_value = False
+        assert await idempotency_service.claim("a") is False
+        assert idempotency_service.supabase_service.record_webhook_delivery.call_count == 4
+
+    async def test_release(self, idempotency_service):
+        """Test that a released key can be claimed again"""
+        await idempotency_service.claim("shopify:webhook-1")
+
+        await idempotency_service.release("shopify:webhook-1")
+
+        assert await idempotency_service.claim("shopify:webhook-1") is True
+        idempotency_service.supabase_service.delete_webhook_delivery.assert_called_once_with("shopify:webhook-1")
+
+    async def test_database_error_fails_open(self, idempotency_service):
+        """Test that a storage error does not drop the delivery"""
+        idempotency_service.supabase_service.record_webhook_delivery.side_effect = Exception("timeout")
+
+        assert await idempotency_service.claim("twilio:SM2") is True
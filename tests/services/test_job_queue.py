@@ -0,0 +1,80 @@
+import pytest
+
+from app.services.job_queue import SQLiteJobQueue, QueueFullError
+
+
+@pytest.fixture
+def job_queue():
+    return SQLiteJobQueue(":memory:", max_pending=3, lease_seconds=60)
+
+
+class TestSQLiteJobQueue:
+
+    async def test_enqueue_and_claim(self, job_queue):
+        """Test that enqueued jobs are claimed in order with their payload"""
+        first = await job_queue.enqueue("order_created", {"order": 1})
+        await job_queue.enqueue("order_created", {"order": 2})
+
+        jobs = await job_queue.claim(1)
+
+        assert len(jobs) == 1
+        assert jobs[0].id == first
+        assert jobs[0].payload == {"order": 1}
+        assert jobs[0].attempts == 1
+        assert job_queue.get_status(first) == "running"
+
+    async def test_claimed_jobs_are_not_claimed_twice(self, job_queue):
+        """Test that a job under lease is not handed to another worker"""
+        await job_queue.enqueue("order_created", {})
+
+        assert len(await job_queue.claim(5)) == 1
+        assert await job_queue.claim(5) == []
+
+    async def test_expired_lease_is_reclaimed(self, job_queue):
+        """Test that a job whose worker died becomes claimable again"""
+        job_queue.lease_seconds = -1
+        await job_queue.enqueue("order_created", {})
+        await job_queue.claim(1)
+
+        jobs = await job_queue.claim(1)
+
+        assert len(jobs) == 1
+        assert jobs[0].attempts == 2
+
+    async def test_complete(self, job_queue):
+        """Test that completed jobs leave the pending count"""
+        job_id = await job_queue.enqueue("order_created", {})
+        job = (await job_queue.claim(1))[0]
+
+        await job_queue.complete(job)
+
+        assert job_queue.get_status(job_id) == "done"
+        assert await job_queue.pending_count() == 0
+
+    async def test_fail_with_retry(self, job_queue):
+        """Test that a retried job waits for its backoff before it can be claimed"""
+        job_id = await job_queue.enqueue("order_created", {})
+        job = (await job_queue.claim(1))[0]
+
+        await job_queue.fail(job, "boom", retry_in=60)
+
+        assert job_queue.get_status(job_id) == "pending"
+        assert await job_queue.claim(1) == []
+
+    async def test_fail_without_retry(self, job_queue):
+        """Test that a job that is given up on is marked dead"""
+        job_id = await job_queue.enqueue("order_created", {})
+        job = (await job_queue.claim(1))[0]
+
+        await job_queue.fail(job, "boom")
+
+        assert job_queue.get_status(job_id) == "dead"
+        assert await job_queue.pending_count() == 0
+
+    async def test_backpressure(self, job_queue):
+        """Test that enqueue fails once max_pending jobs are waiting"""
+        for i in range(3):
+            await job_queue.enqueue("order_created", {"order": i})
+
+        with pytest.raises(QueueFullError):
+            await job_queue.enqueue("order_created", {"order": 3})
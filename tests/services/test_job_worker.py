@@ -0,0 +1,133 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from app.services.job_queue import SQLiteJobQueue
+from app.services.job_worker import JobWorker, RECOMMENDATION_BACKFILL, handle_recommendation_backfill
+
+
+@pytest.fixture
+def job_queue():
+    return SQLiteJobQueue(":memory:")
+
+
+class TestJobWorker:
+
+    async def test_run_once_completes_jobs(self, job_queue):
+        """Test that a successful handler completes its job"""
+        handler = AsyncMock()
+        worker = JobWorker(job_queue, {"order_created": handler}, concurrency=2)
+        job_id = await job_queue.enqueue("order_created", {"order": 1})
+
+        processed = await worker.run_once()
+
+        assert processed == 1
+        handler.assert_called_once_with({"order": 1})
+        assert job_queue.get_status(job_id) == "done"
+
+    async def test_failed_job_is_retried_with_backoff(self, job_queue):
+        """Test that a failing handler schedules a retry"""
+        handler = AsyncMock(side_effect=Exception("Twilio is down"))
+        worker = JobWorker(job_queue, {"order_created": handler}, max_attempts=3)
+        job_id = await job_queue.enqueue("order_created", {})
+
+        await worker.run_once()
+
+        assert job_queue.get_status(job_id) == "pending"
+        # The retry is not due yet
+        assert await worker.run_once() == 0
+
+    async def test_job_dies_after_max_attempts(self, job_queue):
+        """Test that a job is marked dead once it runs out of attempts"""
+        handler = AsyncMock(side_effect=Exception("Twilio is down"))
+        worker = JobWorker(job_queue, {"order_created": handler}, max_attempts=1)
+        job_id = await job_queue.enqueue("order_created", {})
+
+        await worker.run_once()
+
+        assert job_queue.get_status(job_id) == "dead"
+
+    async def test_unknown_job_type(self, job_queue):
+        """Test that jobs without a handler are marked dead"""
+        worker = JobWorker(job_queue, {})
+        job_id = await job_queue.enqueue("unknown", {})
+
+        await worker.run_once()
+
+        assert job_queue.get_status(job_id) == "dead"
+
+    async def test_start_and_stop(self, job_queue):
+        """Test that the background loops drain the queue"""
+        handler = AsyncMock()
+        worker = JobWorker(job_queue, {"order_created": handler}, concurrency=2, poll_interval=0.01)
+        for i in range(4):
+            await job_queue.enqueue("order_created", {"order": i})
+
+        worker.start()
+        for _ in range(100):
+            if await job_queue.pending_count() == 0:
+                break
+            await asyncio.sleep(0.01)
+        await worker.stop()
+
+        assert handler.call_count == 4
+
+    async def test_loop_survives_queue_errors(self, job_queue):
+        """Test that a failure recording a job's outcome does not stop the worker"""
+        handler = AsyncMock()
+        worker = JobWorker(job_queue, {"order_created": handler}, concurrency=1, poll_interval=0.01)
+        for order in range(2):
+            await job_queue.enqueue("order_created", {"order": order})
+
+        with patch.object(job_queue, "complete", AsyncMock(side_effect=[Exception("Supabase is down"), None])):
+            worker.start()
+            for _ in range(100):
+                if handler.call_count == 2:
+                    break
+                await asyncio.sleep(0.01)
+            await worker.stop()
+
+        assert handler.call_count == 2
+
+    async def test_drain_runs_until_queue_is_empty(self, job_queue):
+        """Test that a drain runs batch after batch until nothing is due"""
+        handler = AsyncMock()
+        worker = JobWorker(job_queue, {"order_created": handler}, concurrency=2)
+        for order in range(5):
+            await job_queue.enqueue("order_created", {"order": order})
+
+        processed = await worker.drain(max_seconds=10)
+
+        assert processed == 5
+        assert handler.call_count == 5
+        assert await job_queue.pending_count() == 0
+
+    async def test_drain_stops_at_time_budget(self, job_queue):
+        """Test that a drain starts no batch once its time budget is spent"""
+        worker = JobWorker(job_queue, {"order_created": AsyncMock()})
+        await job_queue.enqueue("order_created", {})
+
+        assert await worker.drain(max_seconds=0) == 0
+        assert await job_queue.pending_count() == 1
+
+
+class TestRecommendationBackfill:
+
+    async def test_each_job_is_one_page(self, job_queue):
+        """Test that a back-fill job scores one page and queues the page after it"""
+        pages = [
+            {"scanned": 2, "updated": 2, "next_after_id": "b"},
+            {"scanned": 1, "updated": 1, "next_after_id": None},
+        ]
+        with patch("app.services.job_worker.RecommendationBatch") as batch, \
+                patch("app.services.job_worker.get_job_queue", return_value=job_queue):
+            batch.return_value.run_page = AsyncMock(side_effect=pages)
+            worker = JobWorker(job_queue, {RECOMMENDATION_BACKFILL: handle_recommendation_backfill})
+            await job_queue.enqueue(RECOMMENDATION_BACKFILL, {"page_size": 2})
+
+            processed = await worker.drain(max_seconds=10)
+
+        assert processed == 2
+        assert [call.args for call in batch.return_value.run_page.call_args_list] == [(None,), ("b",)]
+        batch.assert_called_with(page_size=2)
+        assert await job_queue.pending_count() == 0
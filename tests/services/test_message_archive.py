@@ -0,0 +1,85 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from app.services.message_archive import MessageArchive
+
+
+def make_message(message_id, order_id="order_1"):
+    return {
+        "id": message_id,
+        "order_id": order_id,
+        "customer_id": "customer_1",
+        "direction": "inbound",
+        "content": "yes",
+        "media_url": None,
+        "conversation_phase": "confirmation",
+        "intent": "confirm_size",
+        "entities": {"size": "M"},
+        "created_at": "2026-01-01T12:00:00+00:00",
+    }
+
+
+@pytest.fixture
+def supabase_service():
+    service = AsyncMock()
+    service.create_message_partitions.return_value = 1
+    service.delete_messages.side_effect = lambda ids: len(ids)
+    service.drop_empty_message_partitions.return_value = 2
+    return service
+
+
+class TestMessageArchive:
+
+    async def test_run_archives_page_by_page(self, supabase_service, tmp_path):
+        """Test that each page is written to its own file before it is deleted"""
+        supabase_service.get_archivable_messages.side_effect = [
+            [make_message("a"), make_message("b")],
+            [make_message("c")],
+        ]
+        archive = MessageArchive(supabase_service, archive_path=str(tmp_path), page_size=2)
+        archive.write_page = MagicMock()
+
+        result = await archive.run()
+
+        assert result == {"archived": 3, "files": 2, "partitions_created": 1, "partitions_dropped": 2}
+        assert [call.args[0] for call in supabase_service.delete_messages.call_args_list] == [["a", "b"], ["c"]]
+        paths = [call.args[1] for call in archive.write_page.call_args_list]
+        assert len(set(paths)) == 2
+        assert all(path.startswith(str(tmp_path)) and path.endswith(".parquet") for path in paths)
+
+    async def test_run_stops_when_nothing_is_deleted(self, supabase_service, tmp_path):
+        """Test that a page that cannot be deleted is not archived over and over"""
+        supabase_service.get_archivable_messages.return_value = [make_message("a"), make_message("b")]
+        supabase_service.delete_messages.side_effect = None
+        supabase_service.delete_messages.return_value = 0
+        archive = MessageArchive(supabase_service, archive_path=str(tmp_path), page_size=2)
+        archive.write_page = MagicMock()
+
+        result = await archive.run()
+
+        assert result["files"] == 1
+        assert result["archived"] == 0
+
+    async def test_failed_write_deletes_nothing(self, supabase_service, tmp_path):
+        """Test that messages are only deleted once their file is written"""
+        supabase_service.get_archivable_messages.return_value = [make_message("a")]
+        archive = MessageArchive(supabase_service, archive_path=str(tmp_path))
+        archive.write_page = MagicMock(side_effect=OSError("disk full"))
+
+        with pytest.raises(OSError):
+            await archive.run()
+
+        supabase_service.delete_messages.assert_not_called()
+
+    def test_write_page(self, tmp_path):
+        """Test that a page round-trips through Parquet with entities kept as JSON"""
+        pq = pytest.importorskip("pyarrow.parquet")
+        path = tmp_path / "messages.parquet"
+
+        MessageArchive(AsyncMock()).write_page([make_message("a"), {**make_message("b"), "entities": None}], str(path))
+
+        rows = pq.read_table(path).to_pylist()
+        assert [row["id"] for row in rows] == ["a", "b"]
+        assert rows[0]["entities"] == '{"size": "M"}'
+        assert rows[1]["entities"] is None
+        assert not (tmp_path / "messages.parquet.tmp").exists()
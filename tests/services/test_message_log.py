@@ -0,0 +1,141 @@
+import os
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, patch
+from uuid import UUID
+
+from app.models.message import MessageCreate
+from app.services import message_log as message_log_module
+from app.services.message_log import MessageLog, SQLiteMessageSpool, get_message_log, merge_pending
+
+ORDER_ID = UUID("87654321-4321-8765-4321-876543210987")
+CUSTOMER_ID = UUID("12345678-1234-5678-1234-567812345678")
+
+
+def message(content: str, order_id: UUID = ORDER_ID) -> MessageCreate:
+    return MessageCreate(order_id=order_id, customer_id=CUSTOMER_ID, direction="inbound", content=content)
+
+
+@pytest.fixture
+def supabase_service():
+    service = AsyncMock()
+    service.create_messages.return_value = 0
+    return service
+
+
+class TestMessageLog:
+
+    async def test_append_does_not_write(self, supabase_service):
+        """Test that appended messages are buffered with their ID and timestamp"""
+        log = MessageLog(supabase_service, flush_interval=60)
+
+        stored = await log.append(message("Hi"))
+
+        assert stored.id is not None
+        assert stored.created_at is not None
+        assert log.pending() == [stored]
+        supabase_service.create_messages.assert_not_called()
+        await log.stop()
+
+    async def test_full_batch_is_written_at_once(self, supabase_service):
+        """Test that reaching max_batch writes the batch in one insert"""
+        log = MessageLog(supabase_service, max_batch=3, flush_interval=60)
+
+        for i in range(3):
+            await log.append(message(f"Message {i}"))
+        await asyncio.sleep(0.01)
+
+        supabase_service.create_messages.assert_called_once()
+        assert [m.content for m in supabase_service.create_messages.call_args[0][0]] == ["Message 0", "Message 1", "Message 2"]
+        assert log.pending() == []
+        await log.stop()
+
+    async def test_messages_are_written_after_the_interval(self, supabase_service):
+        """Test that a partial batch is written once flush_interval passes"""
+        log = MessageLog(supabase_service, flush_interval=0.01)
+
+        await log.append(message("Hi"))
+        await asyncio.sleep(0.05)
+
+        supabase_service.create_messages.assert_called_once()
+        assert log.metrics()["written"] == 1
+        await log.stop()
+
+    async def test_failed_batch_stays_buffered(self, supabase_service):
+        """Test that a failed write is retried by the next flush"""
+        supabase_service.create_messages.side_effect = [Exception("timeout"), 1]
+        log = MessageLog(supabase_service, flush_interval=60)
+        await log.append(message("Hi"))
+
+        assert await log.flush() == 0
+        assert len(log.pending()) == 1
+        assert await log.flush() == 1
+        assert log.metrics()["failed_batches"] == 1
+        await log.stop()
+
+    async def test_stop_writes_buffered_messages(self, supabase_service):
+        """Test that shutting down writes whatever is still buffered"""
+        log = MessageLog(supabase_service, flush_interval=60)
+        await log.append(message("Hi"))
+
+        await log.stop()
+
+        supabase_service.create_messages.assert_called_once()
+        assert log.pending() == []
+
+    async def test_spooled_messages_are_replayed(self, supabase_service, tmp_path):
+        """Test that messages buffered when the process died are written on the next start"""
+        path = str(tmp_path / "spool.db")
+        crashed = MessageLog(supabase_service, spool=SQLiteMessageSpool(path), flush_interval=60)
+        stored = await crashed.append(message("Hi"))
+        crashed._task.cancel()
+
+        restarted = MessageLog(supabase_service, spool=SQLiteMessageSpool(path), flush_interval=60)
+        assert [m.id for m in restarted.pending()] == [stored.id]
+
+        await restarted.flush()
+        assert SQLiteMessageSpool(path).load() == []
+        await restarted.stop()
+
+
+class TestGetMessageLog:
+
+    @pytest.fixture(autouse=True)
+    def reset_message_log(self, monkeypatch):
+        monkeypatch.setattr(message_log_module, "_message_log", None)
+
+    def test_write_behind_is_off_by_default(self):
+        """Test that messages are written as they are created unless write-behind is enabled"""
+        with patch.dict(os.environ, {}, clear=True):
+            assert get_message_log() is None
+
+    def test_write_behind_needs_a_spool_path(self):
+        """Test that write-behind without a spool path falls back to writing messages as they are created"""
+        with patch.dict(os.environ, {"MESSAGE_WRITE_BEHIND": "true"}, clear=True):
+            assert get_message_log() is None
+
+    async def test_write_behind_spools_to_configured_path(self, tmp_path):
+        """Test that enabled write-behind spools to the configured path"""
+        path = str(tmp_path / "spool.db")
+        with patch.dict(os.environ, {"MESSAGE_WRITE_BEHIND": "true", "MESSAGE_LOG_SPOOL_PATH": path}, clear=True), \
+             patch.object(message_log_module, "SupabaseService"):
+            log = get_message_log()
+
+        assert log.spool.path == path
+        await log.stop()
+
+
+class TestMergePending:
+
+    async def test_adds_missing_messages_for_the_order(self, supabase_service):
+        """Test that only the order's unwritten messages are added, within the window"""
+        log = MessageLog(supabase_service, flush_interval=60)
+        written = await log.append(message("Stored"))
+        buffered = await log.append(message("Buffered"))
+        await log.append(message("Other order", order_id=CUSTOMER_ID))
+
+        history = merge_pending([written], log.pending(), ORDER_ID, limit=10)
+
+        assert [m.content for m in history] == ["Stored", "Buffered"]
+        assert merge_pending([written], log.pending(), ORDER_ID, limit=1) == [buffered]
+        await log.stop()
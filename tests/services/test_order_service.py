@@ -0,0 +1,100 @@
+import pytest
+import os
+from unittest.mock import MagicMock
+
+from uuid import UUID
+
+from app.services.order_service import OrderService
+from app.models.order import OrderLineItemCreate
+
+CUSTOMER_ID = UUID("12345678-1234-5678-1234-567812345678")
+ORDER_ID = UUID("87654321-4321-8765-4321-876543210987")
+
+
+@pytest.fixture
+def order_service(mock_supabase_service, mock_conversation_service):
+    os.environ["TESTING"] = "true"
+
+    service = OrderService()
+    service.supabase_service = mock_supabase_service
+    service.conversation_service = mock_conversation_service
+    return service
+
+
+@pytest.fixture
+def order_payload(mock_shopify_service):
+    return mock_shopify_service.parse_order_data.return_value
+
+
+class TestOrderService:
+
+    async def test_process_order_new_customer(self, order_service, order_payload):
+        """Test that a new customer and order are stored and the conversation started"""
+        customer_data, order_details = order_payload
+        supabase = order_service.supabase_service
+        supabase.upsert_customer.return_value = MagicMock(id=CUSTOMER_ID)
+        supabase.upsert_order.return_value = MagicMock(id=ORDER_ID)
+
+        await order_service.process_order(customer_data, order_details)
+
+        line_items = [OrderLineItemCreate(
+            order_id=ORDER_ID,
+            line_item_id="line_item_123",
+            product_id="product_123",
+            variant_id="variant_123",
+            product_title="Test Product",
+            original_size="M"
+        )]
+        supabase.upsert_customer.assert_called_once()
+        supabase.upsert_order.assert_called_once()
+        supabase.get_customer_by_shopify_id.assert_not_called()
+        supabase.get_order_by_shopify_id.assert_not_called()
+        supabase.create_order_line_items.assert_called_once_with(line_items)
+        order_service.conversation_service.start_conversation.assert_called_once_with(
+            order_id=ORDER_ID,
+            customer_id=CUSTOMER_ID,
+            phone="+1234567890",
+            product_title="Test Product",
+            original_size="M",
+            line_items=line_items
+        )
+
+    async def test_process_order_retry_reuses_order(self, order_service, order_payload):
+        """Test that a retried job reuses the stored order instead of inserting it"""
+        customer_data, order_details = order_payload
+        supabase = order_service.supabase_service
+        supabase.upsert_customer.return_value = MagicMock(id=CUSTOMER_ID)
+        supabase.upsert_order.return_value = MagicMock(id=ORDER_ID)
+
+        await order_service.process_order(customer_data, order_details)
+
+        supabase.create_customer.assert_not_called()
+        supabase.create_order.assert_not_called()
+        assert supabase.upsert_order.call_args[0][0].customer_id == CUSTOMER_ID
+        # Line items are upserted, so ones stored by the failed attempt are skipped
+        supabase.create_order_line_items.assert_called_once()
+        order_service.conversation_service.start_conversation.assert_called_once()
+
+    async def test_process_order_stores_all_line_items_at_once(self, order_service, order_payload):
+        """Test that every sized item is stored in one request and confirmed in one conversation"""
+        customer_data, order_details = order_payload
+        second_item = {
+            "original_size": "32",
+            "product_id": "product_456",
+            "variant_id": "variant_456",
+            "line_item_id": "line_item_456",
+            "product_title": "Test Jeans"
+        }
+        order_details = {**order_details, "line_items": order_details["line_items"] + [second_item]}
+        supabase = order_service.supabase_service
+        supabase.upsert_customer.return_value = MagicMock(id=CUSTOMER_ID)
+        supabase.upsert_order.return_value = MagicMock(id=ORDER_ID)
+
+        await order_service.process_order(customer_data, order_details)
+
+        supabase.create_order_line_items.assert_called_once()
+        stored = supabase.create_order_line_items.call_args[0][0]
+        assert [item.line_item_id for item in stored] == ["line_item_123", "line_item_456"]
+        assert all(item.order_id == ORDER_ID for item in stored)
+        kwargs = order_service.conversation_service.start_conversation.call_args.kwargs
+        assert kwargs["line_items"] == stored
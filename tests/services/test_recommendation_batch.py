@@ -0,0 +1,87 @@
+import pytest
+from unittest.mock import AsyncMock
+
+from app.services.recommendation_batch import RecommendationBatch
+from app.utils.size_recommender import DEFAULT_CHART, SizeChart, SizeRecommender
+
+
+def make_order(order_id, height=None, weight=None, usual_size=None, product_id="product_123"):
+    return {
+        "id": order_id,
+        "product_id": product_id,
+        "customers": {"height": height, "weight": weight, "usual_size": usual_size},
+    }
+
+
+@pytest.fixture
+def recommender():
+    return SizeRecommender(default_chart=SizeChart(DEFAULT_CHART))
+
+
+@pytest.fixture
+def supabase_service():
+    service = AsyncMock()
+    service.set_order_recommendations.side_effect = lambda rows: len(rows)
+    return service
+
+
+class TestRecommendationBatch:
+
+    def test_score_page(self, supabase_service, recommender):
+        """Test that a page is scored per product and orders without facts are skipped"""
+        batch = RecommendationBatch(supabase_service, recommender)
+
+        results = batch.score_page([
+            make_order("a", height=180, weight=75),
+            make_order("b", usual_size="S", product_id="product_456"),
+            make_order("c"),
+            {"id": "d", "product_id": "product_123", "customers": None},
+        ])
+
+        assert [(r["id"], r["recommended_size"]) for r in results] == [("a", "L"), ("b", "S")]
+        assert all(0 < r["recommendation_confidence"] <= 1 for r in results)
+
+    async def test_run_pages_through_orders(self, supabase_service, recommender):
+        """Test that orders are read in pages after the last seen ID and written per page"""
+        supabase_service.get_orders_for_recommendation.side_effect = [
+            [make_order("a", height=180, weight=75), make_order("b", usual_size="M")],
+            [make_order("c", usual_size="L")],
+        ]
+        batch = RecommendationBatch(supabase_service, recommender, page_size=2)
+
+        result = await batch.run()
+
+        assert result == {"scanned": 3, "updated": 3}
+        calls = supabase_service.get_orders_for_recommendation.call_args_list
+        assert calls[0].kwargs == {"limit": 2}
+        assert calls[1].kwargs == {"after_id": "b", "limit": 2}
+        assert supabase_service.set_order_recommendations.call_count == 2
+
+    async def test_run_page(self, supabase_service, recommender):
+        """Test that one page is scored from the given cursor and returns the next one"""
+        supabase_service.get_orders_for_recommendation.return_value = [
+            make_order("c", height=180, weight=75), make_order("d"),
+        ]
+        batch = RecommendationBatch(supabase_service, recommender, page_size=2)
+
+        result = await batch.run_page(after_id="b")
+
+        assert result == {"scanned": 2, "updated": 1, "next_after_id": "d"}
+        supabase_service.get_orders_for_recommendation.assert_called_once_with(after_id="b", limit=2)
+
+    async def test_run_page_last(self, supabase_service, recommender):
+        """Test that a short page has no next cursor"""
+        supabase_service.get_orders_for_recommendation.return_value = [make_order("e", usual_size="M")]
+
+        result = await RecommendationBatch(supabase_service, recommender, page_size=2).run_page()
+
+        assert result == {"scanned": 1, "updated": 1, "next_after_id": None}
+
+    async def test_run_empty(self, supabase_service, recommender):
+        """Test that an empty orders table is a no-op"""
+        supabase_service.get_orders_for_recommendation.return_value = []
+
+        result = await RecommendationBatch(supabase_service, recommender).run()
+
+        assert result == {"scanned": 0, "updated": 0}
+        supabase_service.set_order_recommendations.assert_not_called()
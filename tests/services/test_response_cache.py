@@ -0,0 +1,64 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from app.services.response_cache import ResponseCache, SupabaseResponseCache
+
+
+class TestResponseCache:
+
+    async def test_get_or_generate_stores_result(self):
+        """Test that a generated response is served from the cache afterwards"""
+        cache = ResponseCache()
+        generate = AsyncMock(return_value="Hi!")
+
+        assert await cache.get_or_generate("key", generate) == "Hi!"
+        assert await cache.get_or_generate("key", generate) == "Hi!"
+        generate.assert_awaited_once()
+
+    async def test_get_or_generate_does_not_store_none(self):
+        """Test that failed generations are not cached"""
+        cache = ResponseCache()
+        generate = AsyncMock(side_effect=[None, "Hi!"])
+
+        assert await cache.get_or_generate("key", generate) is None
+        assert await cache.get_or_generate("key", generate) == "Hi!"
+
+    async def test_cancelled_generation_releases_waiters(self):
+        """Test that cancelling the generating call cancels its waiters and the next call generates again"""
+        cache = ResponseCache()
+        started = asyncio.Event()
+
+        async def slow_generate():
+            started.set()
+            await asyncio.sleep(10)
+
+        leader = asyncio.ensure_future(cache.get_or_generate("key", slow_generate))
+        await started.wait()
+        waiter = asyncio.ensure_future(cache.get_or_generate("key", AsyncMock(return_value="unused")))
+        await asyncio.sleep(0)
+        leader.cancel()
+
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(waiter, timeout=1)
+        assert await cache.get_or_generate("key", AsyncMock(return_value="Hi!")) == "Hi!"
+
+    async def test_shared_backend_fills_local_cache(self):
+        """Test that responses found in the shared table are kept locally"""
+        supabase_service = MagicMock()
+        supabase_service.get_cached_response = AsyncMock(return_value="Hi!")
+        cache = SupabaseResponseCache(supabase_service=supabase_service)
+
+        assert await cache.get("key") == "Hi!"
+        assert await cache.get("key") == "Hi!"
+        supabase_service.get_cached_response.assert_awaited_once_with("key")
+
+    async def test_shared_backend_errors_are_misses(self):
+        """Test that the cache falls back to generating when the table is unavailable"""
+        supabase_service = MagicMock()
+        supabase_service.get_cached_response = AsyncMock(side_effect=Exception("down"))
+        supabase_service.set_cached_response = AsyncMock(side_effect=Exception("down"))
+        cache = SupabaseResponseCache(supabase_service=supabase_service)
+
+        assert await cache.get_or_generate("key", AsyncMock(return_value="Hi!")) == "Hi!"
+        assert await cache.get("key") == "Hi!"
@@ -0,0 +1,107 @@
+import asyncio
+import sqlite3
+import pytest
+from unittest.mock import AsyncMock
+
+from app.services.shopify_clients import ShopifyClientRegistry, SqliteSessionStore, UnknownShopError
+
+
+@pytest.fixture
+def session_store():
+    store = AsyncMock()
+    store.get_access_token.side_effect = lambda shop: f"token-{shop}"
+    return store
+
+
+class TestShopifyClientRegistry:
+
+    async def test_tokens_are_loaded_once(self, session_store):
+        """Test that a shop's token is loaded on first use and its client reused"""
+        registry = ShopifyClientRegistry(session_store)
+
+        first = await registry.get("Shop-A.myshopify.com")
+        second = await registry.get("shop-a.myshopify.com")
+
+        assert first is second
+        assert first.access_token == "token-shop-a.myshopify.com"
+        session_store.get_access_token.assert_called_once_with("shop-a.myshopify.com")
+        assert registry.metrics()["hits"] == 1
+
+    async def test_concurrent_first_calls_share_one_lookup(self, session_store):
+        """Test that a burst of calls for a new shop loads its token once"""
+        async def slow_lookup(shop):
+            await asyncio.sleep(0.01)
+            return "token"
+
+        session_store.get_access_token.side_effect = slow_lookup
+        registry = ShopifyClientRegistry(session_store)
+
+        clients = await asyncio.gather(*[registry.get("shop-a.myshopify.com") for _ in range(5)])
+
+        assert all(client is clients[0] for client in clients)
+        session_store.get_access_token.assert_called_once()
+
+    async def test_least_recently_used_clients_are_evicted(self, session_store):
+        """Test that only the most recently used shops keep a client"""
+        registry = ShopifyClientRegistry(session_store, max_clients=2)
+
+        await registry.get("shop-a.myshopify.com")
+        await registry.get("shop-b.myshopify.com")
+        await registry.get("shop-a.myshopify.com")
+        await registry.get("shop-c.myshopify.com")
+        await registry.get("shop-b.myshopify.com")
+
+        assert registry.metrics()["evictions"] == 2
+        assert registry.metrics()["clients"] == 2
+        # shop-b was evicted by shop-c, so its token was loaded again
+        assert session_store.get_access_token.call_count == 4
+
+    async def test_static_shops_skip_the_session_store(self, session_store):
+        """Test that a shop registered from the environment is served without a lookup"""
+        registry = ShopifyClientRegistry(session_store)
+        registry.add_shop("shop-a.myshopify.com", "env-token")
+
+        client = await registry.get("shop-a.myshopify.com")
+
+        assert client.access_token == "env-token"
+        session_store.get_access_token.assert_not_called()
+
+    async def test_unknown_shop(self, session_store):
+        """Test that a shop without a stored token raises UnknownShopError"""
+        session_store.get_access_token.side_effect = None
+        session_store.get_access_token.return_value = None
+        registry = ShopifyClientRegistry(session_store)
+
+        with pytest.raises(UnknownShopError):
+            await registry.get("shop-a.myshopify.com")
+        assert registry.metrics()["clients"] == 0
+
+    async def test_invalidate_reloads_the_token(self, session_store):
+        """Test that an invalidated shop's token is loaded again"""
+        registry = ShopifyClientRegistry(session_store)
+
+        await registry.get("shop-a.myshopify.com")
+        await registry.invalidate("shop-a.myshopify.com")
+        await registry.get("shop-a.myshopify.com")
+
+        assert session_store.get_access_token.call_count == 2
+
+
+class TestSqliteSessionStore:
+
+    async def test_reads_offline_token(self, tmp_path):
+        """Test that the shop's offline token is read from the Prisma session table"""
+        path = str(tmp_path / "dev.sqlite")
+        connection = sqlite3.connect(path)
+        connection.execute('CREATE TABLE "Session" (id TEXT PRIMARY KEY, shop TEXT, state TEXT, isOnline BOOLEAN, accessToken TEXT)')
+        connection.executemany('INSERT INTO "Session" VALUES (?, ?, ?, ?, ?)', [
+            ("online-session", "shop-a.myshopify.com", "", 1, "online-token"),
+            ("offline_shop-a.myshopify.com", "shop-a.myshopify.com", "", 0, "offline-token"),
+        ])
+        connection.commit()
+        connection.close()
+
+        store = SqliteSessionStore(path)
+
+        assert await store.get_access_token("shop-a.myshopify.com") == "offline-token"
+        assert await store.get_access_token("shop-b.myshopify.com") is None
@@ -0,0 +1,97 @@
+import json
+import httpx
+import pytest
+
+from app.services.shopify_graphql import ShopifyGraphQLClient, ShopifyGraphQLError
+from app.services.shopify_scheduler import ShopifyScheduler, ShopifyThrottled, ShopifyUnavailable
+
+
+def make_client(*responses, scheduler=None):
+    requests = []
+    queue = list(responses)
+
+    def handler(request):
+        requests.append(request)
+        return queue.pop(0)
+
+    client = ShopifyGraphQLClient(
+        "test-store.myshopify.com",
+        "shpat_token",
+        api_version="2024-01",
+        scheduler=scheduler or ShopifyScheduler(backoff_base=0.01),
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    )
+    return client, requests
+
+
+class TestShopifyGraphQLClient:
+
+    async def test_execute(self):
+        """Test that queries are posted to the shop's Admin API with its access token"""
+        throttle_status = {"maximumAvailable": 1000.0, "currentlyAvailable": 980, "restoreRate": 50.0}
+        client, requests = make_client(httpx.Response(200, json={
+            "data": {"shop": {"name": "Test"}},
+            "extensions": {"cost": {"throttleStatus": throttle_status}}
+        }))
+
+        result = await client.execute("query { shop { name } }", {"a": 1})
+
+        assert result["data"] == {"shop": {"name": "Test"}}
+        assert str(requests[0].url) == "https://test-store.myshopify.com/admin/api/2024-01/graphql.json"
+        assert requests[0].headers["X-Shopify-Access-Token"] == "shpat_token"
+        assert json.loads(requests[0].content) == {"query": "query { shop { name } }", "variables": {"a": 1}}
+        assert client.scheduler.budget("test-store.myshopify.com").graphql.available == pytest.approx(980, abs=1)
+
+    async def test_throttled_requests_are_retried(self):
+        """Test that 429s and THROTTLED errors are retried"""
+        client, requests = make_client(
+            httpx.Response(429, headers={"Retry-After": "0"}),
+            httpx.Response(200, json={"errors": [{"message": "Throttled", "extensions": {"code": "THROTTLED"}}]}),
+            httpx.Response(200, json={"data": {"ok": True}}),
+        )
+
+        result = await client.execute("query { ok }")
+
+        assert result["data"] == {"ok": True}
+        assert len(requests) == 3
+        assert client.scheduler.metrics()["throttled"] == 2
+
+    async def test_server_errors_are_retried(self):
+        """Test that transient 5xx responses to queries are retried"""
+        client, requests = make_client(
+            httpx.Response(502),
+            httpx.Response(200, json={"data": {"ok": True}}),
+        )
+
+        assert (await client.execute("query { ok }"))["data"] == {"ok": True}
+
+    async def test_mutation_server_errors_are_not_retried(self):
+        """Test that a mutation failing with a 5xx, which may have been applied, is not sent again"""
+        client, requests = make_client(
+            httpx.Response(502),
+            httpx.Response(200, json={"data": {"ok": True}}),
+        )
+
+        with pytest.raises(ShopifyUnavailable):
+            await client.execute("\nmutation Confirm { ok }")
+
+        assert len(requests) == 1
+
+    async def test_client_errors_raise(self):
+        """Test that rejected requests are not retried"""
+        client, requests = make_client(httpx.Response(401, text="Invalid API key or access token"))
+
+        with pytest.raises(ShopifyGraphQLError):
+            await client.execute("query { ok }")
+
+        assert len(requests) == 1
+
+    async def test_gives_up_when_always_throttled(self):
+        """Test that throttling on every attempt raises ShopifyThrottled"""
+        client, _ = make_client(
+            *[httpx.Response(429, headers={"Retry-After": "0"}) for _ in range(2)],
+            scheduler=ShopifyScheduler(max_retries=1)
+        )
+
+        with pytest.raises(ShopifyThrottled):
+            await client.execute("query { ok }")
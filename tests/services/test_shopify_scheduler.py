@@ -0,0 +1,101 @@
+import time
+import pytest
+from unittest.mock import AsyncMock
+
+from app.services.shopify_scheduler import ShopBudget, ShopifyScheduler, ShopifyThrottled, ShopifyUnavailable
+
+
+class TestShopBudget:
+
+    def test_update_graphql_from_throttle_status(self):
+        """Test that the GraphQL bucket follows the reported throttleStatus"""
+        budget = ShopBudget()
+
+        budget.update_graphql({"maximumAvailable": 2000.0, "currentlyAvailable": 1500, "restoreRate": 100.0})
+
+        assert budget.graphql.capacity == 2000
+        assert budget.graphql.rate == 100
+        assert budget.graphql.available == pytest.approx(1500, abs=1)
+
+    def test_missing_throttle_status_is_ignored(self):
+        """Test that a response without a throttleStatus leaves the bucket unchanged"""
+        budget = ShopBudget()
+
+        budget.update_graphql(None)
+
+        assert budget.graphql.available == pytest.approx(1000, abs=1)
+
+
+class TestShopifyScheduler:
+
+    async def test_retries_throttled_calls(self):
+        """Test that a throttled call is retried after Retry-After"""
+        scheduler = ShopifyScheduler()
+        call = AsyncMock(side_effect=[ShopifyThrottled("429", retry_after=0.05), "ok"])
+        started = time.monotonic()
+
+        result = await scheduler.run_graphql("shop.myshopify.com", call)
+
+        assert result == "ok"
+        assert call.await_count == 2
+        assert time.monotonic() - started >= 0.05
+        assert scheduler.metrics()["throttled"] == 1
+
+    async def test_gives_up_after_max_retries(self):
+        """Test that a call throttled on every attempt raises"""
+        scheduler = ShopifyScheduler(max_retries=1)
+        call = AsyncMock(side_effect=ShopifyThrottled("429", retry_after=0))
+
+        with pytest.raises(ShopifyThrottled):
+            await scheduler.run_graphql("shop.myshopify.com", call)
+
+        assert call.await_count == 2
+
+    async def test_retries_queries_on_server_errors(self):
+        """Test that a query failing with a server error is retried"""
+        scheduler = ShopifyScheduler(backoff_base=0.01)
+        call = AsyncMock(side_effect=[ShopifyUnavailable("502"), "ok"])
+
+        assert await scheduler.run_graphql("shop.myshopify.com", call) == "ok"
+        assert call.await_count == 2
+        assert scheduler.metrics()["throttled"] == 0
+
+    async def test_does_not_retry_mutations_on_server_errors(self):
+        """Test that a mutation failing with a server error is not sent again"""
+        scheduler = ShopifyScheduler(backoff_base=0.01)
+        call = AsyncMock(side_effect=[ShopifyUnavailable("502"), "ok"])
+
+        with pytest.raises(ShopifyUnavailable):
+            await scheduler.run_graphql("shop.myshopify.com", call, mutation=True)
+
+        assert call.await_count == 1
+
+    async def test_retries_throttled_mutations(self):
+        """Test that a throttled mutation, which Shopify did not apply, is retried"""
+        scheduler = ShopifyScheduler()
+        call = AsyncMock(side_effect=[ShopifyThrottled("THROTTLED", retry_after=0), "ok"])
+
+        assert await scheduler.run_graphql("shop.myshopify.com", call, mutation=True) == "ok"
+        assert call.await_count == 2
+
+    async def test_waits_when_budget_is_spent(self):
+        """Test that calls wait for the bucket to refill instead of being sent"""
+        scheduler = ShopifyScheduler()
+        budget = scheduler.budget("shop.myshopify.com")
+        budget.update_graphql({"maximumAvailable": 1000.0, "currentlyAvailable": 0, "restoreRate": 500.0})
+        started = time.monotonic()
+
+        await scheduler.run_graphql("shop.myshopify.com", AsyncMock(return_value="ok"), cost=50)
+
+        assert time.monotonic() - started >= 0.09
+
+    async def test_shops_have_separate_budgets(self):
+        """Test that one shop's spent budget does not slow another shop"""
+        scheduler = ShopifyScheduler()
+        scheduler.budget("a.myshopify.com").update_graphql({"maximumAvailable": 1000.0, "currentlyAvailable": 0, "restoreRate": 50.0})
+        started = time.monotonic()
+
+        await scheduler.run_graphql("b.myshopify.com", AsyncMock(return_value="ok"))
+
+        assert time.monotonic() - started < 0.05
+        assert set(scheduler.metrics()["shops"]) == {"a.myshopify.com", "b.myshopify.com"}
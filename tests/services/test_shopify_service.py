@@ -1,8 +1,13 @@
+import json
+import httpx
 import pytest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, AsyncMock, MagicMock
 import os
 
 from app.services.shopify_service import ShopifyService
+from app.services.shopify_graphql import ShopifyGraphQLClient
+from app.services.shopify_clients import ShopifyClientRegistry
+from app.services.shopify_scheduler import ShopifyScheduler
 
 class TestShopifyService:
 
@@ -14,29 +19,24 @@ class TestShopifyService:
         return service
 
     @pytest.fixture
-    def mock_shopify(self):
-        with patch("app.services.shopify_service.shopify") as mock_shopify:
-            # Setup mock Shop
-            mock_shop = MagicMock()
-            mock_shopify.Shop.current.return_value = mock_shop
+    def shopify_api(self, shopify_service):
+        """Serve queued GraphQL responses to the service and record its requests"""
+        api = MagicMock(responses=[], requests=[])
 
-            # Setup mock Order
-            mock_order = MagicMock()
-            mock_shopify.Order.find.return_value = mock_order
+        def handler(request):
+            api.requests.append(json.loads(request.content))
+            return httpx.Response(200, json=api.responses.pop(0))
 
-            # Setup mock LineItem
-            mock_line_item = MagicMock()
-            mock_order.line_items = [mock_line_item]
-
-            # Setup mock FulfillmentService
-            mock_fulfillment_service = MagicMock()
-            mock_shopify.FulfillmentService.find.return_value = mock_fulfillment_service
-
-            # Setup mock Fulfillment
-            mock_fulfillment = MagicMock()
-            mock_shopify.Fulfillment.return_value = mock_fulfillment
-
-            yield mock_shopify
+        shopify_service.testing = False
+        shopify_service.shop_url = "test-store.myshopify.com"
+        shopify_service.clients = ShopifyClientRegistry()
+        shopify_service.clients.add_client(ShopifyGraphQLClient(
+            "test-store.myshopify.com",
+            "token",
+            scheduler=ShopifyScheduler(),
+            http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        ))
+        return api
 
     def test_parse_order_data(self, shopify_service):
         """Test parsing Shopify order data"""
@@ -119,7 +119,7 @@ class TestShopifyService:
         assert order_details["original_size"] == "Medium"
 
     def test_parse_order_data_multiple_items(self, shopify_service):
-        """Test parsing order data with multiple line items (should use first item)"""
+        """Test parsing order data with multiple line items"""
         # Sample order data with multiple items
         order_data = {
             "id": 123456789,
@@ -164,10 +164,13 @@ class TestShopifyService:
         # Call method
         customer_data, order_details = shopify_service.parse_order_data(order_data)
 
-        # Verify first item is used
+        # Verify the first item is the order's own and every item is parsed
         assert order_details["product_title"] == "Test Product 1"
         assert order_details["original_size"] == "M"
         assert order_details["line_item_id"] == "111222333"
+        assert [item["line_item_id"] for item in order_details["line_items"]] == ["111222333", "999888777"]
+        assert order_details["line_items"][1]["original_size"] == "L"
+        assert order_details["line_items"][1]["product_title"] == "Test Product 2"
 
     async def test_update_order_size(self, shopify_service):
         """Test updating order size in Shopify"""
@@ -192,3 +195,141 @@ class TestShopifyService:
 
         # In testing mode, should always return True
         assert result is True
+
+    async def test_confirm_and_fulfil_testing_mode(self, shopify_service):
+        """Test the combined confirmation in testing mode"""
+        assert await shopify_service.confirm_and_fulfil("123456789", "L") == (True, True)
+
+    async def test_confirm_and_fulfil_makes_two_calls(self, shopify_service, shopify_api):
+        """Test that the order is fetched once and updated and fulfilled in one mutation"""
+        shopify_api.responses = [
+            {"data": {"order": {
+                "note": "Gift wrap",
+                "fulfillmentOrders": {"nodes": [{"id": "gid://shopify/FulfillmentOrder/1"}]}
+            }}},
+            {"data": {
+                "orderUpdate": {"userErrors": []},
+                "fulfillmentCreateV2": {"fulfillment": {"id": "gid://shopify/Fulfillment/1"}, "userErrors": []}
+            }},
+        ]
+
+        result = await shopify_service.confirm_and_fulfil("123456789", "L")
+
+        assert result == (True, True)
+        assert len(shopify_api.requests) == 2
+        variables = shopify_api.requests[1]["variables"]
+        assert variables["order"]["id"] == "gid://shopify/Order/123456789"
+        assert variables["order"]["note"].startswith("Gift wrap\nSize confirmation: Changed to L")
+        assert variables["order"]["metafields"][0]["value"] == "L"
+        assert variables["fulfillment"]["lineItemsByFulfillmentOrder"] == [
+            {"fulfillmentOrderId": "gid://shopify/FulfillmentOrder/1"}
+        ]
+
+    async def test_confirm_and_fulfil_reports_user_errors(self, shopify_service, shopify_api):
+        """Test that a rejected fulfillment is reported without failing the size update"""
+        shopify_api.responses = [
+            {"data": {"order": {
+                "note": None,
+                "fulfillmentOrders": {"nodes": [{"id": "gid://shopify/FulfillmentOrder/1"}]}
+            }}},
+            {"data": {
+                "orderUpdate": {"userErrors": []},
+                "fulfillmentCreateV2": {"fulfillment": None, "userErrors": [{"field": None, "message": "On hold"}]}
+            }},
+        ]
+
+        assert await shopify_service.confirm_and_fulfil("123456789", "L") == (True, False)
+
+    async def test_update_order_size_graphql(self, shopify_service, shopify_api):
+        """Test that the size is recorded with a note and metafield through GraphQL"""
+        shopify_api.responses = [
+            {"data": {"order": {"note": None}}},
+            {"data": {"orderUpdate": {"userErrors": []}}},
+        ]
+
+        assert await shopify_service.update_order_size("123456789", "111222333", "L") is True
+        assert shopify_api.requests[1]["variables"]["order"]["note"] == "Size confirmation: Changed to L via WhatsApp conversation"
+
+    async def test_trigger_fulfillment_graphql(self, shopify_service, shopify_api):
+        """Test that every open fulfillment order is fulfilled"""
+        shopify_api.responses = [
+            {"data": {"order": {"fulfillmentOrders": {"nodes": [{"id": "gid://shopify/FulfillmentOrder/1"}]}}}},
+            {"data": {"fulfillmentCreateV2": {"fulfillment": {"id": "gid://shopify/Fulfillment/1"}, "userErrors": []}}},
+        ]
+
+        assert await shopify_service.trigger_fulfillment("123456789") is True
+
+    async def test_trigger_fulfillment_order_not_found(self, shopify_service, shopify_api):
+        """Test that a missing order is reported as a failure"""
+        shopify_api.responses = [{"data": {"order": None}}]
+
+        assert await shopify_service.trigger_fulfillment("123456789") is False
+
+    async def test_rejected_token_is_reloaded(self, shopify_service):
+        """Test that a 401 drops the shop's cached client and retries with the stored token"""
+        tokens = []
+
+        def handler(request):
+            tokens.append(request.headers["X-Shopify-Access-Token"])
+            if request.headers["X-Shopify-Access-Token"] == "old-token":
+                return httpx.Response(401, text="Invalid API key or access token")
+            if len(tokens) == 2:
+                return httpx.Response(200, json={"data": {"order": {"note": None}}})
+            return httpx.Response(200, json={"data": {"orderUpdate": {"userErrors": []}}})
+
+        http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        session_store = AsyncMock()
+        session_store.get_access_token.return_value = "new-token"
+        shopify_service.testing = False
+        shopify_service.shop_url = "test-store.myshopify.com"
+        shopify_service.clients = ShopifyClientRegistry(session_store, scheduler=ShopifyScheduler())
+        shopify_service.clients.add_client(ShopifyGraphQLClient(
+            "test-store.myshopify.com", "old-token", scheduler=ShopifyScheduler(), http_client=http_client
+        ))
+
+        with patch("app.services.shopify_graphql.get_http_client", return_value=http_client), \
+                patch("app.services.shopify_clients.close_http_client", AsyncMock()) as close_http_client:
+            assert await shopify_service.update_order_size("123456789", "111222333", "L") is True
+
+        assert tokens == ["old-token", "new-token", "new-token"]
+        close_http_client.assert_called_once_with("shopify:test-store.myshopify.com")
+        session_store.get_access_token.assert_called_once_with("test-store.myshopify.com")
+
+    async def test_confirm_and_fulfil_unknown_shop(self, shopify_service, shopify_api):
+        """Test that an order from a shop without a stored token is reported as a failure"""
+        assert await shopify_service.confirm_and_fulfil("123456789", "L", shop="other-store.myshopify.com") == (False, False)
+        assert shopify_api.requests == []
+
+    def test_parse_order_data_skips_unsized_items(self, shopify_service):
+        """Test that items without a size are left out of the confirmation"""
+        order_data = {
+            "id": 123456789,
+            "order_number": "#1001",
+            "customer": {"id": 987654321, "phone": "+1234567890"},
+            "line_items": [
+                {"id": 1, "product_id": 2, "variant_id": 3, "title": "Gift Card", "variant_title": None, "properties": []},
+                {"id": 4, "product_id": 5, "variant_id": 6, "title": "Test Product", "variant_title": "Large", "properties": []},
+            ]
+        }
+
+        _, order_details = shopify_service.parse_order_data(order_data)
+
+        assert order_details["line_item_id"] == "4"
+        assert len(order_details["line_items"]) == 1
+
+    async def test_confirm_and_fulfil_records_every_item(self, shopify_service, shopify_api):
+        """Test that the sizes of every item go into the note and a JSON metafield"""
+        shopify_api.responses = [
+            {"data": {"order": {"note": None, "fulfillmentOrders": {"nodes": []}}}},
+            {"data": {"orderUpdate": {"userErrors": []}}},
+        ]
+
+        result = await shopify_service.confirm_and_fulfil("123456789", "L", line_item_sizes=[
+            {"line_item_id": "1", "product_title": "Test Product", "size": "L"},
+            {"line_item_id": "2", "product_title": "Test Jeans", "size": "34"},
+        ])
+
+        assert result == (True, False)
+        order_input = shopify_api.requests[1]["variables"]["order"]
+        assert order_input["note"] == "Size confirmation: Test Product in L, Test Jeans in 34 via WhatsApp conversation"
+        assert json.loads(order_input["metafields"][1]["value"]) == {"1": "L", "2": "34"}
@@ -1,3 +1,5 @@
+import json
+import httpx
 import pytest
 import os
 from unittest.mock import patch, MagicMock, AsyncMock
@@ -6,8 +8,9 @@ from datetime import datetime
 
 from app.services.supabase_service import SupabaseService
 from app.models.customer import CustomerCreate, CustomerUpdate
-from app.models.order import OrderCreate, OrderUpdate, Order
+from app.models.order import OrderCreate, OrderUpdate, Order, OrderLineItemCreate
 from app.models.message import MessageCreate
+from app.models.conversation import ConversationPhase, ConversationUpdate
 
 @pytest.fixture
 def supabase_service():
@@ -128,6 +131,134 @@ class TestSupabaseService:
         assert result.confirmed_size == "L"
         assert result.size_confirmed is True
 
+    async def test_create_order_line_items(self, supabase_service):
+        """Test create_order_line_items returns mock line items in testing mode"""
+        order_id = UUID("12345678-1234-5678-1234-567812345678")
+        line_items = [
+            OrderLineItemCreate(order_id=order_id, line_item_id="1", product_id="2", variant_id="3", product_title="Test Product", original_size="M"),
+            OrderLineItemCreate(order_id=order_id, line_item_id="4", product_id="5", variant_id="6", product_title="Test Jeans", original_size="32"),
+        ]
+
+        result = await supabase_service.create_order_line_items(line_items)
+
+        assert [item.line_item_id for item in result] == ["1", "4"]
+        assert all(item.order_id == order_id for item in result)
+
+    async def test_create_order_line_items_single_request(self, supabase_service):
+        """Test that every line item is upserted in one request, skipping stored ones"""
+        supabase_service.testing = False
+        supabase_service.supabase = MagicMock()
+        table = supabase_service.supabase.table.return_value
+        table.upsert.return_value.execute.return_value = MagicMock(data=[])
+        order_id = UUID("12345678-1234-5678-1234-567812345678")
+
+        await supabase_service.create_order_line_items([
+            OrderLineItemCreate(order_id=order_id, line_item_id="1", product_id="2", variant_id="3", product_title="Test Product", original_size="M"),
+            OrderLineItemCreate(order_id=order_id, line_item_id="4", product_id="5", variant_id="6", product_title="Test Jeans", original_size="32"),
+        ])
+
+        supabase_service.supabase.table.assert_called_once_with("order_line_items")
+        rows = table.upsert.call_args[0][0]
+        assert [row["line_item_id"] for row in rows] == ["1", "4"]
+        assert table.upsert.call_args.kwargs == {"on_conflict": "order_id,line_item_id", "ignore_duplicates": True}
+
+    async def test_upsert_customer_keeps_sizing_preferences(self, supabase_service):
+        """Test that upsert_customer conflicts on the Shopify ID and only writes the webhook's fields"""
+        supabase_service.testing = False
+        supabase_service.supabase = MagicMock()
+        supabase_service.customer_cache = None
+        table = supabase_service.supabase.table.return_value
+        table.upsert.return_value.execute.return_value = MagicMock(data=[{
+            "id": "12345678-1234-5678-1234-567812345678",
+            "shopify_customer_id": "123456",
+            "phone": "+1234567890",
+            "height": 180.0
+        }])
+
+        result = await supabase_service.upsert_customer(CustomerCreate(shopify_customer_id="123456", phone="+1234567890"))
+
+        table.upsert.assert_called_once_with(
+            {"shopify_customer_id": "123456", "phone": "+1234567890"},
+            on_conflict="shopify_customer_id"
+        )
+        assert result.height == 180.0
+
+    async def test_upsert_order(self, supabase_service):
+        """Test that upsert_order conflicts on the Shopify order ID and returns the stored row"""
+        supabase_service.testing = False
+        supabase_service.supabase = MagicMock()
+        table = supabase_service.supabase.table.return_value
+        order_data = OrderCreate(
+            shopify_order_id="123456",
+            customer_id=UUID("12345678-1234-5678-1234-567812345678"),
+            order_number="1001",
+            original_size="M",
+            product_id="1",
+            variant_id="2",
+            line_item_id="3",
+            product_title="Test Product"
+        )
+        table.upsert.return_value.execute.return_value = MagicMock(data=[{
+            "id": "87654321-4321-8765-4321-876543210987",
+            "size_confirmed": True,
+            **order_data.dict()
+        }])
+
+        result = await supabase_service.upsert_order(order_data)
+
+        assert table.upsert.call_args.kwargs == {"on_conflict": "shopify_order_id"}
+        assert result.size_confirmed is True
+
+    async def test_writes_serialize_ids_over_http(self):
+        """Test that orders and messages with UUID fields are sent to PostgREST as JSON"""
+        requests = []
+
+        def handler(request):
+            requests.append(request)
+            body = json.loads(request.content)
+            row = body[0] if isinstance(body, list) else body
+            return httpx.Response(201, json=[{"id": "87654321-4321-8765-4321-876543210987", **row}])
+
+        http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        env = {
+            "TESTING": "false",
+            "SUPABASE_ASYNC": "true",
+            "SUPABASE_URL": "https://example.supabase.co",
+            "SUPABASE_KEY": "test-key"
+        }
+        with patch.dict(os.environ, env), patch("app.services.supabase_service.get_http_client", return_value=http_client):
+            service = SupabaseService()
+
+        customer_id = UUID("12345678-1234-5678-1234-567812345678")
+        order_data = OrderCreate(
+            shopify_order_id="123456",
+            customer_id=customer_id,
+            order_number="1001",
+            original_size="M",
+            product_id="1",
+            variant_id="2",
+            line_item_id="3",
+            product_title="Test Product"
+        )
+        try:
+            upserted = await service.upsert_order(order_data)
+            created = await service.create_order(order_data)
+            message = await service.create_message(MessageCreate(
+                order_id=upserted.id,
+                customer_id=customer_id,
+                direction="inbound",
+                content="Yes",
+                conversation_phase=ConversationPhase.CONFIRMATION
+            ))
+        finally:
+            await http_client.aclose()
+
+        assert [request.url.path for request in requests] == ["/rest/v1/orders", "/rest/v1/orders", "/rest/v1/messages"]
+        assert "on_conflict=shopify_order_id" in str(requests[0].url)
+        assert json.loads(requests[0].content)["customer_id"] == str(customer_id)
+        assert upserted.customer_id == created.customer_id == customer_id
+        assert message.order_id == upserted.id
+
     async def test_get_order_with_pending_size_confirmation(self, supabase_service):
         """Test get_order_with_pending_size_confirmation returns None in testing mode"""
         customer_id = UUID("12345678-1234-5678-1234-567812345678")
@@ -167,3 +298,103 @@ class TestSupabaseService:
         order_id = UUID("12345678-1234-5678-1234-567812345678")
         result = await supabase_service.get_last_message_by_order(order_id)
         assert result is None
+
+    async def test_update_conversation_state_checks_version(self, supabase_service):
+        """Test that a conversation's state only changes at the version it was read, which is then incremented"""
+        supabase_service.testing = False
+        supabase_service.supabase = MagicMock()
+        table = supabase_service.supabase.table.return_value
+        query = table.update.return_value.eq.return_value.eq.return_value
+        query.execute.return_value = MagicMock(data=[])
+        conversation_id = UUID("87654321-8765-4321-8765-432187654321")
+
+        result = await supabase_service.update_conversation_state(
+            conversation_id, 3, ConversationUpdate(phase=ConversationPhase.SIZING_QUESTIONS)
+        )
+
+        assert result is None
+        table.update.assert_called_once_with({"phase": "SIZING_QUESTIONS", "version": 4})
+        table.update.return_value.eq.assert_called_once_with("id", str(conversation_id))
+        table.update.return_value.eq.return_value.eq.assert_called_once_with("version", 3)
+
+    async def test_get_conversation_by_phone_for_order(self, supabase_service):
+        """Test that asking for an order's conversation filters on the order, not the latest for the phone"""
+        supabase_service.testing = False
+        supabase_service.supabase = MagicMock()
+        table = supabase_service.supabase.table.return_value
+        table.select.return_value.eq.return_value.limit.return_value.execute.return_value = MagicMock(data=[])
+        order_id = UUID("87654321-4321-8765-4321-876543210987")
+
+        result = await supabase_service.get_conversation_by_phone("+1234567890", order_id)
+
+        assert result is None
+        table.select.return_value.eq.assert_called_once_with("order_id", str(order_id))
+        table.select.return_value.eq.return_value.order.assert_not_called()
+
+    async def test_get_reply_context(self, supabase_service):
+        """Test get_reply_context returns None in testing mode"""
+        result = await supabase_service.get_reply_context("+1234567890")
+        assert result is None
+
+    async def test_get_reply_context_parses_rpc_result(self, supabase_service):
+        """Test get_reply_context builds a ReplyContext from the RPC payload"""
+        supabase_service.testing = False
+        supabase_service.supabase = MagicMock()
+        supabase_service.supabase.rpc.return_value.execute.return_value = MagicMock(data={
+            "customer": {
+                "id": "12345678-1234-5678-1234-567812345678",
+                "shopify_customer_id": 123456,
+                "phone": "+1234567890"
+            },
+            "conversation": None,
+            "order": None,
+            "messages": []
+        })
+
+        result = await supabase_service.get_reply_context("+1234567890", message_limit=5)
+
+        supabase_service.supabase.rpc.assert_called_once_with(
+            "get_reply_context", {"p_phone": "+1234567890", "p_message_limit": 5}
+        )
+        assert result.customer.shopify_customer_id == "123456"
+        assert result.conversation is None
+        assert result.messages == []
+
+    async def test_execute_awaits_async_query(self, supabase_service):
+        """Test _execute awaits the response of an async query builder"""
+        query = MagicMock()
+        query.execute = AsyncMock(return_value=MagicMock(data=[{"id": 1}]))
+
+        result = await supabase_service._execute(query)
+
+        assert result.data == [{"id": 1}]
+        query.execute.assert_awaited_once()
+
+    async def test_execute_sync_query(self, supabase_service):
+        """Test _execute returns the response of a sync query builder as-is"""
+        query = MagicMock()
+        query.execute.return_value = MagicMock(data=[])
+
+        result = await supabase_service._execute(query)
+
+        assert result.data == []
+
+    async def test_async_mode_shares_connection_pool(self):
+        """Test that async-mode services share one pooled HTTP client per project"""
+        from app.utils.http_pool import close_http_clients
+
+        env = {
+            "TESTING": "false",
+            "SUPABASE_ASYNC": "true",
+            "SUPABASE_URL": "https://example.supabase.co",
+            "SUPABASE_KEY": "test-key"
+        }
+        with patch.dict(os.environ, env):
+            first = SupabaseService()
+            second = SupabaseService()
+
+        try:
+            assert first.async_mode is True
+            assert first.supabase.postgrest.session is second.supabase.postgrest.session
+        finally:
+            await close_http_clients()
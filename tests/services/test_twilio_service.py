@@ -3,6 +3,7 @@ from unittest.mock import patch, AsyncMock, MagicMock
 import os
 
 from app.services.twilio_service import TwilioService
+from app.services.whatsapp_dispatcher import OutboundDispatcher, StubTransport, TransportError
 
 class TestTwilioService:
 
@@ -84,3 +85,29 @@ class TestTwilioService:
         assert result["num_media"] == 1
         assert result["media_urls"] == ["https://example.com/image.jpg"]
         assert result["media_types"] == ["image/jpeg"]
+
+    async def test_send_whatsapp_message_uses_dispatcher(self, twilio_service):
+        """Test that messages are sent through the rate-limited dispatcher"""
+        transport = StubTransport()
+        twilio_service.testing = False
+        twilio_service.stub_transport = True
+        twilio_service.from_phone = "+1000"
+        twilio_service.dispatcher = OutboundDispatcher(transport)
+
+        result = await twilio_service.send_whatsapp_message("+1234567890", "Hi!")
+
+        assert result.startswith("STUB")
+        assert transport.sent == [{"from": "+1000", "to": "+1234567890", "body": "Hi!"}]
+        await twilio_service.dispatcher.stop()
+
+    async def test_send_whatsapp_message_returns_none_when_rejected(self, twilio_service):
+        """Test that a message Twilio rejects returns None"""
+        transport = StubTransport()
+        transport.failures = [TransportError("Invalid To number", status=400)]
+        twilio_service.testing = False
+        twilio_service.stub_transport = True
+        twilio_service.from_phone = "+1000"
+        twilio_service.dispatcher = OutboundDispatcher(transport)
+
+        assert await twilio_service.send_whatsapp_message("invalid", "Hi!") is None
+        await twilio_service.dispatcher.stop()
@@ -1,9 +1,11 @@
+import asyncio
 import pytest
 from unittest.mock import patch, AsyncMock, MagicMock
 import os
 
-from app.services.vertex_ai_service import VertexAIService
+from app.services.vertex_ai_service import VertexAIService, build_prompt
 from app.services.conversation_service import ConversationPhase
+from app.services.response_cache import ResponseCache
 
 class TestVertexAIService:
 
@@ -153,3 +155,113 @@ class TestVertexAIService:
         assert intent == "PROVIDE_INFO"
         assert "height" in entities
         assert "weight" in entities
+
+    async def test_detect_intent_fast_path_skips_model(self, vertex_ai_service):
+        """Test that unambiguous replies never reach the model"""
+        vertex_ai_service.testing = False
+        vertex_ai_service.chat_model = MagicMock()
+
+        intent, entities = await vertex_ai_service.detect_intent("180cm 75kg")
+
+        assert intent == "PROVIDE_INFO"
+        assert entities == {"height": "180", "weight": "75"}
+        vertex_ai_service.chat_model.predict.assert_not_called()
+
+    async def test_detect_intent_falls_through_to_model(self, vertex_ai_service):
+        """Test that uncertain replies are sent to the model"""
+        vertex_ai_service.testing = False
+        vertex_ai_service.chat_model = MagicMock()
+        vertex_ai_service.chat_model.predict.return_value = MagicMock(
+            text='{"intent": "OTHER", "entities": {}}'
+        )
+
+        intent, entities = await vertex_ai_service.detect_intent("Can I change the colour?")
+
+        assert intent == "OTHER"
+        vertex_ai_service.chat_model.predict.assert_called_once()
+
+    async def test_generate_response_caches_opener(self, vertex_ai_service):
+        """Test that openers for the same product and size reuse one generation"""
+        vertex_ai_service.testing = False
+        vertex_ai_service.response_cache = ResponseCache()
+        vertex_ai_service.chat_model = MagicMock()
+        vertex_ai_service.chat_model.predict.return_value = MagicMock(text="Is size M right for you?")
+
+        responses = await asyncio.gather(*(
+            vertex_ai_service.generate_response("Test T-Shirt", "M", [], ConversationPhase.CONFIRMATION)
+            for _ in range(5)
+        ))
+
+        assert responses == ["Is size M right for you?"] * 5
+        vertex_ai_service.chat_model.predict.assert_called_once()
+
+    async def test_generate_response_skips_cache_mid_conversation(self, vertex_ai_service):
+        """Test that responses depending on the customer's replies are always generated"""
+        vertex_ai_service.testing = False
+        vertex_ai_service.response_cache = ResponseCache()
+        vertex_ai_service.chat_model = MagicMock()
+        vertex_ai_service.chat_model.predict.return_value = MagicMock(text="What's your usual size?")
+        history = [{"direction": "inbound", "content": "not sure"}]
+
+        for _ in range(2):
+            await vertex_ai_service.generate_response("Test T-Shirt", "M", history, ConversationPhase.SIZING_QUESTIONS)
+            await vertex_ai_service.generate_response("Test T-Shirt", "M", history, ConversationPhase.CONFIRMATION)
+
+        assert vertex_ai_service.chat_model.predict.call_count == 4
+
+    async def test_generate_response_does_not_cache_failures(self, vertex_ai_service):
+        """Test that a failed generation is retried on the next call"""
+        vertex_ai_service.testing = False
+        vertex_ai_service.response_cache = ResponseCache()
+        vertex_ai_service.chat_model = MagicMock()
+        vertex_ai_service.chat_model.predict.side_effect = [Exception("quota"), MagicMock(text="Thanks!")]
+
+        first = await vertex_ai_service.generate_response("Test T-Shirt", "M", [], ConversationPhase.CONFIRMATION)
+        second = await vertex_ai_service.generate_response("Test T-Shirt", "M", [], ConversationPhase.CONFIRMATION)
+
+        assert "having trouble" in first
+        assert second == "Thanks!"
+
+    async def test_generate_response_does_not_cache_sign_off(self, vertex_ai_service):
+        """Test that sign-offs are generated per order, since they name the confirmed sizes"""
+        vertex_ai_service.testing = False
+        vertex_ai_service.response_cache = ResponseCache()
+        vertex_ai_service.chat_model = MagicMock()
+        vertex_ai_service.chat_model.predict.side_effect = [MagicMock(text="Size M confirmed!"), MagicMock(text="Size L confirmed!")]
+
+        first = await vertex_ai_service.generate_response("Test T-Shirt", "M", [], ConversationPhase.COMPLETE, {"confirmed_size": "M"})
+        second = await vertex_ai_service.generate_response("Test T-Shirt", "M", [], ConversationPhase.COMPLETE, {"confirmed_size": "L"})
+
+        assert (first, second) == ("Size M confirmed!", "Size L confirmed!")
+
+    def test_build_prompt_includes_history_and_facts(self):
+        """Test that the prompt lists the sizing facts and the transcript in order"""
+        prompt = build_prompt(
+            "Test T-Shirt",
+            "M",
+            [
+                {"direction": "outbound", "content": "How tall are you?"},
+                {"direction": "inbound", "content": "180cm"},
+            ],
+            ConversationPhase.SIZING_QUESTIONS,
+            {"usual_size": "L", "height": 180.0}
+        )
+
+        assert "CURRENT CONVERSATION PHASE: SIZING_QUESTIONS" in prompt
+        assert "- Usual size: L\n- Height: 180\n" in prompt
+        assert "Assistant: How tall are you?\nCustomer: 180cm\n" in prompt
+
+    def test_build_prompt_without_facts(self):
+        """Test that the prompt says when no sizing facts are known"""
+        prompt = build_prompt("Test T-Shirt", "M", [], ConversationPhase.CONFIRMATION)
+
+        assert "KNOWN SIZING FACTS:\n- None yet\n" in prompt
+
+    def test_build_prompt_lists_every_item(self):
+        """Test that orders with several items list each product and size"""
+        prompt = build_prompt("Test T-Shirt", "M", [], ConversationPhase.CONFIRMATION, line_items=[
+            {"product_title": "Test T-Shirt", "original_size": "M"},
+            {"product_title": "Test Jeans", "original_size": "32"},
+        ])
+
+        assert "ORDER INFORMATION:\n- Test T-Shirt: size M\n- Test Jeans: size 32\n" in prompt
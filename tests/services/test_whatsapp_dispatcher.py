@@ -0,0 +1,142 @@
+import time
+import asyncio
+import pytest
+from unittest.mock import MagicMock
+
+from app.services.whatsapp_dispatcher import OutboundDispatcher, StubTransport, TransportError, TwilioTransport
+from app.utils.executor import IntegrationExecutor
+
+
+@pytest.fixture
+def transport():
+    return StubTransport()
+
+
+@pytest.fixture
+async def dispatcher(transport):
+    dispatcher = OutboundDispatcher(transport, rate=1000, max_queue=10, concurrency=2, backoff_base=0.01)
+    yield dispatcher
+    await dispatcher.stop()
+
+
+class TestOutboundDispatcher:
+
+    async def test_send(self, dispatcher, transport):
+        """Test that a queued message is sent and its ID returned"""
+        sid = await dispatcher.send("+1000", "+1234567890", "Hi!")
+
+        assert sid.startswith("STUB")
+        assert transport.sent == [{"from": "+1000", "to": "+1234567890", "body": "Hi!"}]
+        assert dispatcher.metrics()["sent"] == 1
+
+    async def test_retries_rate_limits_and_server_errors(self, dispatcher, transport):
+        """Test that 429 and 5xx responses are retried until the send succeeds"""
+        transport.failures = [TransportError("Too Many Requests", status=429), TransportError("Bad Gateway", status=502)]
+
+        sid = await dispatcher.send("+1000", "+1234567890", "Hi!")
+
+        assert sid.startswith("STUB")
+        assert dispatcher.metrics()["retried"] == 2
+
+    async def test_client_errors_are_not_retried(self, dispatcher, transport):
+        """Test that a rejected message fails without retrying"""
+        transport.failures = [TransportError("Invalid To number", status=400)]
+
+        with pytest.raises(TransportError):
+            await dispatcher.send("+1000", "invalid", "Hi!")
+
+        assert dispatcher.metrics()["retried"] == 0
+        assert dispatcher.metrics()["failed"] == 1
+
+    async def test_ambiguous_errors_are_not_retried(self, dispatcher, transport):
+        """Test that a timeout, which may have been sent, is failed rather than sent twice"""
+        transport.failures = [TransportError("Timed out waiting for Twilio")]
+
+        with pytest.raises(TransportError):
+            await dispatcher.send("+1000", "+1234567890", "Hi!")
+
+        assert transport.sent == []
+        assert dispatcher.metrics()["retried"] == 0
+
+    async def test_connection_errors_before_sending_are_retried(self, dispatcher, transport):
+        """Test that a connection that was never made is retried"""
+        transport.failures = [TransportError("Connection refused", before_send=True)]
+
+        sid = await dispatcher.send("+1000", "+1234567890", "Hi!")
+
+        assert sid.startswith("STUB")
+        assert dispatcher.metrics()["retried"] == 1
+
+    async def test_gives_up_after_max_attempts(self, transport):
+        """Test that a message is failed once every attempt was rate limited"""
+        dispatcher = OutboundDispatcher(transport, rate=1000, max_attempts=2, backoff_base=0.01)
+        transport.failures = [TransportError("Too Many Requests", status=429)] * 3
+
+        with pytest.raises(TransportError):
+            await dispatcher.send("+1000", "+1234567890", "Hi!")
+
+        assert dispatcher.metrics()["retried"] == 1
+        await dispatcher.stop()
+
+    async def test_full_queue_applies_backpressure(self, transport):
+        """Test that senders wait for room in a full queue instead of dropping messages"""
+        dispatcher = OutboundDispatcher(transport, rate=200, burst=1, max_queue=2, concurrency=1)
+
+        sids = await asyncio.gather(*(dispatcher.send("+1000", f"+{i}", "Hi!") for i in range(6)))
+
+        assert len(set(sids)) == 6
+        assert len(transport.sent) == 6
+        await dispatcher.stop()
+
+    async def test_stop_flushes_queue(self, dispatcher, transport):
+        """Test that stopping sends messages that were already queued"""
+        sends = [asyncio.ensure_future(dispatcher.send("+1000", f"+{i}", "Hi!")) for i in range(3)]
+        await asyncio.sleep(0)
+
+        await dispatcher.stop()
+
+        assert len(transport.sent) == 3
+        assert all(send.done() for send in sends)
+
+
+class TestTwilioTransport:
+
+    async def test_timeout_is_ambiguous(self):
+        """Test that a send that outlives the executor timeout is not retryable"""
+        client = MagicMock()
+        client.messages.create.side_effect = lambda **kwargs: time.sleep(0.2)
+        transport = TwilioTransport(client, IntegrationExecutor("twilio", max_workers=1, timeout=0.01))
+
+        with pytest.raises(TransportError) as excinfo:
+            await transport.send("+1000", "+1234567890", "Hi!")
+
+        assert not excinfo.value.retryable
+
+    async def test_refused_connection_is_retryable(self):
+        """Test that a connection refused before the request was sent is retryable"""
+        from requests.exceptions import ConnectionError
+        from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+        client = MagicMock()
+        client.messages.create.side_effect = ConnectionError(
+            MaxRetryError(None, "/Messages.json", NewConnectionError(None, "Connection refused"))
+        )
+        transport = TwilioTransport(client, IntegrationExecutor("twilio", max_workers=1))
+
+        with pytest.raises(TransportError) as excinfo:
+            await transport.send("+1000", "+1234567890", "Hi!")
+
+        assert excinfo.value.retryable
+
+    async def test_dropped_connection_is_ambiguous(self):
+        """Test that a connection dropped after sending is not retryable"""
+        from requests.exceptions import ConnectionError
+
+        client = MagicMock()
+        client.messages.create.side_effect = ConnectionError("Connection aborted.")
+        transport = TwilioTransport(client, IntegrationExecutor("twilio", max_workers=1))
+
+        with pytest.raises(TransportError) as excinfo:
+            await transport.send("+1000", "+1234567890", "Hi!")
+
+        assert not excinfo.value.retryable
@@ -0,0 +1,47 @@
+from app.utils.cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTTLCache:
+
+    def test_get_and_set(self):
+        """Test that stored values are returned and counted as hits"""
+        cache = TTLCache(max_size=2, ttl=60)
+        cache.set("a", 1)
+
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert cache.metrics() == {"size": 1, "hits": 1, "misses": 1, "hit_rate": 0.5}
+
+    def test_entries_expire(self):
+        """Test that entries are dropped once their TTL has passed"""
+        clock = FakeClock()
+        cache = TTLCache(max_size=2, ttl=60, clock=clock)
+        cache.set("a", 1)
+        cache.set("b", 2, ttl=120)
+
+        clock.now = 61
+
+        assert cache.get("a") is None
+        assert cache.get("b") == 2
+        assert len(cache) == 1
+
+    def test_least_recently_used_is_evicted(self):
+        """Test that the least recently read entry is evicted first"""
+        cache = TTLCache(max_size=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+
+        cache.set("c", 3)
+
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert cache.get("c") == 3
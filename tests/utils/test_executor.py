@@ -0,0 +1,97 @@
+import asyncio
+import threading
+import time
+import pytest
+
+from app.utils.executor import IntegrationExecutor, get_executor, executor_metrics
+
+
+@pytest.fixture
+def executor():
+    executor = IntegrationExecutor("test", max_workers=1, timeout=0.2)
+    yield executor
+    executor.shutdown()
+
+
+class TestIntegrationExecutor:
+
+    async def test_run_returns_result_off_event_loop(self, executor):
+        """Test that blocking calls run on a worker thread and return their result"""
+        main_thread = threading.get_ident()
+
+        result = await executor.run(lambda x, y=0: (x + y, threading.get_ident()), 1, y=2)
+
+        assert result[0] == 3
+        assert result[1] != main_thread
+        assert executor.metrics()["completed"] == 1
+
+    async def test_run_propagates_errors(self, executor):
+        """Test that exceptions from the blocking call are re-raised and counted"""
+        def fail():
+            raise ValueError("boom")
+
+        with pytest.raises(ValueError):
+            await executor.run(fail)
+
+        assert executor.metrics()["failed"] == 1
+
+    async def test_timeout_cancels_queued_calls(self, executor):
+        """Test that a call stuck behind a busy worker times out and leaves the queue"""
+        release = threading.Event()
+        executor.timeout = None
+        blocker = asyncio.ensure_future(executor.run(release.wait, 1))
+        await asyncio.sleep(0.05)
+        executor.timeout = 0.1
+
+        with pytest.raises(asyncio.TimeoutError):
+            await executor.run(time.sleep, 0)
+
+        metrics = executor.metrics()
+        assert metrics["timed_out"] == 1
+        assert metrics["queue_depth"] == 0
+
+        release.set()
+        await blocker
+
+    async def test_cancelled_callers_leave_the_queue(self, executor):
+        """Test that a caller cancelled while its call waits for a worker frees its queue slot"""
+        release = threading.Event()
+        executor.timeout = None
+        blocker = asyncio.ensure_future(executor.run(release.wait, 1))
+        await asyncio.sleep(0.05)
+
+        waiting = asyncio.ensure_future(executor.run(time.sleep, 0))
+        await asyncio.sleep(0.01)
+        assert executor.metrics()["queue_depth"] == 1
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+
+        assert executor.metrics()["queue_depth"] == 0
+        release.set()
+        await blocker
+
+    async def test_concurrency_is_bounded(self):
+        """Test that no more than max_workers calls run at once"""
+        executor = IntegrationExecutor("bounded", max_workers=2, timeout=5)
+        running = []
+        peak = []
+        lock = threading.Lock()
+
+        def work():
+            with lock:
+                running.append(1)
+                peak.append(len(running))
+            time.sleep(0.02)
+            with lock:
+                running.pop()
+
+        await asyncio.gather(*(executor.run(work) for _ in range(6)))
+        executor.shutdown()
+
+        assert max(peak) <= 2
+
+    def test_get_executor_is_shared(self):
+        """Test that get_executor returns one executor per integration"""
+        assert get_executor("twilio") is get_executor("twilio")
+        assert "twilio" in executor_metrics()
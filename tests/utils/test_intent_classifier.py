@@ -0,0 +1,74 @@
+import pytest
+
+from app.utils.intent_classifier import IntentClassifier
+
+
+@pytest.fixture
+def classifier():
+    return IntentClassifier()
+
+
+class TestIntentClassifier:
+
+    @pytest.mark.parametrize("message", ["yes", "Yes!", "ok 👍", "👍", "Sounds good, thanks!", "yep that's right"])
+    def test_confirmations(self, classifier, message):
+        """Test that plain confirmations are classified locally"""
+        assert classifier.classify(message) == ("CONFIRM", {})
+
+    def test_confirmation_with_size(self, classifier):
+        """Test that a size in a confirmation is captured as the preferred size"""
+        assert classifier.classify("Yes, L sounds good") == ("CONFIRM", {"preferred_size": "L"})
+        assert classifier.classify("Yes, Medium is perfect for me") == ("CONFIRM", {"preferred_size": "M"})
+
+    def test_metric_measurements(self, classifier):
+        """Test height and weight extraction in metric units"""
+        assert classifier.classify("I'm 180cm tall and weigh 80kg") == (
+            "PROVIDE_INFO", {"height": "180", "weight": "80"}
+        )
+        assert classifier.classify("1.80m, 75 kg") == ("PROVIDE_INFO", {"height": "180", "weight": "75"})
+
+    def test_imperial_measurements_are_normalized(self, classifier):
+        """Test that feet/inches and pounds are converted to cm and kg"""
+        assert classifier.classify("5'10\" 165 lbs") == ("PROVIDE_INFO", {"height": "177.8", "weight": "74.8"})
+
+    def test_usual_size(self, classifier):
+        """Test usual size extraction, including regional sizes and brand names"""
+        assert classifier.classify("I'm not sure, I usually wear L") == ("UNSURE", {"usual_size": "L"})
+        assert classifier.classify("I usually wear M at Zara and H&M") == ("UNSURE", {"usual_size": "M"})
+        assert classifier.classify("I usually wear EU 38") == ("UNSURE", {"usual_size": "EU 38"})
+        assert classifier.classify("I usually wear L at H&M") == ("UNSURE", {"usual_size": "L", "usual_brand": "hm"})
+
+    def test_change_size(self, classifier):
+        """Test rejections and size changes"""
+        assert classifier.classify("too big") == ("CHANGE_SIZE", {})
+        assert classifier.classify("nope, XL please") == ("CHANGE_SIZE", {"preferred_size": "XL"})
+
+    @pytest.mark.parametrize("message", [
+        "Hello, who is this?",
+        "yes but the colour is wrong",
+        "No, it's too small, I need a larger size",
+        "M",
+        "S or M?",
+        "",
+        "Is that right?",
+        "right?",
+        "Is M ok?",
+        "is M ok",
+        "sure?",
+        "would L be fine",
+    ])
+    def test_uncertain_messages_fall_through(self, classifier, message):
+        """Test that anything not fully recognized is left to the LLM"""
+        assert classifier.classify(message) is None
+
+    def test_metrics(self, classifier):
+        """Test hit-rate counters"""
+        classifier.classify("yes")
+        classifier.classify("180cm 75kg")
+        classifier.classify("Can I change the colour?")
+
+        metrics = classifier.metrics()
+        assert metrics["hits"] == 2
+        assert metrics["misses"] == 1
+        assert metrics["hit_rate"] == pytest.approx(2 / 3)
+        assert metrics["hits_by_intent"] == {"CONFIRM": 1, "PROVIDE_INFO": 1}
@@ -0,0 +1,38 @@
+import asyncio
+import time
+
+from app.utils.rate_limiter import TokenBucket
+
+
+class TestTokenBucket:
+
+    async def test_burst_is_available_immediately(self):
+        """Test that a full bucket hands out its capacity without waiting"""
+        bucket = TokenBucket(rate=10, capacity=5)
+        started = time.monotonic()
+
+        for _ in range(5):
+            await bucket.acquire()
+
+        assert time.monotonic() - started < 0.05
+
+    async def test_acquire_waits_for_refill(self):
+        """Test that an empty bucket paces callers at the refill rate"""
+        bucket = TokenBucket(rate=50, capacity=1)
+        await bucket.acquire()
+        started = time.monotonic()
+
+        await asyncio.gather(bucket.acquire(), bucket.acquire())
+
+        assert time.monotonic() - started >= 0.035
+
+    async def test_pause_withholds_tokens(self):
+        """Test that pausing empties the bucket for the given time"""
+        bucket = TokenBucket(rate=100, capacity=10)
+
+        bucket.pause(0.05)
+
+        assert bucket.available < 0
+        started = time.monotonic()
+        await bucket.acquire()
+        assert time.monotonic() - started >= 0.05
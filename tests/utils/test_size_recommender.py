@@ -0,0 +1,120 @@
+import json
+import numpy as np
+
+from app.utils.size_recommender import DEFAULT_CHART, SizeChart, SizeRecommender, usual_size_index
+
+
+def standard_recommender():
+    return SizeRecommender(default_chart=SizeChart(DEFAULT_CHART))
+
+
+class TestSizeRecommender:
+
+    def test_recommend_from_measurements(self):
+        """Test that height and weight pick the size whose ranges they fall in"""
+        recommender = standard_recommender()
+
+        assert recommender.recommend("product_123", height=180, weight=75).size == "L"
+        assert recommender.recommend("product_123", height="165", weight="60").size == "S"
+
+    def test_recommend_from_usual_size(self):
+        """Test that a usual size alone maps to the same size on the default chart"""
+        recommendation = standard_recommender().recommend("product_123", usual_size="M")
+
+        assert recommendation.size == "M"
+        assert 0 < recommendation.confidence <= 1
+
+    def test_brand_offsets(self):
+        """Test that sizes worn at brands that run small are shifted down"""
+        assert usual_size_index("L") == 4
+        assert usual_size_index("L", "zara") == 3.5
+        assert np.isnan(usual_size_index("EU 38"))
+
+    def test_nothing_known(self):
+        """Test that no recommendation is made without any sizing facts"""
+        assert standard_recommender().recommend("product_123") is None
+
+    def test_product_chart(self, tmp_path):
+        """Test that a product's own chart is used instead of the default"""
+        path = tmp_path / "charts.json"
+        path.write_text(json.dumps({
+            "product_123": {
+                "sizes": ["S", "M", "L"],
+                "height": [[150, 165], [165, 180], [180, 195]],
+                "weight": [[45, 60], [60, 80], [80, 100]]
+            }
+        }))
+        recommender = SizeRecommender.from_file(str(path))
+
+        assert recommender.recommend("product_123", height=175, weight=72).size == "M"
+        assert recommender.chart_for("other") is None
+
+    def test_default_chart_from_file(self, tmp_path):
+        """Test that a charts file's "default" entry applies to products without their own"""
+        path = tmp_path / "charts.json"
+        path.write_text(json.dumps({"default": "standard"}))
+        recommender = SizeRecommender.from_file(str(path))
+
+        assert recommender.chart_for("other").sizes[0] == "XS"
+        assert recommender.recommend("other", height=180, weight=75).size == "L"
+
+    def test_no_chart(self):
+        """Test that a product without a chart gets no recommendation when there is no default"""
+        recommender = SizeRecommender()
+
+        assert recommender.chart_for("product_123") is None
+        assert recommender.recommend("product_123", height=180, weight=75, ordered_size="M") is None
+        assert recommender.recommend_many("product_123", [{"height": 180, "weight": 75}]) == [None]
+
+    def test_no_chart_for_numeric_size(self):
+        """Test that a product without its own chart gets no letter size for a numeric size"""
+        recommender = standard_recommender()
+
+        assert recommender.chart_for("product_456", ordered_size="32") is None
+        assert recommender.recommend("product_456", height=180, weight=75, ordered_size="32") is None
+        assert recommender.recommend_many("product_456", [{"height": 180, "weight": 75}, {}], ordered_size="32") == [None, None]
+
+    def test_ordered_size_must_be_in_chart(self):
+        """Test that the chart is only used when it has the ordered size, ignoring case"""
+        recommender = SizeRecommender({"product_123": SizeChart.from_dict({
+            "sizes": ["S", "M", "L"],
+            "height": [[150, 165], [165, 180], [180, 195]],
+            "weight": [[45, 60], [60, 80], [80, 100]]
+        })})
+
+        assert recommender.recommend("product_123", height=175, weight=72, ordered_size=" m ").size == "M"
+        assert recommender.recommend("product_123", height=175, weight=72, ordered_size="XXL") is None
+
+    def test_recommend_many_matches_recommend(self):
+        """Test that batch recommendations match one-at-a-time recommendations"""
+        recommender = standard_recommender()
+        customers = [
+            {"height": 180, "weight": 75},
+            {"usual_size": "L", "usual_brand": "zara"},
+            {},
+            {"height": 160, "weight": None, "usual_size": "XS"},
+        ]
+
+        results = recommender.recommend_many("product_123", customers)
+
+        assert results == [
+            recommender.recommend(
+                "product_123", c.get("height"), c.get("weight"), c.get("usual_size"), c.get("usual_brand")
+            )
+            for c in customers
+        ]
+        assert results[2] is None
+
+    def test_chart_scores_batch_in_one_pass(self):
+        """Test that scores come back as one row per customer and one column per size"""
+        chart = SizeChart.from_dict({
+            "sizes": ["S", "M"],
+            "height": [[160, 170], [170, 180]],
+            "weight": [[50, 65], [65, 80]]
+        })
+
+        scores = chart.score(np.array([165.0, 175.0]), np.array([np.nan, 70.0]), np.array([np.nan, np.nan]))
+
+        assert scores.shape == (2, 2)
+        assert scores[0].argmax() == 0
+        assert scores[1].argmax() == 1
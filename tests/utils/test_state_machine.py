@@ -0,0 +1,89 @@
+import pytest
+
+from app.models.conversation import ConversationPhase
+from app.utils.state_machine import (
+    CONVERSATION_TRANSITIONS,
+    Effect,
+    Event,
+    State,
+    StateMachine,
+    Transition,
+    conversation_machine,
+    map_intent_to_event,
+)
+
+
+class TestStateMachine:
+
+    def test_default_transitions(self):
+        """Test that the default machine keeps its transitions"""
+        machine = StateMachine()
+
+        assert machine.get_next_state(State.INIT, Event.START) == State.CONFIRMATION
+        assert machine.get_next_state(State.CONFIRMATION, Event.DENY) == State.SIZING_QUESTIONS
+        assert machine.get_next_state(State.RECOMMENDATION, Event.RECOMMENDATION_REJECTED) == State.SIZING_QUESTIONS
+        assert machine.get_next_state(State.CONFIRMATION, Event.START) is None
+        assert machine.get_available_events(State.CONFIRMATION) == [Event.CONFIRM, Event.DENY]
+        assert machine.get_available_events(State.COMPLETE) == []
+
+    def test_unknown_state(self):
+        """Test that a state outside the machine has no transitions"""
+        machine = StateMachine()
+
+        assert machine.transition("UNKNOWN", Event.CONFIRM) is None
+        assert machine.get_available_events("UNKNOWN") == []
+
+    def test_custom_transitions(self):
+        """Test that a machine is compiled from its own states and transitions"""
+        machine = StateMachine(
+            {ConversationPhase.CONFIRMATION: {Event.CONFIRM: Transition(ConversationPhase.COMPLETE, (Effect.FULFIL,))}},
+            states=ConversationPhase
+        )
+
+        assert machine.transition(ConversationPhase.CONFIRMATION, Event.CONFIRM) == Transition(
+            ConversationPhase.COMPLETE, (Effect.FULFIL,)
+        )
+        assert machine.transition(ConversationPhase.CONFIRMATION, Event.DENY) is None
+
+
+class TestConversationMachine:
+
+    def test_every_phase_handles_every_event(self):
+        """Test that every reply leads somewhere, whatever the phase"""
+        for phase in ConversationPhase:
+            assert phase in CONVERSATION_TRANSITIONS
+            for event in Event:
+                assert conversation_machine.transition(phase, event) is not None
+
+    @pytest.mark.parametrize("phase, event, target, effects", [
+        (ConversationPhase.CONFIRMATION, Event.CONFIRM, ConversationPhase.COMPLETE, (Effect.CONFIRM_ORDERED_SIZES,)),
+        (ConversationPhase.CONFIRMATION, Event.DENY, ConversationPhase.SIZING_QUESTIONS, ()),
+        (ConversationPhase.CONFIRMATION, Event.OTHER, ConversationPhase.CONFIRMATION, ()),
+        (ConversationPhase.SIZING_QUESTIONS, Event.INFO_PROVIDED, ConversationPhase.RECOMMENDATION, (Effect.RECOMMEND,)),
+        (ConversationPhase.SIZING_QUESTIONS, Event.CONFIRM, ConversationPhase.SIZING_QUESTIONS, ()),
+        (
+            ConversationPhase.RECOMMENDATION, Event.CONFIRM, ConversationPhase.COMPLETE,
+            (Effect.RECOMMEND, Effect.CONFIRM_RECOMMENDED_SIZES, Effect.FULFIL)
+        ),
+        (ConversationPhase.RECOMMENDATION, Event.INFO_PROVIDED, ConversationPhase.RECOMMENDATION, (Effect.RECOMMEND,)),
+        (ConversationPhase.COMPLETE, Event.CONFIRM, ConversationPhase.COMPLETE, ()),
+    ])
+    def test_transitions(self, phase, event, target, effects):
+        """Test the conversation's transitions and their effects"""
+        assert conversation_machine.transition(phase, event) == Transition(target, effects)
+
+
+class TestMapIntentToEvent:
+
+    @pytest.mark.parametrize("intent, entities, event", [
+        ("CONFIRM", {"usual_size": "L"}, Event.CONFIRM),
+        ("UNSURE", {"usual_size": "L"}, Event.INFO_PROVIDED),
+        ("PROVIDE_INFO", {"height": "180", "weight": "80"}, Event.INFO_PROVIDED),
+        ("PROVIDE_INFO", {"height": "180"}, Event.OTHER),
+        ("UNSURE", {}, Event.DENY),
+        ("CHANGE_SIZE", {"preferred_size": "L"}, Event.DENY),
+        ("OTHER", {}, Event.OTHER),
+    ])
+    def test_map_intent_to_event(self, intent, entities, event):
+        """Test that confirmation wins, then enough sizing facts, then doubt"""
+        assert map_intent_to_event(intent, entities) == event